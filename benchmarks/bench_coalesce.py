@@ -0,0 +1,80 @@
+"""Benchmark for coalescing custom values in Ledger._init_tx_c.
+
+Reports wall time and peak traced memory for ledgers of increasing size.
+
+Usage: python benchmarks/bench_coalesce.py [--rows 100000 1000000 5000000]
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ledgercli.main import Ledger
+
+
+def make_tx(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Creates a synthetic mapped transactions table with sparse custom overrides.
+
+    Args:
+        rows: number of transactions
+        seed: seed for the random generator
+
+    Returns:
+        dataframe shaped like Ledger.tx after _update_tx_mapping
+    """
+    rng = np.random.default_rng(seed)
+    custom = rng.random(rows) < 0.02
+    date = pd.to_datetime("2000-01-01") + pd.to_timedelta(rng.integers(0, 9000, size=rows), unit="D")
+    recipient = pd.Series(rng.integers(0, 5000, size=rows)).map("recipient {}".format)
+    labels = np.array(["", "food", "rent", "travel"], dtype=object)
+
+    return pd.DataFrame(
+        {
+            "amount": rng.normal(0, 500, size=rows).round(2),
+            "date": date,
+            "recipient": recipient,
+            "amount_custom": np.where(custom, 1.0, np.nan),
+            "date_custom": pd.Series(date).where(custom),
+            "recipient_clean_custom": np.where(custom, "custom", ""),
+            "label1_custom": np.where(custom, "custom", ""),
+            "label2_custom": "",
+            "label3_custom": "",
+            "occurence_custom": np.where(custom, 2.0, np.nan),
+            "recipient_clean": labels[rng.integers(0, 4, size=rows)],
+            "label1": labels[rng.integers(0, 4, size=rows)],
+            "label2": labels[rng.integers(0, 4, size=rows)],
+            "label3": "",
+            "occurence": 0.0,
+        }
+    )
+
+
+def main() -> None:
+    """Runs the benchmark and prints its measurements."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = Ledger(output_dir=Path(tmp), bank_fmt="dkb")
+        for rows in args.rows:
+            ledger.tx = make_tx(rows)
+
+            start = time.perf_counter()
+            ledger._init_tx_c()
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            ledger._init_tx_c()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"_init_tx_c: {rows:>10,} rows in {elapsed:7.3f}s, peak {peak / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
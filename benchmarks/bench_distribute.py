@@ -0,0 +1,64 @@
+"""Benchmark for distributing transactions in Ledger._init_tx_d.
+
+Usage: python benchmarks/bench_distribute.py [--rows 1000000]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ledgercli.main import Ledger
+
+
+def make_tx_c(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Creates a synthetic coalesced transactions table.
+
+    Args:
+        rows: number of transactions
+        seed: seed for the random generator
+
+    Returns:
+        dataframe shaped like Ledger.tx_c
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "amount": rng.normal(0, 500, size=rows).round(2),
+            "date": pd.to_datetime("2000-01-01") + pd.to_timedelta(rng.integers(0, 9000, size=rows), unit="D"),
+            "recipient": pd.Series(rng.integers(0, 5000, size=rows)).map("recipient {}".format),
+            "label1": "",
+            "label2": "",
+            "label3": "",
+            "occurence": rng.choice([-12, -3, 0, 0, 0, 0, 1, 2, 6, 12], size=rows).astype(float),
+        }
+    )
+
+
+def main() -> None:
+    """Runs the benchmark and prints its timings."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = Ledger(output_dir=Path(tmp), bank_fmt="dkb")
+        ledger.tx_c = make_tx_c(args.rows)
+
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            ledger._init_tx_d()
+            timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(
+        f"_init_tx_d: {args.rows:,} rows -> {len(ledger.tx_d):,} rows in {best:.3f}s ({args.rows / best:,.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
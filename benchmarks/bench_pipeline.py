@@ -0,0 +1,169 @@
+"""End-to-end benchmark of importing, updating, writing and reading a ledger.
+
+For every size, synthetic exports are generated with benchmarks/generate.py and run through the whole pipeline: import
+into an empty ledger, update, write and read it back, then update and write again after the mapping and transactions
+were edited by hand. Every step of update is timed on its own with ledgercli.profiling.
+
+Results are stored as JSON in benchmarks/results, named after the commit they were measured at, and compared to the
+most recent earlier results, or the ones given with --compare.
+
+Usage: python benchmarks/bench_pipeline.py [--rows 10000 100000 1000000 10000000] [--bank_fmt dkb] [--storage_fmt csv]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from generate import edit_ledger, write_exports
+
+from ledgercli.main import Ledger
+from ledgercli.profiling import Profiler, peak_rss
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def run(rows: int, bank_fmt: str, storage_fmt: str, seed: int = 0) -> dict[str, float]:
+    """Runs the pipeline on synthetic exports.
+
+    Args:
+        rows: number of transactions
+        bank_fmt: bank format of the exports
+        storage_fmt: storage format of the ledger
+        seed: seed for the generator
+
+    Returns:
+        seconds per measurement, and the peak RSS of the process in MiB
+    """
+    timings: dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        exports = write_exports(Path(tmp) / "exports", bank_fmt, rows, seed)
+        output_dir = Path(tmp) / "ledger"
+        output_dir.mkdir()
+
+        start = time.perf_counter()
+        ledger = Ledger(output_dir=output_dir, bank_fmt=bank_fmt, storage_fmt=storage_fmt)
+        errors = ledger.import_many(exports)
+        timings["import"] = time.perf_counter() - start
+        if errors:
+            raise RuntimeError(f"Couldn't import {errors}.")
+
+        for phase in ["update", "write"]:
+            profiler = Profiler()
+            ledger.hooks = [profiler]
+            start = time.perf_counter()
+            getattr(ledger, phase)()
+            timings[phase] = time.perf_counter() - start
+            if phase == "update":
+                timings.update(_stages(profiler, "update"))
+
+        start = time.perf_counter()
+        Ledger(output_dir=output_dir, bank_fmt=None, storage_fmt=storage_fmt)
+        timings["read"] = time.perf_counter() - start
+
+        edit_ledger(output_dir, seed)
+        profiler = Profiler()
+        start = time.perf_counter()
+        ledger = Ledger(output_dir=output_dir, bank_fmt=None, storage_fmt=storage_fmt, hooks=[profiler])
+        ledger.update()
+        ledger.write()
+        timings["edit"] = time.perf_counter() - start
+        timings.update(_stages(profiler, "edit"))
+
+    rss = peak_rss()
+    if rss is not None:
+        timings["peak_rss_mib"] = rss / 2**20
+    return timings
+
+
+def _stages(profiler: Profiler, prefix: str) -> dict[str, float]:
+    """Returns the seconds spent in every step of update recorded by a profiler."""
+    return {f"{prefix}.{e['name']}": e["dur"] / 1e6 for e in profiler.events if e["cat"] == "stage"}
+
+
+def _git(*args: str) -> str:
+    """Returns the output of a git command, empty if git isn't available."""
+    try:
+        result = subprocess.run(["git", *args], capture_output=True, text=True, check=True)  # noqa: S603, S607
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return result.stdout.strip()
+
+
+def _environment() -> dict[str, str]:
+    """Describes what results were measured with."""
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": str(bool(_git("status", "--porcelain", "--untracked-files=no"))),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": f"{platform.system()} {platform.machine()}",
+    }
+
+
+def _latest() -> Path | None:
+    """Returns the most recent stored results."""
+    paths = sorted(RESULTS_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    return paths[-1] if paths else None
+
+
+def report(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]] | None) -> None:
+    """Prints results per size, compared to the baseline if there is one.
+
+    Args:
+        results: measurements per number of rows
+        baseline: earlier measurements per number of rows
+    """
+    for rows, timings in results.items():
+        print(f"{int(rows):,} rows")
+        before = (baseline or {}).get(rows, {})
+        for name, value in timings.items():
+            unit = "MiB" if name.endswith("_mib") else "s"
+            line = f"  {name:<32} {value:>10.3f} {unit}"
+            if before.get(name):
+                line += f"  {value / before[name]:>6.2f}x"
+            print(line)
+
+
+def main() -> None:
+    """Runs the benchmark, stores and prints its results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--bank_fmt", choices=["dkb", "sp"], default="dkb")
+    parser.add_argument("--storage_fmt", choices=["csv", "parquet", "arrow"], default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", type=Path, default=None, help="results to compare to, the latest by default")
+    parser.add_argument("--no-save", action="store_true", help="don't store the results")
+    args = parser.parse_args()
+
+    environment = _environment()
+    results = {}
+    for rows in sorted(args.rows):
+        results[str(rows)] = run(rows, args.bank_fmt, args.storage_fmt, args.seed)
+        print(f"ran {rows:,} rows", file=sys.stderr)
+
+    compare = args.compare or _latest()
+    baseline = None
+    if compare is not None:
+        stored = json.loads(compare.read_text())
+        if stored["bank_fmt"] == args.bank_fmt and stored["storage_fmt"] == args.storage_fmt:
+            baseline = stored["results"]
+            print(f"compared to {compare.name} ({stored['commit']})")
+    report(results, baseline)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"{datetime.now():%Y%m%dT%H%M%S}-{environment['commit']}.json"
+        stored = {**environment, "bank_fmt": args.bank_fmt, "storage_fmt": args.storage_fmt, "results": results}
+        path.write_text(json.dumps(stored, indent=1))
+        print(f"stored results in {path}")
+
+
+if __name__ == "__main__":
+    main()
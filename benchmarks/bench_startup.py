@@ -0,0 +1,64 @@
+"""Benchmark for CLI startup time, measured with python -X importtime.
+
+Imports the CLI module in fresh interpreters and reports the cumulative import time of ledgercli.cli and its slowest
+imports. Exits with status 1 if a heavy module gets imported at startup or the import takes longer than --max-ms, so
+it can guard against regressions.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--max-ms 150]
+"""
+import argparse
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow"]
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Imports module in a fresh interpreter and collects cumulative import times.
+
+    Args:
+        module: module to import
+
+    Returns:
+        cumulative import time in microseconds per imported module
+    """
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)  # noqa: S603
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") is False or "|" not in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main() -> None:
+    """Runs the benchmark, prints its timings and exits with status 1 on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="ledgercli.cli")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times[args.module])
+    print(f"import {args.module}: {best[args.module] / 1000:.1f}ms (best of {args.repeat})")
+    for name, us in sorted(best.items(), key=lambda item: item[1], reverse=True)[1 : args.top + 1]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+
+    failed = False
+    for name in HEAVY_MODULES:
+        if name in best:
+            print(f"FAIL: {name} is imported at startup", file=sys.stderr)
+            failed = True
+    if args.max_ms is not None and best[args.module] / 1000 > args.max_ms:
+        print(f"FAIL: startup exceeds {args.max_ms:.0f}ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
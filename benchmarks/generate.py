@@ -0,0 +1,258 @@
+"""Generator of synthetic bank exports for benchmarks.
+
+Exports are deterministic for a seed and shaped like real ones: recurring payments on fixed days (rent, salary,
+utilities, a yearly insurance and a quarterly fee), seasonal recipients only showing up in some months and everyday
+spending spread over a pool of recipients that grows with the number of rows, few of them frequent and many rare. One
+export is written per year, newest transactions first, in the layout of the bank format.
+
+edit_ledger applies the hand-edits users make after an import: occurence and labels in the mapping table and custom
+overrides of single transactions.
+
+Usage: python benchmarks/generate.py [--bank_fmt dkb] [--rows 100000] [--seed 0] OUTPUT_DIR
+"""
+import argparse
+import csv
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ledgercli.banks import BankFormat, get_bank_fmt
+from ledgercli.storage import get_storage
+
+# recipient, day of month, amount in cents, months; the salary is set to balance out spending
+RECURRING = [
+    ("Employer AG", 28, 0, range(1, 13)),
+    ("Landlord GmbH", 1, -95_000, range(1, 13)),
+    ("Stadtwerke Strom", 15, -8_500, range(1, 13)),
+    ("Telekom Deutschland", 5, -3_999, range(1, 13)),
+    ("Fitness Studio", 1, -2_990, range(1, 13)),
+    ("Streaming Service", 12, -1_299, range(1, 13)),
+    ("Allianz Versicherung", 2, -48_000, [1]),
+    ("Rundfunkbeitrag", 15, -5_508, [1, 4, 7, 10]),
+]
+
+# recipient, months, share of transactions in these months
+SEASONAL = [
+    ("Skiverleih Alpin", [12, 1, 2], 0.02),
+    ("Weihnachtsmarkt", [12], 0.05),
+    ("Gartencenter", [4, 5, 6], 0.02),
+    ("Eiscafe Venezia", [6, 7, 8], 0.04),
+    ("Reisebuero Sonne", [7, 8], 0.01),
+]
+
+# everyday recipients, numbered to grow the pool with the number of rows
+EVERYDAY = ["REWE Markt {}", "EDEKA {}", "ALDI SUED {}", "PAYPAL *SHOP {}", "Amazon Mktplce {}", "Restaurant {}"]
+
+HEADERS = {
+    "dkb": [
+        '"Buchungstag"',
+        '"Wertstellung"',
+        '"Buchungstext"',
+        '"Auftraggeber / Begünstigter"',
+        '"Verwendungszweck"',
+        '"Kontonummer"',
+        '"BLZ"',
+        '"Betrag (EUR)"',
+        '"Gläubiger-ID"',
+        '"Mandatsreferenz"',
+        '"Kundenreferenz"',
+    ],
+    "sp": [
+        "Auftragskonto",
+        "Buchungstag",
+        "Valutadatum",
+        "Buchungstext",
+        "Verwendungszweck",
+        "Glaeubiger ID",
+        "Mandatsreferenz",
+        "Kundenreferenz (End-to-End)",
+        "Sammlerreferenz",
+        "Lastschrift Ursprungsbetrag",
+        "Auslagenersatz Ruecklastschrift",
+        "Beguenstigter/Zahlungspflichtiger",
+        "Kontonummer/IBAN",
+        "BIC (SWIFT-Code)",
+        "Betrag",
+        "Waehrung",
+        "Info",
+    ],
+}
+
+START_BALANCE = 100_000
+
+
+def make_transactions(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Creates synthetic transactions.
+
+    The date range grows with the number of rows, from one year for 10k rows up to 20 years.
+
+    Args:
+        rows: number of transactions, recurring payments included
+        seed: seed for the random generator
+
+    Returns:
+        date, recipient and amount in cents of every transaction, sorted by date
+    """
+    rng = np.random.default_rng(seed)
+    years = int(np.clip(rows // 10_000, 1, 20))
+    start = pd.Timestamp(2024 - years + 1, 1, 1)
+    months = pd.date_range(start, periods=12 * years, freq="MS")
+
+    recurring = [
+        (month + pd.Timedelta(days=day - 1), recipient, amount)
+        for recipient, day, amount, active in RECURRING
+        for month in months
+        if month.month in active
+    ][:rows]
+    n = rows - len(recurring)
+    amount = -np.round(rng.lognormal(2.5, 0.9, size=n) * 100).astype("int64")
+    salary = -(amount.sum() + sum(r[2] for r in recurring)) // max(1, sum(r[1] == "Employer AG" for r in recurring))
+    recurring = [(d, r, salary if r == "Employer AG" else a) for d, r, a in recurring]
+
+    date = start + pd.to_timedelta(rng.integers(0, 365 * years, size=n), unit="D")
+    # few recipients are frequent, most are rare
+    pool = max(50, int(5 * rows**0.5))
+    number = (pool * rng.random(n) ** 3).astype("int64")
+    names = np.array([EVERYDAY[i % len(EVERYDAY)].format(i) for i in range(pool)], dtype=object)
+    recipient = names[number]
+
+    month = date.month.to_numpy()
+    for name, active, share in SEASONAL:
+        seasonal = np.isin(month, active) & (rng.random(n) < share)
+        recipient[seasonal] = name
+
+    tx = pd.DataFrame(
+        {
+            "date": np.concatenate([np.array([r[0] for r in recurring], dtype="datetime64[ns]"), date.to_numpy()]),
+            "recipient": np.concatenate([np.array([r[1] for r in recurring], dtype=object), recipient]),
+            "amount": np.concatenate([np.array([r[2] for r in recurring], dtype="int64"), amount]),
+        }
+    )
+    return tx.sort_values("date", kind="stable", ignore_index=True)
+
+
+def _format_amounts(cents: np.ndarray, bank_fmt: BankFormat) -> np.ndarray:
+    """Formats amounts in cents with the separators of the bank format, e.g. -1.234,56."""
+    units = pd.Series(np.abs(cents) // 100)
+    digits = units.astype(str)
+    grouped = units.map("{:,}".format).str.replace(",", bank_fmt.thousands, regex=False)
+    digits = digits.where(units < 1000, grouped)
+    sign = np.where(cents < 0, "-", "")
+    cents_digits = pd.Series(np.abs(cents) % 100).astype(str).str.zfill(2)
+    return (sign + digits + bank_fmt.decimal + cents_digits).to_numpy()
+
+
+def write_export(path: Path, tx: pd.DataFrame, bank_fmt: str, end_balance: int) -> None:
+    """Writes transactions as an export of a bank format, newest first.
+
+    Args:
+        path: path of the export
+        tx: date, recipient and amount in cents of every transaction
+        bank_fmt: "dkb" or "sp"
+        end_balance: balance after the last transaction in cents, shown in the header if the format has one
+    """
+    spec = get_bank_fmt(bank_fmt)
+    tx = tx.iloc[::-1]
+    fields = pd.DataFrame({i: "" for i in range(len(HEADERS[bank_fmt]))}, index=tx.index)
+    # booking and value date are the same
+    fields[[1, 2] if bank_fmt == "sp" else [0, 1]] = np.repeat(
+        tx["date"].dt.strftime(spec.date_formats[0]).to_numpy()[:, None], 2, axis=1
+    )
+    fields[spec.columns["recipient"]] = tx["recipient"]
+    fields[spec.columns["amount"]] = _format_amounts(tx["amount"].to_numpy(), spec)
+    fields[3 if bank_fmt == "sp" else 2] = np.where(tx["amount"] < 0, "Lastschrift", "Gutschrift")
+    if bank_fmt == "sp":
+        fields[[15, 16]] = ["EUR", "Umsatz gebucht"]
+
+    with open(path, "w", encoding=spec.encoding, errors="replace", newline="") as f:
+        if bank_fmt == "dkb":
+            first, last = tx["date"].min(), tx["date"].max()
+            balance = _format_amounts(np.array([end_balance]), spec)[0]
+            f.write('"Kontonummer:";"DE00123456780000000000 / Girokonto";\n\n')
+            f.write(f'"Von:";"{first:{spec.date_formats[0]}}";\n"Bis:";"{last:{spec.date_formats[0]}}";\n')
+            f.write(f'"Kontostand vom {last:{spec.date_formats[0]}}:";"{balance} EUR";\n\n')
+        f.write(spec.sep.join(HEADERS[bank_fmt]) + "\n")
+        quoting = csv.QUOTE_ALL if bank_fmt == "dkb" else csv.QUOTE_MINIMAL
+        fields.to_csv(f, sep=spec.sep, header=False, index=False, quoting=quoting)
+
+
+def write_exports(directory: Path, bank_fmt: str, rows: int, seed: int = 0) -> list[Path]:
+    """Writes synthetic exports, one per year.
+
+    Args:
+        directory: dir to write exports to
+        bank_fmt: "dkb" or "sp"
+        rows: number of transactions over all exports
+        seed: seed for the random generator
+
+    Returns:
+        paths of the exports, oldest first
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    tx = make_transactions(rows, seed)
+    balances = START_BALANCE + tx["amount"].cumsum()
+    paths = []
+    for year, rows_of_year in tx.groupby(tx["date"].dt.year).indices.items():
+        path = directory / f"{bank_fmt}_{year}.csv"
+        write_export(path, tx.iloc[rows_of_year], bank_fmt, int(balances.iloc[rows_of_year[-1]]))
+        paths.append(path)
+    return paths
+
+
+def edit_ledger(output_dir: Path, seed: int = 0, share: float = 0.005) -> None:
+    """Edits the stored mapping and transactions tables of a ledger like a user would.
+
+    Recurring payments get their occurence, frequent recipients a clean name and labels, and a share of transactions
+    custom amounts, dates and labels.
+
+    Args:
+        output_dir: dir the ledger is stored in
+        seed: seed for the random generator
+        share: share of transactions with custom overrides
+    """
+    rng = np.random.default_rng(seed)
+    storage = get_storage(None, output_dir)
+
+    mapping = storage.read("mapping")
+    mapping = mapping.astype({c: object for c in ["recipient_clean", "label1", "label2", "label3"]})
+    recipient = mapping["recipient"].astype(str)
+    mapping.loc[recipient == "Allianz Versicherung", "occurence"] = 12
+    mapping.loc[recipient == "Rundfunkbeitrag", "occurence"] = 3
+    for prefix, clean, label in [
+        ("REWE", "Rewe", "groceries"),
+        ("EDEKA", "Edeka", "groceries"),
+        ("PAYPAL", "PayPal", "shopping"),
+    ]:
+        matches = recipient.str.startswith(prefix)
+        mapping.loc[matches, ["recipient_clean", "label1"]] = [clean, label]
+    mapping.loc[recipient == "Landlord GmbH", ["label1", "label2"]] = ["living", "rent"]
+    storage.write("mapping", mapping)
+
+    tx = storage.read("transactions")
+    columns = ["recipient_clean_custom", "label1_custom"]
+    tx = tx.astype({c: object for c in columns})
+    custom = np.flatnonzero(rng.random(len(tx)) < share)
+    tx.loc[custom, "amount_custom"] = (tx.loc[custom, "amount"] / 2).round(2)
+    tx["date_custom"] = pd.to_datetime(tx["date_custom"])
+    tx.loc[custom, "date_custom"] = pd.to_datetime(tx.loc[custom, "date"]) + pd.Timedelta(days=1)
+    tx.loc[custom, columns] = ["Split", "shared"]
+    tx.loc[custom[::2], "occurence_custom"] = 2
+    storage.write("transactions", tx)
+
+
+def main() -> None:
+    """Writes synthetic exports and prints their paths."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bank_fmt", choices=list(HEADERS), default="dkb")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("output_dir", type=Path)
+    args = parser.parse_args()
+
+    for path in write_exports(args.output_dir, args.bank_fmt, args.rows, args.seed):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
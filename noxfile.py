@@ -228,3 +228,11 @@ def docs(session: Session) -> None:
         shutil.rmtree(build_dir)
 
     session.run("sphinx-autobuild", *args)
+
+
+@session(python=python_versions[0])
+def benchmarks(session: Session) -> None:
+    """Run the pipeline benchmark and store its results in benchmarks/results."""
+    args = session.posargs or ["--rows", "10000", "100000", "1000000"]
+    session.poetry.installroot(extras=["arrow"])
+    session.run("python", "benchmarks/bench_pipeline.py", *args)
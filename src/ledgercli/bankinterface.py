@@ -2,11 +2,33 @@
 
 This module provides an easily extendable interface for reading transactions from a file.
 """
+import csv
+import re
+import warnings
+from collections.abc import Iterator
+from dataclasses import dataclass, field
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from ledgercli.banks import AUTO, BankFormat, detect_bank_fmt, get_bank_fmt, list_bank_fmts, sniff
+
+
+@dataclass(frozen=True)
+class ParsedExport:
+    """ParsedExport.
+
+    Holds everything ledgercli needs from an export: header fields, balances and transactions. It gets produced by a
+    single read of the export file.
+    """
+
+    bank_fmt: str
+    transactions: pd.DataFrame
+    header: dict[str, str] = field(default_factory=dict)
+    start_balance: float = np.nan
+    end_balance: float = np.nan
+
 
 class BankInterface:
     """BankInterface."""
@@ -15,10 +37,61 @@ class BankInterface:
     def list_bank_fmts() -> list[str]:
         """Lists all currently supported bank formats.
 
+        Formats are registered in ledgercli.banks, see there for adding new ones.
+
         Returns:
             list of supported bank formats
         """
-        return ["dkb", "sp"]
+        return list_bank_fmts()
+
+    @staticmethod
+    def read_export(bank_fmt: str, export_path: Path) -> ParsedExport:
+        """Reads export_path using bank_fmt.
+
+        The file is read in a single pass: header lines are consumed first and the remaining file is handed to
+        pd.read_csv. Results aren't cached, callers needing transactions and balances of the same export should read
+        it once and keep the parsed export.
+
+        With the "auto" bank_fmt, the format is detected from the first bytes of the file. An explicit bank_fmt is
+        checked against them as well, a mismatch only warns.
+
+        Args:
+            bank_fmt: a bank format or "auto"
+            export_path: path to export
+
+        Returns:
+            parsed export
+
+        Raises:
+            KeyError: bad bank_fmt
+        """
+        if bank_fmt != AUTO and bank_fmt not in BankInterface().list_bank_fmts():
+            raise KeyError("The bank_fmt you provided is not supported.")
+
+        (export,) = _iter_export(_resolve_bank_fmt(bank_fmt, export_path), export_path, chunksize=None)
+        return export
+
+    @staticmethod
+    def iter_export(bank_fmt: str, export_path: Path, chunksize: int = 100_000) -> Iterator[ParsedExport]:
+        """Streams export_path using bank_fmt in chunks of transactions.
+
+        Memory use is bounded by chunksize instead of the size of the export. Results aren't cached.
+
+        Args:
+            bank_fmt: a bank format or "auto"
+            export_path: path to export
+            chunksize: maximum number of transactions per chunk
+
+        Yields:
+            parsed exports sharing header and balances, each with one chunk of transactions
+
+        Raises:
+            KeyError: bad bank_fmt
+        """
+        if bank_fmt != AUTO and bank_fmt not in BankInterface().list_bank_fmts():
+            raise KeyError("The bank_fmt you provided is not supported.")
+
+        yield from _iter_export(_resolve_bank_fmt(bank_fmt, export_path), export_path, chunksize)
 
     @staticmethod
     def get_transactions(bank_fmt: str, export_path: Path) -> pd.DataFrame:
@@ -35,34 +108,7 @@ class BankInterface:
             KeyError: bad bank_fmt
             Exception: if parsed export has no transactions
         """
-        if bank_fmt not in BankInterface().list_bank_fmts():
-            raise KeyError("The bank_fmt you provided is not supported.")
-
-        if bank_fmt == "dkb":
-            tmp = pd.read_csv(
-                export_path,
-                sep=";",
-                decimal=",",
-                thousands=".",
-                parse_dates=["Buchungstag", "Wertstellung"],
-                dayfirst=True,
-                encoding="latin1",
-                skiprows=6,
-            )
-            tx = tmp.iloc[:, [0, 3, 7]].copy()
-            tx.columns = ["date", "recipient", "amount"]
-        else:
-            tmp = pd.read_csv(
-                export_path,
-                sep=";",
-                decimal=",",
-                thousands=".",
-                parse_dates=["Buchungstag", "Valutadatum"],
-                dayfirst=True,
-                encoding="latin1",
-            )
-            tx = tmp.iloc[:, [2, 11, 14]].copy()
-            tx.columns = ["date", "recipient", "amount"]
+        tx = BankInterface().read_export(bank_fmt=bank_fmt, export_path=export_path).transactions.copy()
 
         if tx.empty:
             raise Exception("The provided export contains no transactions. Please supply a non-empty export!")
@@ -84,14 +130,7 @@ class BankInterface:
         Raises:
             KeyError: bad bank_fmt
         """
-        if bank_fmt not in BankInterface().list_bank_fmts():
-            raise KeyError("The bank_fmt you provided is not supported.")
-
-        start_balance = np.nan
-        if bank_fmt in ["dkb", "sp"]:
-            start_balance = np.nan
-
-        return start_balance  # pragma: no cover
+        return BankInterface().read_export(bank_fmt=bank_fmt, export_path=export_path).start_balance
 
     @staticmethod
     def get_end_balance(bank_fmt: str, export_path: Path) -> float:
@@ -109,27 +148,7 @@ class BankInterface:
         Raises:
             KeyError: bad bank_fmt
         """
-        if bank_fmt not in BankInterface().list_bank_fmts():
-            raise KeyError("The bank_fmt you provided is not supported.")
-
-        end_balance = np.nan
-
-        if bank_fmt == "dkb":
-            header = pd.read_csv(
-                export_path,
-                sep=";",
-                decimal=",",
-                thousands=".",
-                encoding="latin1",
-                skiprows=2,
-                nrows=3,
-                header=None,
-            )
-
-            # locale.atof not used here as de_DE locale needs to be installed
-            end_balance = float(header.iloc[2, 1].replace(".", "").replace(",", ".").replace(" EUR", ""))
-
-        return end_balance
+        return BankInterface().read_export(bank_fmt=bank_fmt, export_path=export_path).end_balance
 
     @staticmethod
     def get_metadata(bank_fmt: str, export_path: Path) -> pd.DataFrame:
@@ -137,6 +156,7 @@ class BankInterface:
 
         Metadata stores bank and the starting balance which is needed for historical balances.
         If the bank exports provides no start or end balance to calculate the start balance, it is set to 0.
+        The export is only read once, all balances and transactions are taken from the same ParsedExport.
 
         Args:
             bank_fmt: a bank format
@@ -145,21 +165,149 @@ class BankInterface:
         Returns:
             dataframe
         """
-        tmp_start_balance = BankInterface().get_start_balance(bank_fmt=bank_fmt, export_path=export_path)
-        end_balance = BankInterface().get_end_balance(bank_fmt=bank_fmt, export_path=export_path)
+        return BankInterface().export_metadata(BankInterface().read_export(bank_fmt=bank_fmt, export_path=export_path))
+
+    @staticmethod
+    def export_metadata(export: ParsedExport, revenue: float | None = None) -> pd.DataFrame:
+        """Creates metadata dataframe from a parsed export.
+
+        Args:
+            export: parsed export
+            revenue: sum of all amounts in the export, calculated from export.transactions if None
+
+        Returns:
+            dataframe
+        """
+        tmp_start_balance = export.start_balance
+        end_balance = export.end_balance
 
         start_balance: float = 0.0
 
         if ~np.isnan(tmp_start_balance) and np.isnan(end_balance):  # pragma: no cover
             start_balance = tmp_start_balance
         elif np.isnan(tmp_start_balance) and ~np.isnan(end_balance):
-            tx = BankInterface().get_transactions(bank_fmt, export_path)
-            revenue = tx["amount"].sum()
+            if revenue is None:
+                revenue = export.transactions["amount"].sum()
             start_balance = end_balance - float(revenue)
 
         return pd.DataFrame(
             {
                 "starting_balance": [start_balance],
-                "bank": [bank_fmt],
+                "bank": [export.bank_fmt],
             }
         )
+
+
+def _parse_amount(value: str, bank_fmt: BankFormat) -> float:
+    """Parses a formatted amount like '1.000,01 EUR'."""
+    # locale.atof not used here as de_DE locale needs to be installed
+    number = re.sub(r"[^0-9+\-.,]", "", value).replace(bank_fmt.thousands, "").replace(bank_fmt.decimal, ".")
+    return float(number)
+
+
+def _header_amount(header: dict[str, str], bank_fmt: BankFormat, prefix: str | None) -> float:
+    """Returns the amount of the first header field starting with prefix, np.nan if there is none."""
+    if prefix is None:
+        return np.nan
+    return next((_parse_amount(v, bank_fmt) for k, v in header.items() if k.startswith(prefix)), np.nan)
+
+
+def _parse_dates(dates: pd.Series, bank_fmt: BankFormat, export_path: Path) -> pd.Series:
+    """Parses dates with the first of the bank format's date formats each of them matches.
+
+    Raises:
+        ValueError: if a date matches none of them
+    """
+    parsed = pd.Series(pd.NaT, index=dates.index, dtype="datetime64[ns]")
+    for date_format in bank_fmt.date_formats:
+        missing = parsed.isna()
+        parsed[missing] = pd.to_datetime(dates[missing], format=date_format, errors="coerce")
+    unparsed = dates[parsed.isna() & dates.notna()]
+    if len(unparsed):
+        raise ValueError(
+            f"{export_path} has dates like {unparsed.iloc[0]} that don't match {', '.join(bank_fmt.date_formats)}."
+        )
+    return parsed
+
+
+def _resolve_bank_fmt(bank_fmt: str, export_path: Path) -> BankFormat:
+    """Returns the spec of bank_fmt, detecting it from the export with "auto".
+
+    An explicit bank_fmt is used even if the export doesn't match its signature, which only warns.
+    """
+    if bank_fmt == AUTO:
+        return get_bank_fmt(detect_bank_fmt(export_path))
+
+    spec = get_bank_fmt(bank_fmt)
+    if spec.matches(sniff(export_path)) is False:
+        warnings.warn(f"{export_path} doesn't look like a {bank_fmt} export, reading it as one anyway.", stacklevel=2)
+    return spec
+
+
+def _check_columns(spec: BankFormat, export_path: Path, names: list[str], row: list[str]) -> None:
+    """Checks the column names of an export's transactions table against the bank format and the first row.
+
+    Raises:
+        ValueError: if a column of the bank format is missing or the first row has more or fewer columns than names
+    """
+    for column, i in spec.columns.items():
+        if i >= len(names):
+            raise ValueError(
+                f"{export_path} has no {column} column, {spec.name} expects it as column {i + 1} "
+                f"but the header has {len(names)} columns."
+            )
+    if row and len(row) > len(names):
+        raise ValueError(
+            f"{export_path} has an extra column {len(names) + 1} with values like {row[len(names)]!r} "
+            "that is missing from its header."
+        )
+    if row and len(row) < len(names):
+        missing = ", ".join(repr(name) for name in names[len(row) :])
+        raise ValueError(f"{export_path} is missing columns {missing} of its header in the first row.")
+
+
+def _iter_export(spec: BankFormat, export_path: Path, chunksize: int | None) -> Iterator[ParsedExport]:
+    """Reads an export in a single pass, yielding its transactions in chunks.
+
+    Header lines and the column names of the transactions table are consumed first, so only the date, recipient and
+    amount columns get parsed, with explicit dtypes. All yielded exports share header and balances.
+
+    Raises:
+        ValueError: if the column names don't match the bank format or the first row
+    """
+    with open(export_path, encoding=spec.encoding, newline="") as f:
+        header_lines = [f.readline() for _ in range(spec.skiprows)]
+        names = next(csv.reader([f.readline()], delimiter=spec.sep), [])
+        position = f.tell()
+        _check_columns(spec, export_path, names, next(csv.reader([f.readline()], delimiter=spec.sep), []))
+        f.seek(position)
+        # read_csv doesn't allow duplicate names, only the used columns need to keep theirs
+        names = [n if names.count(n) == 1 else f"{n}.{i}" for i, n in enumerate(names)]
+        date, recipient, amount = (names[spec.columns[k]] for k in ["date", "recipient", "amount"])
+
+        header = {row[0].rstrip(":"): row[1] for row in csv.reader(header_lines, delimiter=spec.sep) if len(row) > 1}
+        start_balance = _header_amount(header, spec, spec.start_balance)
+        end_balance = _header_amount(header, spec, spec.end_balance)
+
+        reader = pd.read_csv(
+            f,
+            sep=spec.sep,
+            decimal=spec.decimal,
+            thousands=spec.thousands,
+            header=None,
+            names=names,
+            usecols=[date, recipient, amount],
+            dtype={date: "object", recipient: "object", amount: "float64"},
+            chunksize=chunksize,
+        )
+        for chunk in [reader] if isinstance(reader, pd.DataFrame) else reader:
+            tx = chunk[[date, recipient, amount]]
+            tx.columns = ["date", "recipient", "amount"]
+            tx["date"] = _parse_dates(tx["date"], spec, export_path)
+            yield ParsedExport(
+                bank_fmt=spec.name,
+                transactions=tx,
+                header=header,
+                start_balance=start_balance,
+                end_balance=end_balance,
+            )
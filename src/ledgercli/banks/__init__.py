@@ -0,0 +1,160 @@
+"""Bank formats.
+
+This module provides the registry of bank formats. A bank format is a declarative BankFormat spec describing how
+to read a bank's CSV export. Built-in formats live in submodules of this package, third-party packages can add
+formats through the "ledgercli.bank_fmts" entry point group or by calling register.
+
+Specs are only imported when a format is used, so listing formats stays cheap. With the "auto" bank format, the
+format of an export is detected by matching the first few KB of the file against the signature of every format.
+"""
+import codecs
+import re
+from dataclasses import dataclass, field
+from functools import cache
+from importlib import import_module
+from importlib.metadata import EntryPoint, entry_points
+from pathlib import Path
+
+ENTRY_POINT_GROUP = "ledgercli.bank_fmts"
+AUTO = "auto"
+SNIFF_SIZE = 8192
+
+
+@dataclass(frozen=True)
+class BankFormat:
+    """BankFormat.
+
+    Attributes:
+        name: name of the format, used as bank_fmt
+        columns: positions of the date, recipient and amount columns in the transactions table
+        sep: field separator
+        decimal: decimal separator of amounts
+        thousands: thousands separator of amounts
+        encoding: file encoding
+        skiprows: number of header lines before the transactions table
+        date_formats: strftime formats dates can be in, tried in order
+        start_balance: prefix of the header field holding the start balance, None if not provided
+        end_balance: prefix of the header field holding the end balance, None if not provided
+        signature: regex searched for in the beginning of an export to detect the format, None if unknown
+    """
+
+    name: str
+    columns: dict[str, int] = field(default_factory=dict)
+    sep: str = ";"
+    decimal: str = ","
+    thousands: str = "."
+    encoding: str = "latin1"
+    skiprows: int = 0
+    date_formats: tuple[str, ...] = ("%d.%m.%Y", "%d.%m.%y")
+    start_balance: str | None = None
+    end_balance: str | None = None
+    signature: str | None = None
+
+    def matches(self, head: bytes) -> bool:
+        """Checks if the beginning of an export matches the signature.
+
+        Formats without signature match everything. A UTF-8 byte order mark is skipped.
+
+        Args:
+            head: first bytes of an export
+
+        Returns:
+            true if head matches
+        """
+        if self.signature is None:
+            return True
+        text = head.removeprefix(codecs.BOM_UTF8).decode(self.encoding, errors="replace")
+        return re.search(self.signature, text) is not None
+
+
+_BUILTIN = {
+    "dkb": "ledgercli.banks.dkb:DKB",
+    "sp": "ledgercli.banks.sp:SP",
+}
+_registered: dict[str, BankFormat] = {}
+
+
+@cache
+def _entry_points() -> dict[str, EntryPoint]:
+    return {ep.name: ep for ep in entry_points(group=ENTRY_POINT_GROUP)}
+
+
+def register(bank_fmt: BankFormat) -> None:
+    """Registers a bank format at runtime.
+
+    Args:
+        bank_fmt: bank format spec
+    """
+    _registered[bank_fmt.name] = bank_fmt
+    get_bank_fmt.cache_clear()
+
+
+def list_bank_fmts() -> list[str]:
+    """Lists all registered bank formats without importing them.
+
+    Returns:
+        list of bank format names, built-in formats first
+    """
+    names = list(_BUILTIN)
+    for name in sorted([*_entry_points(), *_registered]):
+        if name not in names:
+            names.append(name)
+    return names
+
+
+@cache
+def get_bank_fmt(name: str) -> BankFormat:
+    """Loads a bank format.
+
+    Args:
+        name: bank format name
+
+    Returns:
+        bank format spec
+
+    Raises:
+        KeyError: bad bank format name
+    """
+    if name in _registered:
+        return _registered[name]
+    if name in _BUILTIN:
+        module, attr = _BUILTIN[name].split(":")
+        bank_fmt: BankFormat = getattr(import_module(module), attr)
+        return bank_fmt
+    if name in _entry_points():
+        loaded: BankFormat = _entry_points()[name].load()
+        return loaded
+    raise KeyError("The bank_fmt you provided is not supported.")
+
+
+def sniff(export_path: Path) -> bytes:
+    """Reads the first SNIFF_SIZE bytes of an export.
+
+    Args:
+        export_path: path to export
+
+    Returns:
+        first bytes of export
+    """
+    with open(export_path, "rb") as f:
+        return f.read(SNIFF_SIZE)
+
+
+def detect_bank_fmt(export_path: Path) -> str:
+    """Detects the bank format of an export from its first bytes.
+
+    Args:
+        export_path: path to export
+
+    Returns:
+        name of the first bank format with a matching signature
+
+    Raises:
+        KeyError: if no bank format matches
+    """
+    head = sniff(export_path)
+    for name in list_bank_fmts():
+        bank_fmt = get_bank_fmt(name)
+        if bank_fmt.signature is not None and bank_fmt.matches(head):
+            return name
+    raise KeyError(f"Couldn't detect the bank_fmt of {export_path}. Please supply a valid BANK_FMT!")
@@ -0,0 +1,10 @@
+"""DKB (Deutsche Kreditbank) Girokonto export."""
+from ledgercli.banks import BankFormat
+
+DKB = BankFormat(
+    name="dkb",
+    columns={"date": 0, "recipient": 3, "amount": 7},
+    skiprows=6,
+    end_balance="Kontostand vom",
+    signature=r'\A"Kontonummer:";(?s:.*)"Buchungstag";"Wertstellung";"Buchungstext"',
+)
@@ -0,0 +1,8 @@
+"""Sparkasse CSV-CAMT export."""
+from ledgercli.banks import BankFormat
+
+SP = BankFormat(
+    name="sp",
+    columns={"date": 2, "recipient": 11, "amount": 14},
+    signature=r'\A"?Auftragskonto"?;"?Buchungstag"?;"?Valutadatum"?;"?Buchungstext"?',
+)
@@ -1,12 +1,23 @@
-"""CLI for using the Ledger."""
+"""CLI for using the Ledger.
+
+pandas and numpy are only imported once a command runs, so help, shell completion and argument errors stay fast. If a
+daemon started with "ledgercli serve" is serving output_dir, commands are sent to it instead.
+"""
+import glob
+import sys
 from collections.abc import Callable
 from pathlib import Path
 from typing import Any
 
 import click
 
-from ledgercli.bankinterface import BankInterface
-from ledgercli.main import Ledger
+from ledgercli import daemon
+from ledgercli.banks import AUTO, list_bank_fmts
+from ledgercli.partition import PERIODS, FrozenPartitionError, Partitions
+from ledgercli.rules import RuleError
+from ledgercli.schema import SchemaError
+from ledgercli.state import PipelineState
+from ledgercli.storage import STORAGE_FMTS, get_storage
 
 
 @click.group()
@@ -34,20 +45,203 @@ def common_options(function: Callable[..., Any]) -> Callable[..., Any]:
     function = click.option(
         "-b",
         "--bank_fmt",
-        type=click.Choice(BankInterface().list_bank_fmts()),
+        type=click.Choice([AUTO, *list_bank_fmts()]),
+        nargs=1,
+        help="Specify from which bank your export is from, auto detects it from the export. If none is specified, bank_fmt falls back to its specification in metadata.csv in output_dir.",
+    )(function)
+    function = click.option(
+        "-s",
+        "--storage_fmt",
+        type=click.Choice(list(STORAGE_FMTS)),
         nargs=1,
-        help="Specify from which bank your export is from. If none is specified, bank_fmt falls back to its specification in metadata.csv in output_dir.",
+        help="Specify how tables are stored in output_dir. Binary formats need pyarrow. If none is specified, storage_fmt is detected from output_dir and defaults to csv.",
+    )(function)
+    function = click.option(
+        "--cents",
+        is_flag=True,
+        default=False,
+        help="Handle amounts as integer cents, so distributed amounts and balances add up exactly.",
+    )(function)
+    return function
+
+
+def partition_option(function: Callable[..., Any]) -> Callable[..., Any]:
+    """Reuse partition option."""
+    return click.option(
+        "-p",
+        "--partition",
+        type=click.Choice(list(PERIODS)),
+        help="Specify to split transactions, coalesced and distributed transactions and history into one file per year or month, so only changed periods get written. If none is specified, tables stay partitioned as they are.",
+    )(function)
+
+
+def fsync_option(function: Callable[..., Any]) -> Callable[..., Any]:
+    """Reuse fsync option."""
+    return click.option(
+        "--fsync",
+        is_flag=True,
+        default=False,
+        help="Flush written files to disk before they replace the stored ones, so a power loss can't lose or tear a write. Slower, files are replaced atomically either way.",
+    )(function)
+
+
+def profile_options(function: Callable[..., Any]) -> Callable[..., Any]:
+    """Reuse profiling options."""
+    function = click.option(
+        "--profile",
+        type=click.Path(dir_okay=False, writable=True, path_type=Path),
+        help="Record wall time, CPU time, peak RSS and rows of every stage and table read or written, and write them to this file as Chrome trace. Open it with chrome://tracing, Perfetto or speedscope.",
+    )(function)
+    function = click.option(
+        "--cprofile",
+        type=click.Path(file_okay=False, writable=True, path_type=Path),
+        help="Dump a cProfile profile of every stage into this dir, e.g. to view with snakeviz.",
     )(function)
     return function
 
 
+def profiler_hooks(output_dir: Path, profile: Path | None, cprofile: Path | None) -> list[Any]:
+    """Creates the hooks for profiling a command.
+
+    Args:
+        output_dir: dir where files get written to
+        profile: path to write the Chrome trace to
+        cprofile: dir to dump cProfile profiles to
+
+    Returns:
+        a Profiler if profiling was asked for, otherwise no hooks
+
+    Raises:
+        ClickException: if a daemon is serving output_dir
+    """
+    if profile is None and cprofile is None:
+        return []
+    if daemon.is_running(output_dir):
+        raise click.ClickException("Can't profile while a daemon is serving output_dir, please stop it first!")
+
+    from ledgercli.profiling import Profiler
+
+    return [Profiler(cprofile_dir=cprofile)]
+
+
+def report_profile(hooks: list[Any], profile: Path | None) -> None:
+    """Writes the Chrome trace and prints a summary of the recorded spans.
+
+    Args:
+        hooks: hooks created by profiler_hooks
+        profile: path to write the Chrome trace to
+    """
+    for profiler in hooks:
+        click.echo("\n".join(profiler.summary()), err=True)
+        if profile is not None:
+            profiler.write(profile)
+            click.echo(f"Wrote profile to {profile}.", err=True)
+
+
 @cli.command("update")
 @common_options
-def update_mp(output_dir: Path, bank_fmt: str | None) -> None:
+@partition_option
+@fsync_option
+@profile_options
+def update_mp(
+    output_dir: Path,
+    bank_fmt: str | None,
+    storage_fmt: str | None,
+    cents: bool,
+    partition: str | None,
+    fsync: bool,
+    profile: Path | None,
+    cprofile: Path | None,
+) -> None:
     """Updates the Ledger."""
-    ledger = Ledger(output_dir=output_dir, bank_fmt=bank_fmt)
-    ledger.update()
+    hooks = profiler_hooks(output_dir, profile, cprofile)
+    if daemon.is_running(output_dir):
+        daemon_request(output_dir, "update", timeout=None, partition=partition)
+        return
+
+    repartition = partition not in [None, Partitions.read(output_dir).period]
+    if repartition is False and PipelineState.read(output_dir).is_clean(get_storage(storage_fmt, output_dir)):
+        click.echo("Ledger is up to date.")
+        report_profile(hooks, profile)
+        return
+
+    from ledgercli.main import Ledger
+
+    try:
+        ledger = Ledger(
+            output_dir=output_dir,
+            bank_fmt=bank_fmt,
+            storage_fmt=storage_fmt,
+            cents=cents,
+            partition=partition,
+            hooks=hooks,
+            fsync=fsync,
+        )
+        ledger.update()
+    except (FrozenPartitionError, RuleError, SchemaError) as exc:
+        raise click.ClickException(str(exc)) from exc
     ledger.write()
+    report_profile(hooks, profile)
+
+
+def daemon_request(output_dir: Path, command: str, **args: Any) -> Any:
+    """Sends a command to the daemon serving output_dir.
+
+    Args:
+        output_dir: dir where files get written to
+        command: command name
+        **args: command arguments and timeout, see daemon.request; commands changing the ledger pass None, so they
+            aren't reported as failed while the daemon still runs them
+
+    Returns:
+        result of the command
+
+    Raises:
+        ClickException: if the command failed
+    """
+    try:
+        return daemon.request(output_dir, command, **args)
+    except (ConnectionError, daemon.DaemonError) as exc:
+        raise click.ClickException(str(exc)) from exc
+
+
+def echo_import_errors(errors: dict[Any, Any]) -> None:
+    """Prints why exports couldn't be imported.
+
+    Args:
+        errors: error per export path
+    """
+    for path, error in errors.items():
+        click.echo(f"Couldn't import {path}: {error}", err=True)
+
+
+def expand_export_paths(patterns: tuple[str, ...]) -> list[Path]:
+    """Expands files, directories and glob patterns to export paths.
+
+    Directories expand to all CSV files directly inside them.
+
+    Args:
+        patterns: files, directories or glob patterns
+
+    Returns:
+        sorted list of unique export paths
+
+    Raises:
+        BadParameter: if a pattern matches no files
+    """
+    paths: set[Path] = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = list(path.glob("*.csv"))
+        elif path.is_file():
+            matches = [path]
+        else:
+            matches = [Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file()]
+        if not matches:
+            raise click.BadParameter(f"{pattern} matches no exports.", param_hint="'-e' / '--export_path'")
+        paths.update(matches)
+    return sorted(paths)
 
 
 @cli.command("import")
@@ -55,20 +249,281 @@ def update_mp(output_dir: Path, bank_fmt: str | None) -> None:
 @click.option(
     "-e",
     "--export_path",
-    type=click.Path(
-        exists=True,
-        file_okay=True,
-        dir_okay=False,
-        writable=False,
-        readable=True,
-        path_type=Path,
-    ),
+    "export_paths",
+    multiple=True,
+    help="Specify an export, a directory of exports or a glob pattern in order to add new transactions to your ledger. Can be used multiple times. If left empty, ledger will just update.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Specify how many processes parse exports in parallel. Defaults to the number of CPUs.",
+)
+@click.option(
+    "-c",
+    "--chunksize",
+    type=click.IntRange(min=1),
     default=None,
-    help="Specify a path to an export in order to add new transactions to your ledger. If left empty, ledger will just update.",
+    help="Stream exports one after another in chunks of this many transactions, keeping memory use bounded for very large exports.",
 )
-def import_tx(output_dir: Path, export_path: Path, bank_fmt: str | None) -> None:
+@partition_option
+@fsync_option
+@profile_options
+def import_tx(
+    output_dir: Path,
+    export_paths: tuple[str, ...],
+    bank_fmt: str | None,
+    storage_fmt: str | None,
+    cents: bool,
+    jobs: int | None,
+    chunksize: int | None,
+    partition: str | None,
+    fsync: bool,
+    profile: Path | None,
+    cprofile: Path | None,
+) -> None:
     """Imports transactions and updates the Ledger."""
-    ledger = Ledger(output_dir=output_dir, bank_fmt=bank_fmt)
-    ledger.import_tx(export_path=export_path)
-    ledger.update()
-    ledger.write()
+    paths = expand_export_paths(export_paths)
+    hooks = profiler_hooks(output_dir, profile, cprofile)
+
+    errors: dict[Any, Any] = {}
+    if daemon.is_running(output_dir):
+        errors = daemon_request(
+            output_dir,
+            "import",
+            timeout=None,
+            export_paths=[str(p.resolve()) for p in paths],
+            bank_fmt=bank_fmt,
+            max_workers=jobs,
+            chunksize=chunksize,
+            partition=partition,
+        )
+        echo_import_errors(errors)
+    else:
+        from ledgercli.main import Ledger
+
+        try:
+            ledger = Ledger(
+                output_dir=output_dir,
+                bank_fmt=bank_fmt,
+                storage_fmt=storage_fmt,
+                cents=cents,
+                partition=partition,
+                hooks=hooks,
+                fsync=fsync,
+            )
+            if paths:
+                with click.progressbar(length=len(paths), label="Parsing exports", file=sys.stderr) as bar:
+                    errors = ledger.import_many(
+                        paths, max_workers=jobs, progress=lambda _: bar.update(1), chunksize=chunksize
+                    )
+                echo_import_errors(errors)
+            # a new ledger has no metadata until an export was imported, there is nothing to update or write yet
+            if ledger.metadata.empty is False:
+                ledger.update()
+        except (FrozenPartitionError, RuleError, SchemaError) as exc:
+            raise click.ClickException(str(exc)) from exc
+        if ledger.metadata.empty is False:
+            ledger.write()
+        report_profile(hooks, profile)
+
+    if errors:
+        click.echo(f"Imported {len(paths) - len(errors)} of {len(paths)} exports.", err=True)
+        sys.exit(1)
+
+
+@cli.command("export")
+@common_options
+def export_csv(output_dir: Path, bank_fmt: str | None, storage_fmt: str | None, cents: bool) -> None:
+    """Exports hand-editable tables as CSV."""
+    if daemon.is_running(output_dir):
+        for path in daemon_request(output_dir, "export", timeout=None):
+            click.echo(path)
+        return
+
+    from ledgercli.main import Ledger
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt=bank_fmt, storage_fmt=storage_fmt, cents=cents)
+    for path in ledger.export_csv():
+        click.echo(path)
+
+
+@cli.command("freeze")
+@common_options
+@click.option(
+    "-u",
+    "--until",
+    required=True,
+    help="Specify the last year or month to freeze, e.g. 2023 or 2023-12. All earlier ones are frozen as well.",
+)
+@fsync_option
+def freeze(
+    output_dir: Path, bank_fmt: str | None, storage_fmt: str | None, cents: bool, until: str, fsync: bool
+) -> None:
+    """Freezes closed periods of a partitioned Ledger.
+
+    Frozen partitions are checksummed and never written again: mapping changes and hand-edits don't apply to them
+    anymore and importing transactions into them fails. History continues from their closing balance.
+    """
+    if daemon.is_running(output_dir):
+        keys = daemon_request(output_dir, "freeze", timeout=None, until=until)
+    else:
+        from ledgercli.main import Ledger
+
+        try:
+            ledger = Ledger(output_dir=output_dir, bank_fmt=bank_fmt, storage_fmt=storage_fmt, cents=cents, fsync=fsync)
+            keys = ledger.freeze(until)
+        except (ValueError, FrozenPartitionError) as exc:
+            raise click.ClickException(str(exc)) from exc
+
+    for key in keys:
+        click.echo(f"Froze {key}.")
+    if not keys:
+        click.echo("Nothing to freeze.")
+
+
+@cli.command("serve")
+@common_options
+@click.option(
+    "-f",
+    "--flush-interval",
+    type=click.FloatRange(min=0),
+    default=60.0,
+    show_default=True,
+    help="Specify after how many seconds updated tables get written to output_dir, 0 writes them after every command.",
+)
+def serve(output_dir: Path, bank_fmt: str | None, storage_fmt: str | None, cents: bool, flush_interval: float) -> None:
+    """Keeps the Ledger in memory and serves the other commands until stopped.
+
+    Commands run against output_dir use the daemon while it's running. Changes are written to output_dir on a
+    schedule, with "ledgercli flush" and on shutdown.
+    """
+    import signal
+
+    from ledgercli.daemon import LedgerServer
+
+    try:
+        server = LedgerServer(output_dir, bank_fmt, storage_fmt=storage_fmt, cents=cents, flush_interval=flush_interval)
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc)) from exc
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    click.echo(f"Serving {output_dir} on {daemon.socket_path(output_dir)}", err=True)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command("flush")
+@click.option(
+    "-o",
+    "--output-dir",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path),
+    default=Path.cwd(),
+    help="Specify the directory the daemon is serving. Defaults to current working dir.",
+)
+@click.option("--stop", is_flag=True, default=False, help="Stop the daemon after flushing.")
+def flush(output_dir: Path, stop: bool) -> None:
+    """Writes the changes a daemon holds in memory to output_dir."""
+    if daemon.is_running(output_dir) is False:
+        click.echo("No daemon is running.")
+        return
+
+    for table in daemon_request(output_dir, "flush", timeout=None):
+        click.echo(f"Flushed {table}.")
+    if stop:
+        daemon_request(output_dir, "shutdown", timeout=None)
+
+
+@cli.command("query")
+@click.option(
+    "-o",
+    "--output-dir",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, readable=True, path_type=Path),
+    default=Path.cwd(),
+    help="Specify the directory of the ledger. Defaults to current working dir.",
+)
+@click.option(
+    "-s",
+    "--storage_fmt",
+    type=click.Choice(list(STORAGE_FMTS)),
+    help="Specify how tables are stored in output_dir. If none is specified, storage_fmt is detected from output_dir.",
+)
+@click.option(
+    "-t",
+    "--table",
+    type=click.Choice(["transactions", "tx_coalesced", "tx_distributed"]),
+    default="tx_distributed",
+    show_default=True,
+    help="Specify which table to query.",
+)
+@click.option(
+    "--from", "start", type=click.DateTime(["%Y-%m-%d"]), help="Only show transactions on or after this date."
+)
+@click.option("--to", "end", type=click.DateTime(["%Y-%m-%d"]), help="Only show transactions on or before this date.")
+@click.option("--label1", help="Only show transactions with this label1.")
+@click.option("--label2", help="Only show transactions with this label2.")
+@click.option("--label3", help="Only show transactions with this label3.")
+@click.option("-r", "--recipient", help="Only show transactions whose recipient contains this, ignoring case.")
+@click.option("--min-amount", type=float, help="Only show transactions with at least this amount.")
+@click.option("--max-amount", type=float, help="Only show transactions with at most this amount.")
+@click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(["csv", "json"]),
+    default="csv",
+    show_default=True,
+    help="Specify the output format, json writes one object per line.",
+)
+def query(output_dir: Path, storage_fmt: str | None, table: str, fmt: str, **filters: Any) -> None:
+    """Prints transactions matching all given filters.
+
+    Only the parts of the stored table that can contain matches are read, results are printed as they are found.
+    CSV tables are read from their first row, ledgers stored with -s parquet skip the parts that can't match.
+    """
+    if daemon.is_running(output_dir):
+        filters = {k: v.strftime("%Y-%m-%d") if k in ["start", "end"] and v else v for k, v in filters.items()}
+        click.echo(daemon_request(output_dir, "query", table=table, fmt=fmt, **filters), nl=False)
+        return
+
+    from ledgercli.query import Query, dump, scan
+
+    storage = get_storage(storage_fmt, output_dir)
+    if storage.exists(table) is False:
+        raise click.ClickException(f"There is no {table} table in {output_dir}. Please import an export first!")
+    dates = Partitions.read(output_dir).dates.get(table)
+    for text in dump(scan(storage, table, Query.from_dict(filters), dates=dates), fmt):
+        click.echo(text, nl=False)
+
+
+@cli.command("dashboard")
+@click.option(
+    "-o",
+    "--output-dir",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, readable=True, path_type=Path),
+    default=Path.cwd(),
+    help="Specify the directory of the ledger. Defaults to current working dir.",
+)
+@click.option(
+    "-s",
+    "--storage_fmt",
+    type=click.Choice(list(STORAGE_FMTS)),
+    help="Specify how tables are stored in output_dir. If none is specified, storage_fmt is detected from output_dir.",
+)
+@click.option("--host", default="127.0.0.1", show_default=True, help="Specify the address to listen on.")
+@click.option("-p", "--port", type=click.IntRange(0, 65535), default=8000, show_default=True, help="Specify the port.")
+def dashboard(output_dir: Path, storage_fmt: str | None, host: str, port: int) -> None:
+    """Serves a local dashboard of the Ledger until stopped."""
+    from ledgercli.dashboard import Dashboard, DashboardServer
+
+    server = DashboardServer(Dashboard(output_dir, storage_fmt=storage_fmt), host=host, port=port)
+    click.echo(f"Serving dashboard on {server.url}", err=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,317 @@
+"""Daemon.
+
+This module keeps a Ledger in memory and serves it over a Unix socket in output_dir, so repeated commands skip
+interpreter start, imports and reading tables. Changes are flushed to disk on a schedule, on demand and on shutdown.
+
+Requests and responses are single lines of JSON. A request names a command and its arguments, e.g.
+{"command": "import", "args": {"export_paths": ["export.csv"]}}. A response either holds the result,
+{"ok": true, "result": ...}, or an error message, {"ok": false, "error": "..."}.
+
+The client side doesn't import pandas, so the CLI can check for a running daemon without slowing down.
+"""
+import json
+import os
+import socket
+import socketserver
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from ledgercli.banks import AUTO, list_bank_fmts
+from ledgercli.state import TABLES, PipelineState
+
+if TYPE_CHECKING:
+    from ledgercli.main import Ledger
+
+SOCKET = ".ledgercli.sock"
+
+# seconds a connection may stall while a request or response is sent, so a stuck client can't block the daemon
+TIMEOUT = 10.0
+
+
+class DaemonError(Exception):
+    """Raised on the client side if the daemon couldn't handle a request."""
+
+
+def socket_path(output_dir: Path) -> Path:
+    """Returns the path of the daemon socket.
+
+    Args:
+        output_dir: dir where files get written to
+
+    Returns:
+        path of socket
+    """
+    return output_dir / SOCKET
+
+
+def is_running(output_dir: Path) -> bool:
+    """Checks if a daemon is serving output_dir.
+
+    Args:
+        output_dir: dir where files get written to
+
+    Returns:
+        true if the socket accepts connections
+    """
+    path = socket_path(output_dir)
+    if path.exists() is False:
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(TIMEOUT)
+        try:
+            sock.connect(str(path))
+        except OSError:
+            return False
+    return True
+
+
+def request(output_dir: Path, command: str, timeout: float | None = 600.0, **args: Any) -> Any:
+    """Sends a command to the daemon serving output_dir.
+
+    Args:
+        output_dir: dir where files get written to
+        command: command name
+        timeout: seconds to wait for the result, waits as long as the command runs if None
+        **args: command arguments, need to be JSON serializable
+
+    Returns:
+        result of the command
+
+    Raises:
+        ConnectionError: if no daemon is running
+        DaemonError: if the command failed or the daemon didn't respond in time
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(TIMEOUT)
+        try:
+            sock.connect(str(socket_path(output_dir)))
+        except OSError as exc:
+            raise ConnectionError(f"No daemon is serving {output_dir}.") from exc
+        with sock.makefile("rwb") as f:
+            try:
+                f.write(json.dumps({"command": command, "args": args}).encode() + b"\n")
+                f.flush()
+                sock.settimeout(timeout)
+                line = f.readline()
+            except TimeoutError as exc:
+                raise DaemonError(f"The daemon didn't respond in time to {command}.") from exc
+
+    if not line:
+        raise DaemonError("The daemon closed the connection.")
+    response = json.loads(line)
+    if response["ok"] is False:
+        raise DaemonError(response["error"])
+    return response["result"]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handles one request per connection."""
+
+    server: "LedgerServer"
+    timeout = TIMEOUT
+
+    def handle(self) -> None:
+        try:
+            line = self.rfile.readline()
+        except TimeoutError:
+            # the client stalled sending its request
+            return
+        if not line:
+            # connection only checked if the daemon is running
+            return
+        try:
+            message = json.loads(line)
+            response = {"ok": True, "result": self.server.dispatch(message["command"], message.get("args", {}))}
+        except Exception as exc:
+            response = {"ok": False, "error": str(exc) or type(exc).__name__}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class LedgerServer(socketserver.UnixStreamServer):
+    """LedgerServer.
+
+    Requests are handled one after another in the serving thread, so the Ledger never gets accessed concurrently.
+    Between requests, unflushed changes get written once they are older than flush_interval. If tables are changed on
+    disk while there are no unflushed changes, e.g. by hand-editing the mapping, the Ledger is read again before the
+    next request. Hand-edits made while changes are unflushed get overwritten by the next flush.
+    """
+
+    ledger: "Ledger"
+
+    def __init__(
+        self,
+        output_dir: Path,
+        bank_fmt: str | None,
+        storage_fmt: str | None = None,
+        cents: bool = False,
+        flush_interval: float = 60.0,
+    ) -> None:
+        """Initializes the server and reads the Ledger.
+
+        Args:
+            output_dir: dir where files get written to
+            bank_fmt: which bank format to parse, "auto" detects it for every export
+            storage_fmt: which storage format to read and write tables with
+            cents: if true, amounts are handled as int64 cents
+            flush_interval: seconds unflushed changes are kept in memory, 0 flushes them after every request
+
+        Raises:
+            RuntimeError: if a daemon is already serving output_dir
+        """
+        if is_running(output_dir):
+            raise RuntimeError(f"A daemon is already serving {output_dir}.")
+        socket_path(output_dir).unlink(missing_ok=True)
+
+        self.output_dir = output_dir
+        self.bank_fmt = bank_fmt
+        self.storage_fmt = storage_fmt
+        self.cents = cents
+        self.flush_interval = flush_interval
+        # handle_request waits this long for a connection, then the serving loop checks for changes due to be flushed
+        self.timeout = min(flush_interval, 1.0) if flush_interval > 0 else 1.0
+        self.running = False
+        self.commands: dict[str, Callable[..., Any]] = {
+            "import": self._import,
+            "update": self._update,
+            "query": self._query,
+            "export": self._export,
+            "freeze": self._freeze,
+            "flush": self.flush,
+            "status": self._status,
+            "shutdown": self._shutdown,
+        }
+        self._load()
+        super().__init__(str(socket_path(output_dir)), _Handler)
+
+    def serve(self) -> None:
+        """Serves requests until a shutdown request, flushing changes before returning."""
+        self.running = True
+        try:
+            while self.running:
+                self.handle_request()
+                if self._unflushed() and time.monotonic() - self._dirty_since >= self.flush_interval:
+                    self.flush()
+        finally:
+            self._shutdown()
+
+    def dispatch(self, command: str, args: dict[str, Any]) -> Any:
+        """Runs a command against the Ledger.
+
+        Args:
+            command: command name
+            args: command arguments
+
+        Returns:
+            JSON serializable result
+
+        Raises:
+            KeyError: unknown command
+        """
+        if command not in self.commands:
+            raise KeyError(f"Unknown command {command}.")
+        if self._unflushed() is False and self._stamp != self._files_stamp():
+            self._load()
+
+        dirty = self._unflushed()
+        result = self.commands[command](**args)
+        if dirty is False and self._unflushed():
+            self._dirty_since = time.monotonic()
+        return result
+
+    def flush(self) -> list[str]:
+        """Writes unflushed changes.
+
+        Returns:
+            names of flushed tables
+        """
+        if self._unflushed() is False:
+            return []
+        flushed = self.ledger.unwritten
+        self.ledger.write()
+        self._stamp = self._files_stamp()
+        return flushed
+
+    def _load(self) -> None:
+        from ledgercli.main import Ledger
+
+        self.ledger = Ledger(self.output_dir, self.bank_fmt, storage_fmt=self.storage_fmt, cents=self.cents)
+        self._stamp = self._files_stamp()
+        self._dirty_since = time.monotonic()
+        if self.ledger.changed and self.ledger.metadata.empty is False:
+            # tables were edited since the last write, keep the ones derived from them consistent
+            self.ledger.update()
+
+    def _files_stamp(self) -> dict[str, list[int]]:
+        """Returns size and modification time of all table files and the state file."""
+        storage = self.ledger.storage
+        paths = [p for table in TABLES for p in storage.files(table)]
+        state = self.output_dir / PipelineState.file
+        return PipelineState.stats([*paths, state] if state.exists() else paths)
+
+    def _unflushed(self) -> bool:
+        """Checks if updated tables haven't been written yet."""
+        return bool(self.ledger.unwritten)
+
+    def _import(
+        self,
+        export_paths: list[str],
+        bank_fmt: str | None = None,
+        max_workers: int | None = None,
+        chunksize: int | None = None,
+        partition: str | None = None,
+    ) -> dict[str, str]:
+        if bank_fmt is not None and bank_fmt != AUTO and bank_fmt not in list_bank_fmts():
+            raise KeyError("Please supply a valid BANK_FMT!")
+        if partition is not None:
+            self.ledger.partition_by(partition)
+        # the bank format only applies to this request, later ones fall back to the daemon's
+        default = self.ledger.bank_fmt
+        self.ledger.bank_fmt = bank_fmt or default
+        try:
+            errors = self.ledger.import_many(
+                [Path(p) for p in export_paths], max_workers=max_workers, chunksize=chunksize
+            )
+        finally:
+            self.ledger.bank_fmt = default
+        self.ledger.update()
+        return {str(path): str(exc) for path, exc in errors.items()}
+
+    def _update(self, partition: str | None = None) -> None:
+        if partition is not None:
+            self.ledger.partition_by(partition)
+        self.ledger.update()
+
+    def _query(self, table: str = "tx_distributed", fmt: str = "csv", **filters: Any) -> str:
+        from ledgercli.query import Query, dump
+
+        return "".join(dump(self.ledger.query(Query.from_dict(filters), table), fmt))
+
+    def _freeze(self, until: str) -> list[str]:
+        keys = self.ledger.freeze(until)
+        self._stamp = self._files_stamp()
+        return keys
+
+    def _export(self) -> list[str]:
+        self.flush()
+        paths = [str(p) for p in self.ledger.export_csv()]
+        self._stamp = self._files_stamp()
+        return paths
+
+    def _status(self) -> dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "generation": self.ledger.state.generation,
+            "unflushed": self.ledger.unwritten,
+            "rows": self.ledger.rows(),
+        }
+
+    def _shutdown(self) -> None:
+        """Flushes changes and stops accepting connections, before the response to a shutdown request is sent."""
+        self.running = False
+        if self.socket.fileno() == -1:
+            return
+        self.flush()
+        self.server_close()
+        socket_path(self.output_dir).unlink(missing_ok=True)
@@ -0,0 +1,254 @@
+"""Dashboard.
+
+This module serves a local dashboard of a ledger over HTTP, rendered as plain HTML with inline SVG charts.
+
+Pages are built from small aggregates: history and the rollups by month and by recipient. Only the needed columns are
+read, memory-mapped with the binary storage formats. Responses are kept in an LRU cache keyed by the ledger's write
+generation, so they are computed once per write and served from memory afterwards.
+"""
+import html
+import json
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from ledgercli.state import PipelineState
+from ledgercli.storage import get_storage
+
+PAGE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>ledgercli</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em auto; max-width: 860px; color: #222; }}
+h2 {{ font-size: 1.1em; margin-top: 2em; }}
+svg text {{ font-size: 11px; fill: #444; }}
+.note {{ color: #888; font-size: 0.9em; }}
+</style>
+</head>
+<body>
+<h1>ledgercli</h1>
+<p class="note">{note}</p>
+{sections}
+</body>
+</html>
+"""
+
+
+class Dashboard:
+    """Dashboard.
+
+    Renders pages and JSON aggregates of the ledger in output_dir. It only reads the stored tables, changes held in
+    memory by a daemon show up once they are flushed.
+    """
+
+    def __init__(self, output_dir: Path, storage_fmt: str | None = None, cache_size: int = 64, top: int = 15) -> None:
+        """Initializes the dashboard.
+
+        Args:
+            output_dir: dir where the ledger is stored
+            storage_fmt: storage format of the ledger, detected from output_dir if None
+            cache_size: maximum number of cached responses
+            top: number of labels and recipients shown
+        """
+        self.output_dir = output_dir
+        self.storage = get_storage(storage_fmt, output_dir)
+        self.top = top
+        self._respond = lru_cache(maxsize=cache_size)(self._render)
+        self._aggregates = lru_cache(maxsize=1)(self._load_aggregates)
+
+    def generation(self) -> int:
+        """Returns the write generation of the ledger, responses are cached per generation."""
+        return PipelineState.read(self.output_dir).generation
+
+    def respond(self, path: str) -> tuple[int, str, bytes]:
+        """Responds to a request.
+
+        Args:
+            path: request path including the query string
+
+        Returns:
+            status code, content type and body
+        """
+        return self._respond(urlsplit(path).path, self.generation())
+
+    def _render(self, path: str, generation: int) -> tuple[int, str, bytes]:
+        if path not in ["/", "/history.json", "/months.json", "/labels.json", "/recipients.json"]:
+            return 404, "text/plain; charset=utf-8", b"Not found"
+
+        aggregates = self._aggregates(generation)
+        if path == "/":
+            return 200, "text/html; charset=utf-8", self._page(aggregates).encode()
+
+        frame = aggregates[path.removeprefix("/").removesuffix(".json")]
+        records = json.loads(frame.to_json(orient="records", date_format="iso", date_unit="s"))
+        return 200, "application/json", json.dumps(records).encode()
+
+    def _load_aggregates(self, generation: int) -> dict[str, pd.DataFrame]:
+        """Reads the aggregates pages are built from.
+
+        Args:
+            generation: write generation, only used as cache key
+
+        Returns:
+            history, income and expenses per month, spend per label and spend per recipient
+        """
+        empty = {
+            "history": pd.DataFrame({"date": [], "balance": []}),
+            "months": pd.DataFrame({"month": [], "income": [], "expense": []}),
+            "labels": pd.DataFrame({"label": [], "spend": []}),
+            "recipients": pd.DataFrame({"recipient": [], "spend": []}),
+        }
+        if not all(self.storage.exists(t) for t in ["history", "rollup_month", "rollup_recipient"]):
+            return empty
+
+        history = self.storage.read("history", columns=["date", "balance"])
+        history["date"] = pd.to_datetime(history["date"])
+
+        rollup = self.storage.read("rollup_month", columns=["month", "type", "label1", "amount"])
+        months = rollup.pivot_table(
+            index="month", columns="type", values="amount", aggfunc="sum", fill_value=0, observed=True
+        )
+        months = months.reindex(columns=["income", "expense"], fill_value=0).reset_index()
+        months["month"] = pd.to_datetime(months["month"])
+        months["expense"] = -months["expense"]
+
+        expenses = rollup[rollup["type"] == "expense"]
+        labels = self._spend(expenses["label1"], expenses["amount"]).nlargest(self.top)
+
+        by_recipient = self.storage.read("rollup_recipient", columns=["recipient", "type", "amount"])
+        expenses = by_recipient[by_recipient["type"] == "expense"]
+        recipients = self._spend(expenses["recipient"], expenses["amount"]).nlargest(self.top)
+
+        return {
+            "history": history,
+            "months": months.rename_axis(columns=None),
+            "labels": labels.rename_axis("label").rename("spend").reset_index(),
+            "recipients": recipients.rename_axis("recipient").rename("spend").reset_index(),
+        }
+
+    @staticmethod
+    def _spend(keys: pd.Series, amounts: pd.Series) -> pd.Series:
+        """Sums up negated amounts by key, grouping categorical keys by their codes and missing keys as empty."""
+        spend = -amounts.groupby(keys, observed=True, dropna=False).sum()
+        spend.index = spend.index.astype(object).fillna("").astype(str)
+        return spend.groupby(level=0).sum()
+
+    def _page(self, aggregates: dict[str, pd.DataFrame]) -> str:
+        history, months = aggregates["history"], aggregates["months"]
+        labels, recipients = aggregates["labels"], aggregates["recipients"]
+        if history.empty:
+            note = f"No ledger found in {self.output_dir}. Import an export first!"
+        else:
+            note = f"{history['date'].min():%Y-%m-%d} to {history['date'].max():%Y-%m-%d}"
+
+        sections = [
+            ("Balance", _line_chart(history["date"], {"balance": history["balance"]})),
+            ("Income and expenses", _line_chart(months["month"], {k: months[k] for k in ["income", "expense"]})),
+            ("Spend by label", _bar_chart(labels["label"].replace("", "(no label)"), labels["spend"])),
+            ("Spend by recipient", _bar_chart(recipients["recipient"], recipients["spend"])),
+        ]
+        body = "\n".join(f"<h2>{title}</h2>\n{chart}" for title, chart in sections)
+        return PAGE.format(note=html.escape(note), sections=body)
+
+
+COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e"]
+
+
+def _line_chart(x: pd.Series, series: dict[str, Any], width: int = 840, height: int = 240) -> str:
+    """Renders series sharing dates as SVG polylines."""
+    if len(x) == 0:
+        return '<p class="note">No data.</p>'
+
+    pad = 40
+    t = pd.to_datetime(x).to_numpy(dtype="datetime64[s]").astype("int64")
+    values = {k: pd.Series(v).to_numpy(dtype="float64") for k, v in series.items()}
+    lo = min(0.0, *(v.min() for v in values.values()))
+    hi = max(0.0, *(v.max() for v in values.values()))
+    span_t = max(int(t.max() - t.min()), 1)
+    span_v = (hi - lo) or 1.0
+
+    def px(ts: Any, v: Any) -> tuple[Any, Any]:
+        return pad + (ts - t.min()) / span_t * (width - 2 * pad), height - pad - (v - lo) / span_v * (height - 2 * pad)
+
+    _, zero = px(t.min(), 0.0)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">',
+        f'<line x1="{pad}" y1="{zero:.1f}" x2="{width - pad}" y2="{zero:.1f}" stroke="#ccc"/>',
+        f'<text x="2" y="{pad}">{hi:,.0f}</text><text x="2" y="{height - pad}">{lo:,.0f}</text>',
+        f'<text x="{pad}" y="{height - 10}">{pd.Timestamp(x.min()):%Y-%m-%d}</text>',
+        f'<text x="{width - pad}" y="{height - 10}" text-anchor="end">{pd.Timestamp(x.max()):%Y-%m-%d}</text>',
+    ]
+    for i, (name, v) in enumerate(values.items()):
+        xs, ys = px(t, v)
+        points = " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(xs, ys, strict=True))
+        color = COLORS[i % len(COLORS)]
+        parts.append(f'<polyline fill="none" stroke="{color}" stroke-width="1.5" points="{points}"/>')
+        parts.append(f'<text x="{width - pad}" y="{14 * (i + 1)}" text-anchor="end" fill="{color}">{name}</text>')
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def _bar_chart(labels: pd.Series, values: pd.Series, width: int = 840, bar: int = 18) -> str:
+    """Renders labelled values as SVG horizontal bars."""
+    if len(labels) == 0:
+        return '<p class="note">No data.</p>'
+
+    offset = 200
+    top = max(float(values.max()), 1.0)
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{len(labels) * (bar + 4)}">']
+    for i, (label, value) in enumerate(zip(labels, values, strict=True)):
+        y = i * (bar + 4)
+        length = max(value, 0) / top * (width - offset - 80)
+        name = html.escape(str(label)[:32])
+        parts.append(f'<text x="{offset - 6}" y="{y + bar - 5}" text-anchor="end">{name}</text>')
+        parts.append(f'<rect x="{offset}" y="{y}" width="{length:.1f}" height="{bar}" fill="{COLORS[0]}"/>')
+        parts.append(f'<text x="{offset + length + 4:.1f}" y="{y + bar - 5}">{value:,.2f}</text>')
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves dashboard responses."""
+
+    server: "DashboardServer"
+
+    def do_GET(self) -> None:  # noqa: N802
+        status, content_type, body = self.server.dashboard.respond(self.path)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+
+class DashboardServer(ThreadingHTTPServer):
+    """DashboardServer.
+
+    Serves a Dashboard on a local address, every request in its own thread.
+    """
+
+    def __init__(self, dashboard: Dashboard, host: str = "127.0.0.1", port: int = 8000) -> None:
+        """Initializes the server.
+
+        Args:
+            dashboard: dashboard to serve
+            host: address to listen on
+            port: port to listen on, 0 picks a free one
+        """
+        self.dashboard = dashboard
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self) -> str:
+        """Returns the URL the dashboard is served on."""
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}/"
@@ -0,0 +1,168 @@
+"""FingerprintIndex.
+
+This module provides a persistent index of transaction fingerprints, used to skip already imported transactions.
+"""
+import io
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from ledgercli.storage import write_atomic
+
+
+class FingerprintIndex:
+    """FingerprintIndex.
+
+    A fingerprint is a 64 bit hash over date, amount (in cents), recipient and an occurrence counter. The counter
+    numbers identical date/amount/recipient rows within one table, so true same-day duplicates stay distinct. Tables
+    read in chunks keep counting across chunks. Fingerprints are kept as a sorted array plus a sorted buffer of recent
+    additions. The buffer is merged into the array once it outgrows a fraction of it, so adding costs amortized time
+    proportional to the number of new rows instead of a copy of the whole index per import.
+    """
+
+    merge_fraction = 16
+    merge_min = 1 << 16
+
+    def __init__(self, fingerprints: npt.NDArray[np.uint64] | None = None) -> None:
+        """Initializes the index.
+
+        Args:
+            fingerprints: array of fingerprints, doesn't need to be sorted or unique
+        """
+        if fingerprints is None:
+            fingerprints = np.empty(0, dtype="uint64")
+        self._sorted: npt.NDArray[np.uint64] = np.unique(np.asarray(fingerprints, dtype="uint64"))
+        self._pending: npt.NDArray[np.uint64] = np.empty(0, dtype="uint64")
+
+    def __len__(self) -> int:
+        """Returns number of indexed fingerprints."""
+        return len(self._sorted) + len(self._pending)
+
+    @property
+    def fingerprints(self) -> npt.NDArray[np.uint64]:
+        """Returns all indexed fingerprints as a sorted array, merging buffered additions first."""
+        self._merge()
+        return self._sorted
+
+    @staticmethod
+    def fingerprint(tx: pd.DataFrame, counts: dict[tuple[Any, ...], int] | None = None) -> npt.NDArray[np.uint64]:
+        """Calculates fingerprints for transactions.
+
+        Args:
+            tx: transactions dataframe with date, amount and recipient columns
+            counts: occurrences of date/amount/recipient rows in previous chunks of the same table, gets updated with
+                the rows of tx. Counters start at zero if None.
+
+        Returns:
+            array of uint64 fingerprints, one per row
+        """
+        keys = pd.DataFrame(
+            {
+                "date": pd.to_datetime(tx["date"]).to_numpy(dtype="datetime64[D]").astype("int64"),
+                "amount": np.round(tx["amount"].to_numpy(dtype="float64") * 100).astype("int64"),
+                "recipient": tx["recipient"].fillna("").astype(str).to_numpy(),
+            }
+        )
+        groups = keys.groupby(["date", "amount", "recipient"], sort=False)
+        keys["counter"] = groups.cumcount()
+        if counts is not None:
+            sizes = groups.size()
+            offsets = np.array([counts.get(k, 0) for k in sizes.index], dtype="int64")
+            keys["counter"] += offsets[groups.ngroup().to_numpy()]
+            counts.update(zip(sizes.index, offsets + sizes.to_numpy(), strict=True))
+        return np.asarray(pd.util.hash_pandas_object(keys, index=False), dtype=np.uint64)
+
+    @classmethod
+    def from_transactions(cls, tx: pd.DataFrame) -> "FingerprintIndex":
+        """Builds an index from existing transactions.
+
+        Args:
+            tx: transactions dataframe
+
+        Returns:
+            index over all transactions
+        """
+        if tx.empty:
+            return cls()
+        return cls(cls.fingerprint(tx))
+
+    @classmethod
+    def read(cls, path: Path) -> "FingerprintIndex":
+        """Reads an index from path.
+
+        If path doesn't exist, an empty index is returned.
+
+        Args:
+            path: path to index file
+
+        Returns:
+            stored index
+        """
+        if path.exists() is False:
+            return cls()
+        return cls(np.load(path))
+
+    def write(self, path: Path, fsync: bool = False) -> None:
+        """Writes index to path atomically.
+
+        Args:
+            path: path to index file
+            fsync: if true, the index is flushed to disk before it replaces the stored one
+        """
+        buffer = io.BytesIO()
+        np.save(buffer, self.fingerprints, allow_pickle=False)
+        write_atomic(path, buffer.getvalue(), fsync)
+
+    def contains(self, fingerprints: npt.NDArray[np.uint64]) -> npt.NDArray[np.bool_]:
+        """Checks which fingerprints are already indexed.
+
+        Args:
+            fingerprints: array of fingerprints
+
+        Returns:
+            boolean array, true if fingerprint is indexed
+        """
+        return self._contains(self._sorted, fingerprints) | self._contains(self._pending, fingerprints)
+
+    def add(self, tx: pd.DataFrame, counts: dict[tuple[Any, ...], int] | None = None) -> npt.NDArray[np.bool_]:
+        """Adds transactions to the index.
+
+        Args:
+            tx: transactions dataframe
+            counts: occurrence counts of previous chunks, see fingerprint
+
+        Returns:
+            boolean array, true for rows that were not indexed before
+        """
+        if tx.empty:
+            return np.zeros(0, dtype=bool)
+
+        fingerprints = self.fingerprint(tx, counts)
+        is_new = ~self.contains(fingerprints)
+        self._pending = self._insert(self._pending, np.unique(fingerprints[is_new]))
+        if len(self._pending) > max(len(self._sorted) // self.merge_fraction, self.merge_min):
+            self._merge()
+        return is_new
+
+    def _merge(self) -> None:
+        """Merges buffered additions into the sorted array."""
+        if len(self._pending):
+            self._sorted = self._insert(self._sorted, self._pending)
+            self._pending = np.empty(0, dtype="uint64")
+
+    @staticmethod
+    def _insert(fingerprints: npt.NDArray[np.uint64], new: npt.NDArray[np.uint64]) -> npt.NDArray[np.uint64]:
+        """Returns a sorted array with new fingerprints inserted, both arrays must be sorted and disjoint."""
+        return np.insert(fingerprints, np.searchsorted(fingerprints, new), new)
+
+    @staticmethod
+    def _contains(fingerprints: npt.NDArray[np.uint64], lookup: npt.NDArray[np.uint64]) -> npt.NDArray[np.bool_]:
+        """Checks which fingerprints of lookup are in the sorted array fingerprints."""
+        if len(fingerprints) == 0:
+            return np.zeros(len(lookup), dtype=bool)
+        pos = np.searchsorted(fingerprints, lookup)
+        pos[pos == len(fingerprints)] = 0
+        return np.asarray(fingerprints[pos] == lookup)
@@ -1,34 +1,128 @@
 """Ledger."""
+import copy
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from itertools import chain
 from pathlib import Path
+from typing import Any
 
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 
-from ledgercli.bankinterface import BankInterface
+from ledgercli.bankinterface import BankInterface, ParsedExport
+from ledgercli.banks import AUTO
+from ledgercli.fingerprint import FingerprintIndex
+from ledgercli.partition import DATED_TABLES, PARTITIONED_TABLES, FrozenPartitionError, Partitions
+from ledgercli.profiling import Hook
+from ledgercli.query import Query, scan
+from ledgercli.rules import MAPPING_COLUMNS, RuleSet
+from ledgercli.schema import AMOUNT_COLUMNS, SCHEMAS, TEXT_COLUMNS, TYPES
+from ledgercli.state import PipelineState
+from ledgercli.storage import EDITABLE_TABLES, get_storage
 
 
 class Ledger:
     """Ledger."""
 
-    def __init__(self, output_dir: Path, bank_fmt: str | None) -> None:
+    _amount_columns = AMOUNT_COLUMNS
+
+    # columns encoded with the shared dictionary
+    _text_columns = TEXT_COLUMNS
+
+    # maps table names to the attributes holding them
+    _tables = {
+        "transactions": "tx",
+        "metadata": "metadata",
+        "mapping": "mapping",
+        "rules": "rules",
+        "history": "history",
+        "tx_coalesced": "tx_c",
+        "tx_distributed": "tx_d",
+        "rollup_week": "rollup_week",
+        "rollup_month": "rollup_month",
+        "rollup_quarter": "rollup_quarter",
+        "rollup_year": "rollup_year",
+        "rollup_recipient": "rollup_recipient",
+    }
+
+    # columns rollups are grouped by, after the period
+    _rollup_keys = ["type", "label1", "label2", "label3"]
+    _types = pd.CategoricalDtype(TYPES)
+
+    # tables, created empty of their schema by _create_template
+    tx: pd.DataFrame
+    metadata: pd.DataFrame
+    mapping: pd.DataFrame
+    rules: pd.DataFrame
+    history: pd.DataFrame
+    tx_c: pd.DataFrame
+    tx_d: pd.DataFrame
+    rollup_week: pd.DataFrame
+    rollup_month: pd.DataFrame
+    rollup_quarter: pd.DataFrame
+    rollup_year: pd.DataFrame
+    rollup_recipient: pd.DataFrame
+
+    # earliest date whose balance in history is outdated, None if history has to be computed from scratch
+    _history_from: pd.Timestamp | None
+    # digest of the distributed transactions per month as of the rollups in memory, None if not computed yet
+    _rollup_digests: dict[str, str] | None
+    # shared dictionary of the text columns of all tables
+    _text: "pd.CategoricalDtype[str]"
+
+    def __init__(
+        self,
+        output_dir: Path,
+        bank_fmt: str | None,
+        storage_fmt: str | None = None,
+        cents: bool = False,
+        partition: str | None = None,
+        hooks: list[Hook] | None = None,
+        fsync: bool = False,
+    ) -> None:
         """Initializes the Ledger.
 
-        If no output_dir is provided, the current working dir will be used.
+        If no output_dir is provided, the current working dir will be used. If no storage_fmt is provided, it's
+        detected from existing files in output_dir and defaults to csv. If no partition is provided, tables stay
+        partitioned as recorded in output_dir.
+
+        With cents, amounts are carried as int64 cents through the whole pipeline, so distributed parts and balances add
+        up exactly. Stored tables hold amounts in the currency unit either way.
 
         Args:
             output_dir: dir where files get written to
-            bank_fmt: which bank format to parse
+            bank_fmt: which bank format to parse, "auto" detects it for every export
+            storage_fmt: which storage format to read and write tables with
+            cents: if true, amounts are handled as int64 cents
+            partition: "year" or "month" to partition tables by
+            hooks: notified of spans, e.g. a Profiler
+            fsync: if true, written files are flushed to disk before they replace the stored ones
 
         Raises:
             KeyError: if no bank is provided and bank can't be read from metadata file
+            FrozenPartitionError: if a frozen partition was modified
+            SchemaError: if a stored table lacks columns of its schema
         """
         if output_dir is None or output_dir.exists() is False:
             self.output_dir = Path.cwd()
         else:
             self.output_dir = output_dir
 
+        self.cents = cents
+        self.hooks = hooks or []
+        self.fsync = fsync
+        self.storage = get_storage(storage_fmt, self.output_dir)
+        self.state = PipelineState.read(self.output_dir)
+        self.partitions = Partitions.read(self.output_dir)
+        self.partitions.verify(self.storage)
+        self._unwritten: set[str] = set()
         self._create_template()
-        self._read_existing()
+        with self._span("read_existing", "ledger"):
+            self._read_existing()
+        if partition is not None:
+            self.partition_by(partition)
 
         if bank_fmt is None:
             try:
@@ -36,61 +130,344 @@ class Ledger:
             except Exception as exc:
                 raise KeyError("Please supply a valid BANK_FMT! Couldn't read BANK_FMT from metadata.") from exc
         else:
-            if bank_fmt in BankInterface().list_bank_fmts():
+            if bank_fmt == AUTO or bank_fmt in BankInterface().list_bank_fmts():
                 self.bank_fmt = bank_fmt
             else:
                 raise KeyError("Please supply a valid BANK_FMT!")
+        if self.metadata.empty and self.tx.empty is False:
+            # metadata went missing, balances start at zero until the starting balance gets edited
+            self._set_metadata(pd.DataFrame({"starting_balance": [0.0], "bank": [self.bank_fmt]}))
+
+    @property
+    def unwritten(self) -> list[str]:
+        """Returns the names of tables that were updated but haven't been written yet."""
+        return sorted(self._unwritten)
+
+    @property
+    def changed(self) -> list[str]:
+        """Returns the names of tables changed since the last update, e.g. by importing or hand-editing them."""
+        return sorted(self._changed)
+
+    def rows(self) -> dict[str, int]:
+        """Returns the number of rows of every table held in memory."""
+        return {table: len(getattr(self, attr)) for table, attr in self._tables.items()}
+
+    @contextmanager
+    def _span(self, name: str, category: str) -> Iterator[dict[str, Any]]:
+        """Notifies hooks of a span.
+
+        Spans cover reading existing tables, every step of update, reading and writing every table and importing
+        exports. Profiler is a hook recording their timings.
+
+        Args:
+            name: span name, e.g. the stage or table
+            category: one of ledgercli.profiling.CATEGORIES
+
+        Yields:
+            details of the span reported to hooks, filled in by the caller
+        """
+        args: dict[str, Any] = {}
+        if not self.hooks:
+            yield args
+            return
+        for hook in self.hooks:
+            hook.start(name, category)
+        try:
+            yield args
+        finally:
+            for hook in reversed(self.hooks):
+                hook.end(name, category, args)
+
+    def _read(self, name: str) -> pd.DataFrame:
+        """Reads a table or partition from storage, as span, typed and encoded with the shared dictionary."""
+        frame = self._load(name)
+        self._encode(frame)
+        return frame
+
+    def _load(self, name: str) -> pd.DataFrame:
+        """Reads a table or partition from storage, as span, typed and validated against its schema.
+
+        Doesn't touch the shared dictionary, so tables can be loaded in parallel threads.
+
+        Raises:
+            SchemaError: if the table lacks columns of its schema
+        """
+        with self._span(f"read {name}", "io") as args:
+            frame = self.storage.read(name)
+            SCHEMAS[name.split("/")[0]].validate(frame.columns, name)
+            args["rows"] = len(frame)
+        return frame
 
     def _read_existing(self) -> None:
-        """Reads existing transactions, mapping and metadata files.
+        """Reads existing transactions, mapping, metadata, rules and fingerprint files.
+
+        Tables are loaded in parallel threads and used independently of each other, missing ones are created by
+        update. The fingerprint index is rebuilt from transactions if it's missing or out of sync with them. Tables
+        that changed since the last write are marked as changed, so update only runs the stages depending on them, and
+        stages whose derived tables are missing in storage.
 
-        If a file is missing none of the existing ones will be used.
+        Raises:
+            SchemaError: if a stored table lacks columns of its schema
         """
-        files = ["transactions.csv", "mapping.csv", "metadata.csv"]
+        tables = [table for table in ["transactions", "mapping", "metadata", "rules"] if self.storage.exists(table)]
+        with ThreadPoolExecutor(max_workers=max(1, len(tables))) as pool:
+            frames = list(pool.map(self._load, tables))
+        self._encode(*frames)
+        for table, frame in zip(tables, frames, strict=True):
+            setattr(self, self._tables[table], frame)
+
+        self._changed = {"transactions", "mapping", "metadata", "rules"} - set(tables)
+        self._changed.update(table for table in tables if self.state.changed(table, self.storage))
+        if tables:
+            # derived tables missing from storage, e.g. added by a newer version, are created by running their stage
+            for inputs, outputs, _ in self._stages():
+                derived = [t for t in outputs if t in self._tables and t not in ["mapping", "transactions"]]
+                if any(self.storage.exists(t) is False for t in derived):
+                    self._changed.update(inputs)
 
-        dfs = []
-        for file in files:
-            tmp_path = self.output_dir / file
-            if tmp_path.exists():
-                tmp = pd.read_csv(tmp_path)
-                dfs.append(tmp)
+        # stored history is current unless transactions were edited
+        self._history_from = None if "transactions" in self._changed else pd.Timestamp.max
 
-        if len(dfs) == 3:
-            self.tx, self.mapping, self.metadata = dfs
+        self.fingerprints = FingerprintIndex.read(self.output_dir / "fingerprints.npy")
+        if len(self.fingerprints) != len(self.tx):
+            self.fingerprints = FingerprintIndex.from_transactions(self.tx)
 
-    def _init_tx(self, export_path: Path) -> None:
+        if self.cents:
+            self.tx, self.mapping, self.metadata = (self._to_cents(df) for df in [self.tx, self.mapping, self.metadata])
+
+    def _init_tx(self, export_path: Path, export: ParsedExport | None = None) -> None:
         """Adds export to transactions.
 
+        Transactions already featured in the fingerprint index are skipped, so overlapping exports can be imported
+        repeatedly.
+
         Args:
             export_path: path to export
+            export: parsed export, export_path is read if None
+
+        Raises:
+            Exception: if the export has no transactions
+        """
+        if export is None:
+            export = BankInterface().read_export(bank_fmt=self.bank_fmt, export_path=export_path)
+        if export.transactions.empty:
+            raise Exception("The provided export contains no transactions. Please supply a non-empty export!")
+        self._append_tx([[export.transactions.copy()]])
+
+    def _append_tx(self, exports: Iterable[Iterable[pd.DataFrame]]) -> None:
+        """Appends transactions of exports that aren't featured in the fingerprint index yet.
+
+        Every export is checked against the index on its own, so same-day duplicates are counted per export. Exports
+        can be streamed as chunks of transactions, only new transactions are kept. All new transactions are appended
+        at once. If reading a chunk fails, neither transactions nor the fingerprint index are changed.
+
+        Args:
+            exports: transactions dataframes in one or more chunks, one iterable per export
+
+        Raises:
+            FrozenPartitionError: if new transactions fall into frozen partitions
+        """
+        # the index replaces its arrays instead of modifying them, a shallow copy restores it if an import fails
+        indexed = copy.copy(self.fingerprints)
+        new = []
+        try:
+            for chunks in exports:
+                counts: dict[tuple[Any, ...], int] = {}
+                for tmp in chunks:
+                    is_new = self.fingerprints.add(tmp, counts)
+                    if not self.partitions.is_open(tmp.loc[is_new, "date"]).all():
+                        raise FrozenPartitionError(
+                            f"New transactions fall into partitions frozen until {self.partitions.frozen_until}."
+                        )
+                    if is_new.any():
+                        new.append(self._to_cents(tmp.loc[is_new]) if self.cents else tmp.loc[is_new])
+        except Exception:
+            self.fingerprints = indexed
+            raise
+
+        if new:
+            self.tx = pd.concat([self.tx, *new])
+            self._changed.add("transactions")
+            if self._history_from is not None:
+                self._history_from = min(self._history_from, *(pd.to_datetime(tmp["date"]).min() for tmp in new))
+
+    def _stream_tx(self, export_path: Path, chunksize: int) -> None:
+        """Adds export to transactions, reading it in chunks.
+
+        Only the new transactions of every chunk are kept, so memory use doesn't depend on the size of the export.
+        Metadata gets initialized from the export if there is none yet.
+
+        Args:
+            export_path: path to export
+            chunksize: maximum number of transactions per chunk
+        """
+        empty = Exception("The provided export contains no transactions. Please supply a non-empty export!")
+        exports = BankInterface.iter_export(self.bank_fmt, export_path, chunksize)
+        first = next(exports, None)
+        if first is None:
+            raise empty
+        read = {"rows": 0, "revenue": 0.0}
+
+        def chunks() -> Iterator[pd.DataFrame]:
+            for export in chain([first], exports):
+                read["rows"] += len(export.transactions)
+                read["revenue"] += float(export.transactions["amount"].sum())
+                yield export.transactions
+
+        self._append_tx([chunks()])
+        if read["rows"] == 0:
+            raise empty
+
+        if self.metadata.empty:
+            self._set_metadata(BankInterface().export_metadata(first, revenue=read["revenue"]))
+
+    def partition_by(self, period: str) -> None:
+        """Partitions transactions, coalesced and distributed transactions and history by year or month.
+
+        All partitioned tables are computed and written again with the next update and write. Afterwards, only
+        partitions that aren't frozen get recomputed and written, frozen ones are read as they were stored.
+
+        Args:
+            period: "year" or "month"
+
+        Raises:
+            KeyError: bad period
+            FrozenPartitionError: if partitions by another period are frozen
+        """
+        if period == self.partitions.period:
+            return
+        if self.partitions.frozen:
+            raise FrozenPartitionError(
+                f"Partitions by {self.partitions.period} are frozen, can't partition by {period}."
+            )
+        self.partitions = Partitions(period)
+        self._changed.add("transactions")
+
+    def _frozen_rows(self, table: str) -> tuple[pd.DataFrame, npt.NDArray[np.datetime64]] | None:
+        """Reads the rows of a table stored in frozen partitions.
+
+        Args:
+            table: table name
+
+        Returns:
+            rows and the first day of the partition every row belongs to, None if there are none
+        """
+        keys = [key for key in self.storage.partitions(table) if key in self.partitions.frozen]
+        if not keys:
+            return None
+        frames = [self._read(f"{table}/{key}") for key in keys]
+        # partitions read earlier are encoded with a smaller dictionary
+        self._encode(*frames)
+        frozen = pd.concat(frames, ignore_index=True)
+        starts = np.repeat(pd.to_datetime(keys).to_numpy(), [len(frame) for frame in frames])
+        return self._to_cents(frozen) if self.cents else frozen, starts
+
+    def _encode(self, *frames: pd.DataFrame) -> None:
+        """Encodes the text columns of frames with the shared dictionary, in place.
+
+        Sharing the dictionary lets merges, groupbys and distributing transactions work on integer codes, and memory
+        scales with distinct values.
+
+        Every column is factorized once, or its categories are reused if it's categorical already, so only distinct
+        values get converted to strings and looked up in the dictionary. Values are appended to the dictionary as they
+        come up, columns already encoded keep their codes. Missing values become empty strings.
+
+        Args:
+            frames: frames to encode, all of them end up with the same dictionary
         """
-        tmp = BankInterface().get_transactions(bank_fmt=self.bank_fmt, export_path=export_path)
-        self.tx = pd.concat([self.tx, tmp])
+        factorized, encoded = [], []
+        for frame in frames:
+            for k in self._text_columns:
+                if k not in frame.columns:
+                    continue
+                column = frame[k]
+                if column.dtype == self._text:
+                    encoded.append((frame, k))
+                    continue
+                if isinstance(column.dtype, pd.CategoricalDtype):
+                    codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+                else:
+                    codes, uniques = pd.factorize(column)
+                factorized.append((frame, k, codes, pd.Index(uniques).astype(str)))
+
+        new = pd.Index([]).append([uniques for *_, uniques in factorized]).unique().difference(self._text.categories)
+        if len(new):
+            self._text = pd.CategoricalDtype(self._text.categories.append(new))
+
+        # the dictionary starts with the empty string
+        empty = 0
+        for frame, k in encoded:
+            codes = frame[k].cat.codes.to_numpy()
+            if len(new) or (codes < 0).any():
+                # values are only appended to the dictionary, so codes stay valid
+                frame[k] = pd.Categorical.from_codes(np.where(codes < 0, empty, codes), dtype=self._text)
+
+        for frame, k, codes, uniques in factorized:
+            # missing values have code -1, which picks the appended empty string
+            lookup = np.append(self._text.categories.get_indexer(uniques), empty)
+            frame[k] = pd.Categorical.from_codes(lookup[codes], dtype=self._text)
 
-    def _init_metadata(self, export_path: Path) -> None:
+    def _source_dates(self, table: str) -> npt.NDArray[np.datetime64]:
+        """Returns the original date of the transaction every row of a table derives from, which partitions it."""
+        frame = getattr(self, self._tables[table])
+        sources = self._sources.get(table)
+        if sources is None or len(sources) != len(frame):
+            dates: npt.NDArray[np.datetime64] = pd.to_datetime(frame["date"]).to_numpy()
+            return dates
+        return sources
+
+    def _init_metadata(self, export_path: Path, export: ParsedExport | None = None) -> None:
         """Initialize metadata from export.
 
         Args:
             export_path: path to export
+            export: parsed export, export_path is read if None
         """
-        self.metadata = BankInterface().get_metadata(bank_fmt=self.bank_fmt, export_path=export_path)
+        if export is None:
+            export = BankInterface().read_export(bank_fmt=self.bank_fmt, export_path=export_path)
+        self._set_metadata(BankInterface().export_metadata(export))
+
+    def _set_metadata(self, metadata: pd.DataFrame) -> None:
+        """Sets metadata.
+
+        Args:
+            metadata: metadata dataframe
+        """
+        self.metadata = self._to_cents(metadata) if self.cents else metadata
+        self._changed.add("metadata")
 
     def _update_mapping(self) -> None:
         """Adds new transaction recipients to mapping table.
 
-        Takes all recipients from transactions, removes recipients already featured in mapping table and appends
-        them to current mapping table. Sorts mapping table after.
+        Takes all recipients from transactions, removes recipients already featured in mapping table or matched by a
+        rule and appends them to current mapping table. Mapping rows without any values are removed for recipients
+        matched by a rule. Sorts mapping table after.
         """
         tx_recipients = set(self.tx["recipient"].unique())
         mp_recipients = set(self.mapping["recipient"].unique())
-        new_recipients = tx_recipients - mp_recipients
-        new_mapping = pd.DataFrame(new_recipients, columns=["recipient"])
+        new_mapping = pd.DataFrame(sorted(tx_recipients - mp_recipients), columns=["recipient"])
+
+        if self.rules.empty is False:
+            rules = RuleSet(self.rules)
+            new_mapping = new_mapping[rules.match(new_mapping["recipient"]) < 0]
+            values = (self.mapping[MAPPING_COLUMNS[:-1]].fillna("").astype(str) == "").all(axis=1)
+            empty = values & self.mapping["occurence"].fillna(0).eq(0)
+            self.mapping = self.mapping[~(empty & (rules.match(self.mapping["recipient"]) >= 0))]
 
-        self.mapping = pd.concat([self.mapping, new_mapping], ignore_index=True).sort_values("recipient")
+        # pandas deprecated concatenating empty frames, the mapping is empty before the first update
+        frames = [frame for frame in [self.mapping, new_mapping] if frame.empty is False]
+        mapping = pd.concat(frames, ignore_index=True) if frames else self.mapping
+        self.mapping = mapping.reindex(columns=self.mapping.columns).sort_values("recipient", key=self._by_value)
         self.mapping["occurence"] = self.mapping["occurence"].fillna(0)
 
     def _update_tx_mapping(self) -> None:
-        """Updates mappings in transactions with current mapping table."""
+        """Updates mappings in transactions with current mapping table.
+
+        Recipients featured in the mapping table get its values, all others the values of the rule they are matched
+        by. Transactions in frozen partitions keep their mappings.
+        """
+        # merged on codes, rule values are in the dictionary
+        self._encode(self.tx, self.mapping, self.rules)
         tmp_tx = self.tx[
             [
                 "amount",
@@ -106,13 +483,46 @@ class Ledger:
             ]
         ].copy()
 
-        self.tx = tmp_tx.merge(self.mapping, how="left", on="recipient")
+        is_open = self.partitions.is_open(self.tx["date"])
+        if is_open.all():
+            self.tx = self._map(tmp_tx)
+            return
+        tmp_tx = self._map(tmp_tx[is_open])
+        self.tx = pd.concat([self.tx.loc[~is_open, tmp_tx.columns], tmp_tx], ignore_index=True)
+
+    def _map(self, tx: pd.DataFrame) -> pd.DataFrame:
+        """Merges mapping and rule values onto transactions.
+
+        Args:
+            tx: transactions without mapping columns
+
+        Returns:
+            transactions with mapping columns
+        """
+        mapped = tx.merge(self.mapping, how="left", on="recipient")
+        if self.rules.empty:
+            return mapped
+
+        unmapped = mapped["recipient"].where(~mapped["recipient"].isin(self.mapping["recipient"]))
+        values = RuleSet(self.rules).values(unmapped)
+        hit = values.notna().any(axis=1)
+        for k in MAPPING_COLUMNS:
+            mapped[k] = mapped[k].mask(hit, values[k])
+        return mapped
 
     def _init_tx_c(self) -> None:
-        """Coalesces all custom values."""
+        """Coalesces all custom values.
+
+        Columns are collected by reference and only replaced where an override is present, so unchanged columns are
+        not copied and datetimes and floats keep their dtype. Empty strings count as missing overrides. tx_c is
+        assembled from the collected columns in a single step. Rows of frozen partitions are read as stored.
+        """
         self.tx["date"] = pd.to_datetime(self.tx["date"])
         self.tx["date_custom"] = pd.to_datetime(self.tx["date_custom"])
-        self.tx_c = self.tx.copy()
+
+        frozen = self._frozen_rows("tx_coalesced") if self.partitions.frozen else None
+        self._encode(*([self.tx] if frozen is None else [self.tx, frozen[0]]))
+        tx = self.tx[self.partitions.is_open(self.tx["date"])] if self.partitions.frozen else self.tx
 
         coalesce_map = {
             "date": "date_custom",
@@ -125,174 +535,661 @@ class Ledger:
             "recipient": "recipient_clean",
         }
 
+        columns = {k: tx[k] for k in tx.columns}
         for k, v in coalesce_map.items():
-            self.tx_c[v] = self.tx_c[v].replace("", np.nan)
-            self.tx_c[k] = np.where(self.tx_c[v].notna(), self.tx_c[v], self.tx_c[k])
-            self.tx_c = self.tx_c.drop(v, axis=1)
+            override = columns.pop(v)
+            present = override.notna().to_numpy()
+            if override.dtype == object or isinstance(override.dtype, pd.CategoricalDtype):
+                present &= (override != "").to_numpy()
+            if present.any():
+                columns[k] = columns[k].where(~present, override)
 
-        # np.where above converts datetimes into ns
-        self.tx_c["date"] = pd.to_datetime(self.tx_c["date"], unit="ns")
+        self.tx_c = pd.DataFrame(columns)
+        self._sources["tx_coalesced"] = tx["date"].to_numpy()
+        if frozen is not None:
+            self.tx_c = pd.concat([frozen[0], self.tx_c], ignore_index=True)
+            self._sources["tx_coalesced"] = np.concatenate([frozen[1], self._sources["tx_coalesced"]])
 
     def _init_tx_d(self) -> None:
-        """Distributes coalesced transactions based on occurence."""
+        """Distributes coalesced transactions based on occurence.
+
+        A transaction with an occurence of n > 1 is spread over n month starts, beginning with the first month start
+        on or after its date. An occurence of n < -1 spreads it over |n| month starts, ending with the last month start
+        on or before its date. The amount is split evenly across all parts, with cents the remainder goes to the first
+        parts.
+
+        All parts are built at once: every distributed row is repeated |n| times and its month offsets are generated
+        with numpy on datetime64[M], so no per-row date ranges are created. Rows of frozen partitions are read as
+        stored.
+        """
+        sources = self._source_dates("tx_coalesced")
+        frozen = self._frozen_rows("tx_distributed") if self.partitions.frozen else None
+        self._encode(*([self.tx_c] if frozen is None else [self.tx_c, frozen[0]]))
         tmp = self.tx_c
-        mask = pd.notna(tmp["occurence"]) & ~tmp["occurence"].between(-1, 1, inclusive="both")
-        distribute = tmp.loc[mask].copy()
-        keep = tmp.loc[~mask].copy()
+        if self.partitions.frozen:
+            is_open = self.partitions.is_open(sources)
+            tmp, sources = tmp[is_open], sources[is_open]
+
+        mask = (pd.notna(tmp["occurence"]) & ~tmp["occurence"].between(-1, 1, inclusive="both")).to_numpy()
+        distribute = tmp.loc[mask]
+        keep = tmp.loc[~mask]
+        # row of tmp every row of tx_d derives from
+        origin = np.flatnonzero(~mask)
 
         if distribute.empty is False:
-            distribute["date"] = distribute.apply(
-                lambda x: pd.date_range(
-                    start=x.date if x.occurence > 0 else None,
-                    end=x.date if x.occurence < 0 else None,
-                    periods=abs(x.occurence),
-                    freq="MS",
-                ),
-                axis=1,
+            occurence = distribute["occurence"].to_numpy(dtype="float64")
+            periods = np.abs(occurence).astype("int64")
+
+            days = pd.to_datetime(distribute["date"]).to_numpy(dtype="datetime64[D]")
+            months = days.astype("datetime64[M]")
+            is_month_start = months.astype("datetime64[D]") == days
+            first_month = np.where(
+                occurence > 0,
+                months + (~is_month_start).astype("int64"),
+                months - (periods - 1),
             )
 
-            distribute = distribute.explode("date")
-            distribute["amount"] = distribute["amount"] / abs(distribute["occurence"])
-            distribute["occurence"] = np.where(distribute["occurence"] > 0, 1, -1)
+            rows = np.repeat(np.arange(len(distribute)), periods)
+            offsets = np.arange(len(rows)) - np.repeat(np.cumsum(periods) - periods, periods)
+
+            amount = distribute["amount"].to_numpy(dtype="int64" if self.cents else "float64")
+            distribute = distribute.iloc[rows].copy()
+            distribute["date"] = (first_month[rows] + offsets).astype("datetime64[ns]")
+            if self.cents:
+                # the first abs(amount) % periods parts get an extra cent, so all parts add up to the amount
+                quotient, remainder = np.divmod(np.abs(amount), periods)
+                distribute["amount"] = np.sign(amount[rows]) * (quotient[rows] + (offsets < remainder[rows]))
+            else:
+                distribute["amount"] = amount[rows] / periods[rows]
+            distribute["occurence"] = np.where(occurence[rows] > 0, 1, -1)
+            origin = np.concatenate([origin, np.flatnonzero(mask)[rows]])
 
-        self.tx_d = pd.concat([keep, distribute], axis=0, ignore_index=True)
+        frames, sources = [keep, distribute], sources[origin]
+        if frozen is not None:
+            frames, sources = [frozen[0], *frames], np.concatenate([frozen[1], sources])
+        tx_d = pd.concat(frames, axis=0)
+        # sorted by date, so queries can skip row groups and stop early
+        order = np.argsort(tx_d["date"].to_numpy(), kind="stable")
+        self.tx_d = tx_d.iloc[order].reset_index(drop=True)
+        self._sources["tx_distributed"] = sources[order]
 
     def _init_history(self) -> None:
         """Creates history dataframe.
 
         All transactions (TX) are grouped by date and a cumulative sum is calculated while taking starting_balance into account.
-        history gets rewritten everytime it's generated and based on TX as there is no way to generate a valid cumulative sum
-        after coalescing or distributing.
+        history is based on TX as there is no way to generate a valid cumulative sum after coalescing or distributing.
+        With frozen partitions, only open partitions are summed up, starting with the closing balance of the last frozen
+        partition.
+
+        Every row of history holds the total of a day and the balance at its end, so it serves as checkpoint: if only
+        transactions were added since history was computed, the rows before the earliest added date are kept and
+        only transactions from that date on are grouped, continuing from the balance of the last kept row.
         """
-        tmp = self.tx.groupby(["date"], as_index=False)["amount"].sum()
-        tmp["balance"] = tmp["amount"].cumsum() + self.metadata["starting_balance"].iloc[0]
+        tx = self.tx
+        opening = self._opening_balance()
+        head: pd.DataFrame | None = None
+        history_from = self._history_from
+        current = self._current_history() if history_from is not None else None
+        if history_from is not None and current is not None:
+            cut = pd.to_datetime(current["date"]).searchsorted(history_from)
+            head = current.iloc[:cut]
+            dates = pd.to_datetime(tx["date"]) if tx["date"].dtype == object else tx["date"]
+            tx = tx[(dates >= history_from).to_numpy()]
+            if cut > 0:
+                opening = head["balance"].iloc[-1]
+        elif self.partitions.frozen:
+            tx = tx[self.partitions.is_open(tx["date"])]
+            frozen = self._frozen_rows("history")
+            head = None if frozen is None else frozen[0]
+
+        tmp = tx.groupby(["date"], as_index=False).agg(amount=("amount", "sum"))
+        tmp["balance"] = tmp["amount"].cumsum() + opening
+        if head is not None and len(head):
+            tmp = pd.concat([head, tmp], ignore_index=True) if len(tmp) else head.reset_index(drop=True)
         self.history = tmp
+        self._history_from = pd.Timestamp.max
+
+    def _opening_balance(self) -> float:
+        """Returns the balance history starts with, the closing balance of the last frozen partition if there is one."""
+        closing = self.partitions.closing_balance()
+        if closing is None:
+            starting: float = self.metadata["starting_balance"].iloc[0]
+            return starting
+        return round(closing * 100) if self.cents else closing
+
+    def _current_history(self) -> pd.DataFrame | None:
+        """Returns history as of its last computation, from memory or storage.
+
+        Returns:
+            history or None if the stored history changed since it was written
+        """
+        if self.history.empty is False:
+            return self.history
+        if self.storage.exists("history") is False or self.state.changed("history", self.storage):
+            return None
+        history = self._read("history")
+        return self._to_cents(history) if self.cents else history
+
+    @staticmethod
+    def _period_starts(dates: pd.Series, period: str) -> npt.NDArray[np.datetime64]:
+        """Returns the first day of the week (starting on monday), month, quarter or year of every date."""
+        if period == "week":
+            days = dates.to_numpy(dtype="datetime64[D]").astype("int64")
+            # 1970-01-01 was a thursday
+            mondays: npt.NDArray[np.datetime64] = (days - (days + 3) % 7).astype("datetime64[D]")
+            return mondays.astype("datetime64[ns]")
+        months = dates.to_numpy(dtype="datetime64[M]")
+        if period == "quarter":
+            months = months - months.astype("int64") % 3
+        elif period == "year":
+            months = months.astype("datetime64[Y]")
+        return months.astype("datetime64[ns]")
+
+    def _rollup(self, tx: pd.DataFrame, period: str, starts: npt.NDArray[np.datetime64]) -> pd.DataFrame:
+        """Sums amounts and counts transactions by period, type and labels.
+
+        Args:
+            tx: transactions dataframe
+            period: name of the period column
+            starts: first day of the period of every transaction
+
+        Returns:
+            rollup dataframe
+        """
+        amount = tx["amount"].to_numpy()
+        keys = pd.DataFrame(
+            {
+                period: starts,
+                "type": self._type(amount),
+                # categorical labels are grouped by their codes
+                **{k: tx[k].array for k in self._rollup_keys[1:]},
+                "amount": amount,
+            }
+        )
+        return keys.groupby([period, *self._rollup_keys], as_index=False, dropna=False, observed=True).agg(
+            amount=("amount", "sum"), transactions=("amount", "size")
+        )
+
+    def _recipient_rollup(self, tx: pd.DataFrame) -> pd.DataFrame:
+        """Sums amounts and counts transactions by recipient and type, sorted by recipient."""
+        amount = tx["amount"].to_numpy()
+        keys = pd.DataFrame({"recipient": tx["recipient"].array, "type": self._type(amount), "amount": amount})
+        rollup = keys.groupby(["recipient", "type"], as_index=False, dropna=False, observed=True).agg(
+            amount=("amount", "sum"), transactions=("amount", "size")
+        )
+        return rollup.sort_values(["recipient", "type"], ignore_index=True, key=self._by_value)
+
+    def _type(self, amount: npt.NDArray[Any]) -> "pd.Categorical":
+        """Returns the type of every amount, zero amounts are neither income nor expense."""
+        return pd.Categorical.from_codes(np.select([amount < 0, amount > 0], [0, 1], -1), dtype=self._types)
+
+    def _splice_rollup(
+        self, old: pd.DataFrame, new: pd.DataFrame, period: str, starts: npt.NDArray[np.datetime64]
+    ) -> pd.DataFrame:
+        """Replaces the given periods of a rollup with new rows."""
+        self._encode(old, new)
+        kept = old[~old[period].isin(starts)]
+        frames = [frame for frame in [kept, new] if len(frame)] or [new]
+        return self._sort_rollup(pd.concat(frames, ignore_index=True), period)
+
+    def _sort_rollup(self, rollup: pd.DataFrame, period: str) -> pd.DataFrame:
+        """Sorts a rollup by period, type and labels."""
+        return rollup.sort_values([period, *self._rollup_keys], ignore_index=True, key=self._by_value)
+
+    @staticmethod
+    def _by_value(column: pd.Series) -> pd.Series:
+        """Sort key ordering categoricals by value rather than by dictionary position, which depends on history."""
+        return column.astype(object) if isinstance(column.dtype, pd.CategoricalDtype) else column
+
+    def _init_rollups(self) -> None:
+        """Creates rollups of distributed transactions by week, month, quarter and year, and by recipient.
+
+        Every rollup has one row per period, type (income or expense, missing for zero amounts) and labels, with the
+        sum of amounts and the number of transactions. Periods are identified by their first day, weeks start on monday.
+
+        Months whose distributed transactions hash to the digest recorded in state are reused from the stored weekly
+        and monthly rollups, only the other months (and weeks overlapping them) get aggregated again. Quarters and
+        years are summed up from months. The rollup by recipient has one row per recipient and type and is aggregated
+        in full.
+        """
+        tx = self.tx_d
+        months = self._period_starts(tx["date"], "month")
+        rows = pd.util.hash_pandas_object(tx[["date", "amount", *self._rollup_keys[1:]]], index=False)
+        digests = {str(k)[:7]: format(v, "x") for k, v in rows.groupby(months).sum().items()}
+
+        if self._rollup_digests is not None:
+            # rollups in memory are as of the last update
+            recorded = self._rollup_digests
+        elif self.state.rollups and not any(
+            self.state.changed(t, self.storage) for t in ["rollup_week", "rollup_month"]
+        ):
+            recorded = self.state.rollups
+            for period in ["week", "month"]:
+                frame = self._read(f"rollup_{period}")
+                setattr(self, f"rollup_{period}", self._to_cents(frame) if self.cents else frame)
+        else:
+            recorded = {}
+            self.rollup_week, self.rollup_month = self.rollup_week.iloc[:0], self.rollup_month.iloc[:0]
+        outdated = {m for m in digests.keys() | recorded.keys() if digests.get(m) != recorded.get(m)}
+
+        month_labels = np.datetime_as_string(months, unit="M")
+        affected = np.isin(month_labels, list(outdated))
+        outdated_months = np.array(sorted(outdated), dtype="datetime64[M]").astype("datetime64[ns]")
+        self.rollup_month = self._splice_rollup(
+            self.rollup_month,
+            self._rollup(tx[affected], "month", months[affected]),
+            "month",
+            outdated_months,
+        )
+
+        weeks = self._period_starts(tx["date"], "week")
+        outdated_weeks = np.unique(weeks[affected])
+        in_week = np.isin(weeks, outdated_weeks)
+        self.rollup_week = self._splice_rollup(
+            self.rollup_week,
+            self._rollup(tx[in_week], "week", weeks[in_week]),
+            "week",
+            outdated_weeks,
+        )
+
+        for period in ["quarter", "year"]:
+            monthly = self.rollup_month
+            keys = monthly[self._rollup_keys].assign(**{period: self._period_starts(monthly["month"], period)})
+            rollup = (
+                keys.assign(amount=monthly["amount"], transactions=monthly["transactions"])
+                .groupby([period, *self._rollup_keys], as_index=False, dropna=False, observed=True)[
+                    ["amount", "transactions"]
+                ]
+                .sum()
+            )
+            setattr(self, f"rollup_{period}", self._sort_rollup(rollup, period))
+
+        self.rollup_recipient = self._recipient_rollup(tx)
+        self._rollup_digests = digests
 
-    def import_tx(self, export_path: Path) -> None:
+    def import_tx(self, export_path: Path, chunksize: int | None = None) -> None:
         """Imports transactions.
 
+        Without chunksize, the export is read once for both transactions and metadata.
+
         Args:
             export_path: path to export.
+            chunksize: stream the export in chunks of this many transactions, read it at once if None
         """
-        self._init_tx(export_path=export_path)
+        with self._span(f"import {export_path.name}", "import") as args:
+            known = len(self.tx)
+            if chunksize is not None:
+                self._stream_tx(export_path, chunksize)
+            else:
+                export = BankInterface().read_export(bank_fmt=self.bank_fmt, export_path=export_path)
+                self._init_tx(export_path=export_path, export=export)
+                if self.metadata.empty:
+                    self._init_metadata(export_path=export_path, export=export)
+            args["rows"] = len(self.tx) - known
 
-        if self.metadata.empty:
-            self._init_metadata(export_path=export_path)
+    def _read_exports(
+        self, export_paths: list[Path], max_workers: int | None
+    ) -> Iterator[tuple[Path, ParsedExport | Exception]]:
+        """Parses exports, in worker processes if there is more than one.
+
+        Args:
+            export_paths: paths to exports
+            max_workers: maximum number of worker processes, defaults to the number of CPUs
+
+        Yields:
+            path and parsed export or the exception raised while parsing, in order of completion
+        """
+        if len(export_paths) == 1 or max_workers == 1:
+            for export_path in export_paths:
+                try:
+                    yield export_path, BankInterface.read_export(self.bank_fmt, export_path)
+                except Exception as exc:
+                    yield export_path, exc
+            return
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(BankInterface.read_export, self.bank_fmt, p): p for p in export_paths}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as exc:
+                    yield futures[future], exc
+
+    def import_many(
+        self,
+        export_paths: list[Path],
+        max_workers: int | None = None,
+        progress: Callable[[Path], None] | None = None,
+        chunksize: int | None = None,
+    ) -> dict[Path, Exception]:
+        """Imports transactions from many exports.
+
+        Exports are parsed in parallel and appended in order of their first transaction, skipping transactions
+        that are already featured. If there is no metadata yet, it's initialized from the earliest export. Exports
+        that can't be parsed or contain no transactions are skipped and reported.
+
+        With chunksize, exports are streamed one after another in the given order instead, bounding memory use by
+        chunksize. Metadata is initialized from the first export then.
+
+        Args:
+            export_paths: paths to exports
+            max_workers: maximum number of worker processes, defaults to the number of CPUs
+            progress: called with the path of every export after it has been parsed
+            chunksize: stream exports in chunks of this many transactions, read them at once if None
+
+        Returns:
+            exceptions of exports that couldn't be imported
+        """
+        if chunksize is not None:
+            streamed: dict[Path, Exception] = {}
+            for export_path in export_paths:
+                with self._span(f"import {export_path.name}", "import") as args:
+                    known = len(self.tx)
+                    try:
+                        self._stream_tx(export_path, chunksize)
+                    except Exception as exc:
+                        streamed[export_path] = exc
+                    args["rows"] = len(self.tx) - known
+                if progress is not None:
+                    progress(export_path)
+            return streamed
+
+        exports: list[ParsedExport] = []
+        errors: dict[Path, Exception] = {}
+        with self._span("parse_exports", "import") as args:
+            for export_path, result in self._read_exports(export_paths, max_workers):
+                if isinstance(result, Exception):
+                    errors[export_path] = result
+                elif result.transactions.empty:
+                    errors[export_path] = Exception("The provided export contains no transactions.")
+                else:
+                    exports.append(result)
+                if progress is not None:
+                    progress(export_path)
+            args["rows"] = sum(len(export.transactions) for export in exports)
+
+        exports.sort(key=lambda export: export.transactions["date"].min())
+        with self._span("append_tx", "import") as args:
+            known = len(self.tx)
+            self._append_tx([[export.transactions] for export in exports])
+            args["rows"] = len(self.tx) - known
+
+        if self.metadata.empty and exports:
+            self._set_metadata(BankInterface().export_metadata(exports[0]))
+
+        return errors
+
+    def query(
+        self, query: Query, table: str = "tx_distributed", columns: list[str] | None = None, chunksize: int = 100_000
+    ) -> Iterator[pd.DataFrame]:
+        """Filters a table by date range, labels, recipient and amount.
+
+        Tables held in memory, e.g. after update, are filtered directly. Otherwise the stored table is scanned in
+        chunks with the filters pushed down into the storage, so it doesn't get read in full.
+
+        Args:
+            query: filters
+            table: table name
+            columns: only return these columns, all columns if None
+            chunksize: maximum number of rows read at once
+
+        Yields:
+            matching rows, amounts in currency units
+
+        Raises:
+            KeyError: unknown table
+        """
+        if table not in self._tables:
+            raise KeyError(f"Unknown table {table}.")
+
+        frame = getattr(self, self._tables[table])
+        if frame.empty and self.storage.exists(table):
+            yield from scan(self.storage, table, query, columns, chunksize, self.partitions.dates.get(table))
+            return
+
+        matches = frame[query.mask(frame)]
+        if self.cents:
+            matches = self._from_cents(matches)
+        yield matches if columns is None else matches[columns]
+
+    def _stages(self) -> list[tuple[list[str], list[str], list[Callable[[], None]]]]:
+        """Returns the update pipeline as input tables, output tables and steps per stage, in execution order.
+
+        "mapped" stands for the mapping columns of transactions, which history doesn't depend on.
+        """
+        return [
+            (
+                ["transactions", "mapping", "rules"],
+                ["mapping", "mapped"],
+                [self._update_mapping, self._update_tx_mapping],
+            ),
+            (["mapped"], ["tx_coalesced"], [self._init_tx_c]),
+            (["tx_coalesced"], ["tx_distributed"], [self._init_tx_d]),
+            (
+                ["tx_distributed"],
+                ["rollup_week", "rollup_month", "rollup_quarter", "rollup_year", "rollup_recipient"],
+                [self._init_rollups],
+            ),
+            (["transactions", "metadata"], ["history"], [self._init_history]),
+        ]
 
     def update(self) -> None:
-        """Wrapper for updating the Ledger."""
-        self._update_mapping()
-        self._update_tx_mapping()
-        self._init_tx_c()
-        self._init_tx_d()
-        self._init_history()
-        self._assign_types()
+        """Wrapper for updating the Ledger.
+
+        Only stages downstream of changed tables are run. Outputs of skipped stages are read from output_dir.
+        """
+        with self._span("update", "ledger") as details:
+            changed = set(self._changed)
+            if "metadata" in changed:
+                # the starting balance shifts every balance
+                self._history_from = None
+            for inputs, outputs, steps in self._stages():
+                if changed.isdisjoint(inputs):
+                    continue
+                for step in steps:
+                    with self._span(step.__name__.lstrip("_"), "stage") as args:
+                        step()
+                        tables = [t for t in outputs if t in self._tables]
+                        args.update(rows=len(self.tx), outputs={t: len(getattr(self, self._tables[t])) for t in tables})
+                changed.update(outputs)
+
+            if "mapped" in changed:
+                changed.remove("mapped")
+                changed.add("transactions")
+
+            for table, attr in self._tables.items():
+                if table not in changed and getattr(self, attr).empty and self.storage.exists(table):
+                    frame = self._read(table)
+                    setattr(self, attr, self._to_cents(frame) if self.cents else frame)
+
+            with self._span("assign_types", "stage"):
+                self._assign_types()
+            self._unwritten |= changed
+            self._changed = set()
+            details["rows"] = len(self.tx)
 
     def write(self) -> None:
-        """Writes all tables to output_dir."""
-        write_map = {
-            "transactions": self.tx,
-            "metadata": self.metadata,
-            "mapping": self.mapping,
-            "history": self.history,
-            "tx_coalesced": self.tx_c,
-            "tx_distributed": self.tx_d,
-        }
+        """Writes changed tables and the fingerprint index to output_dir.
 
-        for k, v in write_map.items():
-            v.to_csv(
-                self.output_dir / f"{k}.csv",
-                index=False,
-                date_format="%Y-%m-%d",
-                float_format="%.2f",
-            )
+        Tables whose content equals the stored one are not rewritten. Tables and partitions are serialized and written
+        concurrently in threads, every file atomically. The pipeline state is the manifest of a write: it's replaced
+        last, with the generation incremented, so the next update can skip unchanged stages and tables replaced by an
+        interrupted write count as changed. Partitioned tables are written per partition, skipping frozen ones, and
+        the date range of every partition of derived tables is recorded in the partitions manifest.
+        """
+        with self._span("write", "ledger"):
+            unwritten = self._unwritten | self._changed
+            if not unwritten:
+                return
 
-    def _assign_types(self) -> None:
-        types = {
-            # base format
-            "amount": "float",
-            "recipient": "str",
-            "date": "datetime64[ns]",
-            # custom
-            "amount_custom": "float",
-            "recipient_clean_custom": "str",
-            "date_custom": "datetime64[ns]",
-            "label1_custom": "str",
-            "label2_custom": "str",
-            "label3_custom": "str",
-            "occurence_custom": "float",
-            # mapping
-            "recipient_clean": "str",
-            "label1": "str",
-            "label2": "str",
-            "label3": "str",
-            "occurence": "float",
-            # history
-            "balance": "float",
-            # metadata
-            "bank": "str",
-            # helpers
-            "type": "category",
-            "week": "datetime64[ns]",
-            "month": "datetime64[ns]",
-            "quarter": "datetime64[ns]",
-            "year": "datetime64[ns]",
-        }
+            writes: list[tuple[str, pd.DataFrame, bool]] = []
+            stale: list[str] = []
+            for table, attr in self._tables.items():
+                if table not in unwritten:
+                    continue
+                frame = getattr(self, attr)
+                if self.cents:
+                    frame = self._from_cents(frame)
+                if self.partitions.period is None or table not in PARTITIONED_TABLES:
+                    writes.append((table, frame, table in self._changed))
+                    continue
 
-        for df in [self.tx, self.tx_c, self.tx_d, self.history, self.mapping]:
-            for k, v in types.items():
-                if k in df.columns:
-                    df[k] = df[k].astype(v)
-                    if k != "recipient" and v == "str":
-                        df[k] = df[k].replace("nan", "")
+                keys = self.partitions.keys(self._source_dates(table))
+                if table in DATED_TABLES:
+                    self.partitions.record_dates(table, frame["date"], keys)
+                frozen_until = self.partitions.frozen_until or ""
+                parts = {key: rows for key, rows in frame.groupby(keys).indices.items() if key > frozen_until}
+                writes += [(f"{table}/{key}", frame.iloc[rows], table in self._changed) for key, rows in parts.items()]
+                # unpartitioned table and partitions without rows left
+                stored = self.storage.partitions(table)
+                stale += [table, *(f"{table}/{key}" for key in stored if key not in parts and key > frozen_until)]
 
-    def _create_template(self) -> None:
-        """Creates internal dataframes with correct dtypes."""
-        mapping_schema = {
-            "recipient_clean": pd.Series(dtype=str),
-            "label1": pd.Series(dtype=str),
-            "label2": pd.Series(dtype=str),
-            "label3": pd.Series(dtype=str),
-            "occurence": pd.Series(dtype=int),
-        }
-        transaction_schema = {
-            "amount_custom": pd.Series(dtype=float),
-            "date_custom": pd.Series(dtype=object),
-            "recipient_clean_custom": pd.Series(dtype=str),
-            "label1_custom": pd.Series(dtype=str),
-            "label2_custom": pd.Series(dtype=str),
-            "label3_custom": pd.Series(dtype=str),
-            "occurence_custom": pd.Series(dtype=int),
-        }
-        self.tx = pd.DataFrame(
-            {
-                "amount": pd.Series(dtype=float),
-                "date": pd.Series(dtype=object),
-                "recipient": pd.Series(dtype=str),
-                **mapping_schema,
-                **transaction_schema,
-            }
-        )
-        self.tx_c = pd.DataFrame(
-            {
-                "amount": pd.Series(dtype=float),
-                "date": pd.Series(dtype=object),
-                **mapping_schema,
-            }
-        )
-        self.tx_d = self.tx_c.copy()
+            with ThreadPoolExecutor() as pool:
+                written = any(list(pool.map(lambda w: self._write_table(*w), writes)))
+            for name in stale:
+                self.storage.remove(name)
+                self.state.tables.pop(name, None)
 
-        self.mapping = pd.DataFrame({"recipient": pd.Series(dtype=str), **mapping_schema})
-        self.metadata = pd.DataFrame(
-            {
-                "starting_balance": pd.Series(dtype=float),
-                "bank": pd.Series(dtype=str),
-            }
-        )
-        self.history = pd.DataFrame(
-            {
-                "date": pd.Series(dtype=object),
-                "amount": pd.Series(dtype=float),
-                "balance": pd.Series(dtype=float),
-            }
-        )
+            if self.partitions.period is not None:
+                self.partitions.write(self.output_dir, self.fsync)
+            if "rollup_month" in unwritten and self._rollup_digests is not None:
+                self.state.rollups = self._rollup_digests
+            if "transactions" in unwritten:
+                self.fingerprints.write(self.output_dir / "fingerprints.npy", self.fsync)
+            if written:
+                self.state.generation += 1
+            self.state.write(self.output_dir, self.fsync)
+            self._unwritten = set()
+
+    def _write_table(self, name: str, frame: pd.DataFrame, changed: bool) -> bool:
+        """Writes a table or partition unless its content equals the stored one, and records it in state.
+
+        Args:
+            name: table or partition name
+            frame: table with amounts in currency units
+            changed: if the table was changed without update
+
+        Returns:
+            true if the table was written
+        """
+        with self._span(f"write {name}", "io") as args:
+            data = self.storage.serialize(frame)
+            digest = PipelineState.digest(data)
+            written = self.state.is_current(name, self.storage, digest) is False
+            if written:
+                self.storage.write(name, frame, data, self.fsync)
+            args.update(rows=len(frame), bytes=len(data), written=written)
+        if changed:
+            # written without update, stages depending on it still need to run
+            self.state.tables.pop(name, None)
+        else:
+            self.state.record(name, self.storage, digest)
+        return written
+
+    def freeze(self, until: str) -> list[str]:
+        """Freezes all partitions up to and including a closed period.
+
+        Changed tables are updated and written first. Frozen partitions are checksummed and never written again, so
+        mapping changes and hand-edits don't apply to them anymore and importing transactions into them fails. Their
+        closing balance is recorded and carried forward by history.
+
+        Args:
+            until: key of the last period to freeze, e.g. "2023" or "2023-12"
+
+        Returns:
+            keys of newly frozen partitions
+
+        Raises:
+            ValueError: if tables aren't partitioned or until isn't a closed period
+        """
+        if self.partitions.period is None:
+            raise ValueError("Please partition the Ledger by year or month before freezing periods!")
+        try:
+            valid = self.partitions.keys(pd.Series([until]))[0] == until
+        except ValueError:
+            valid = False
+        if valid is False:
+            example = {"year": "2023", "month": "2023-12"}[self.partitions.period]
+            raise ValueError(f"Please supply a {self.partitions.period} like {example}!")
+        if until >= self.partitions.keys(pd.Series([pd.Timestamp.today()]))[0]:
+            raise ValueError(f"Can't freeze {until}, the {self.partitions.period} isn't closed yet.")
+
+        self.update()
+        self.write()
+
+        frozen_until = self.partitions.frozen_until or ""
+        stored = {key for table in PARTITIONED_TABLES for key in self.storage.partitions(table)}
+        keys = sorted(key for key in stored if frozen_until < key <= until)
+
+        history, metadata = (self._from_cents(df) if self.cents else df for df in [self.history, self.metadata])
+        history_keys = pd.Series(self.partitions.keys(history["date"]), index=history.index)
+        balance = self.partitions.closing_balance()
+        if balance is None:
+            balance = float(metadata["starting_balance"].iloc[0])
+        for key in keys:
+            closed = history["balance"][history_keys <= key]
+            if len(closed):
+                balance = float(closed.iloc[-1])
+            self.partitions.freeze(key, self.storage, balance)
+        self.partitions.write(self.output_dir, self.fsync)
+        return keys
+
+    def export_csv(self) -> list[Path]:
+        """Exports hand-editable tables as CSV.
+
+        With a binary storage format, the CSV copies are kept up to date on every write and read instead of the
+        stored tables once they have been edited. Frozen partitions aren't exported.
+
+        Returns:
+            paths of exported files
+        """
+        names = []
+        for table in EDITABLE_TABLES:
+            keys = [key for key in self.storage.partitions(table) if key not in self.partitions.frozen]
+            names += [f"{table}/{key}" for key in keys] if self.storage.partitions(table) else [table]
+        return [self.storage.export_csv(name) for name in names if self.storage.exists(name)]
+
+    def _to_cents(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Converts amount columns from currency units to int64 cents, nullable ones to Int64.
+
+        Args:
+            df: dataframe with amounts in currency units
+
+        Returns:
+            dataframe with amounts in cents
+        """
+        converted = {}
+        for k in self._amount_columns:
+            if k in df.columns:
+                cents = (pd.to_numeric(df[k]) * 100).round()
+                converted[k] = cents.astype("int64") if cents.notna().all() else cents.astype("Int64")
+        return df.assign(**converted)
+
+    def _from_cents(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Converts amount columns from cents back to float currency units.
+
+        Args:
+            df: dataframe with amounts in cents
+
+        Returns:
+            dataframe with amounts in currency units
+        """
+        converted = {k: df[k].astype("float64") / 100 for k in self._amount_columns if k in df.columns}
+        return df.assign(**converted)
+
+    def _assign_types(self) -> None:
+        """Casts all tables to their schema, in place, and encodes their text columns with the shared dictionary."""
+        frames = [getattr(self, attr) for attr in self._tables.values()]
+        for table, frame in zip(self._tables, frames, strict=True):
+            SCHEMAS[table].enforce(frame, self.cents)
+        self._encode(*frames)
+
+    def _create_template(self) -> None:
+        """Creates empty tables of their schema and the shared dictionary of text columns."""
+        self._text = pd.CategoricalDtype([""])
+        for table, attr in self._tables.items():
+            setattr(self, attr, SCHEMAS[table].empty(self.cents, self._text))
+        self._rollup_digests = None
+        # original dates of the transactions rows of tx_c and tx_d derive from
+        self._sources: dict[str, npt.NDArray[np.datetime64]] = {}
+        self._history_from = None
@@ -0,0 +1,201 @@
+"""Partitions.
+
+This module splits the transaction tables of a ledger by year or month, so writes only touch the periods that changed.
+
+A partition is keyed by the period of its transactions' original dates, e.g. "2023" or "2023-04". Coalesced and
+distributed rows belong to the partition of the transaction they derive from, even if their dates fall into another
+period. Closed periods can be frozen: their files are checksummed in a manifest and never written again, and history
+carries the closing balance of the last frozen period forward.
+
+The manifest also records the first and last date of every partition of derived tables, so queries skip partitions
+that can't contain matches. Recording the dates of the rows themselves covers distributed rows spread into other
+periods.
+"""
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from ledgercli.state import PipelineState
+from ledgercli.storage import EDITABLE_TABLES, write_atomic
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+
+    from ledgercli.storage import Storage
+
+PARTITIONED_TABLES = ["transactions", "tx_coalesced", "tx_distributed", "history"]
+PERIODS = {"year": "Y", "month": "M"}
+# tables whose partitions record their date range, hand-editable ones might have been edited since
+DATED_TABLES = [table for table in PARTITIONED_TABLES if table not in EDITABLE_TABLES]
+
+
+class FrozenPartitionError(Exception):
+    """Raised if a frozen partition was modified or would change."""
+
+
+class Partitions:
+    """Partitions.
+
+    The manifest records the partition period and, for every frozen partition, the digest and file stats of its
+    tables as well as the closing balance. Frozen partitions always form a prefix: freezing a period freezes all
+    earlier ones as well. Date ranges are recorded per table and partition key.
+    """
+
+    file = "partitions.json"
+
+    def __init__(
+        self,
+        period: str | None = None,
+        frozen: dict[str, dict[str, Any]] | None = None,
+        dates: dict[str, dict[str, list[str]]] | None = None,
+    ) -> None:
+        """Initializes the partitions.
+
+        Args:
+            period: "year" or "month", None if tables aren't partitioned
+            frozen: recorded tables and closing balance per frozen partition key
+            dates: first and last date per table and partition key
+
+        Raises:
+            KeyError: bad period
+        """
+        if period is not None and period not in PERIODS:
+            raise KeyError("The partition period you provided is not supported.")
+        self.period = period
+        self.frozen = frozen or {}
+        self.dates = dates or {}
+
+    @classmethod
+    def read(cls, output_dir: Path) -> "Partitions":
+        """Reads the manifest from output_dir.
+
+        Args:
+            output_dir: dir where files get written to
+
+        Returns:
+            partitions, unpartitioned if there is no manifest
+        """
+        path = output_dir / cls.file
+        if path.exists() is False:
+            return cls()
+        raw = json.loads(path.read_text())
+        return cls(period=raw["period"], frozen=raw["frozen"], dates=raw.get("dates"))
+
+    def write(self, output_dir: Path, fsync: bool = False) -> None:
+        """Writes the manifest to output_dir atomically.
+
+        Args:
+            output_dir: dir where files get written to
+            fsync: if true, the manifest is flushed to disk before it replaces the stored one
+        """
+        raw = json.dumps({"period": self.period, "frozen": self.frozen, "dates": self.dates}, indent=2)
+        write_atomic(output_dir / self.file, raw.encode(), fsync)
+
+    @property
+    def frozen_until(self) -> str | None:
+        """Returns the key of the last frozen partition, None if nothing is frozen."""
+        return max(self.frozen, default=None)
+
+    def keys(self, dates: "pd.Series | npt.NDArray[np.datetime64]") -> "npt.NDArray[np.str_]":
+        """Returns the partition key of every date.
+
+        Args:
+            dates: dates or date strings
+
+        Returns:
+            array of keys, e.g. "2023" or "2023-04"
+        """
+        import numpy as np
+
+        return self._periods(dates).astype(np.str_)
+
+    def is_open(self, dates: "pd.Series | npt.NDArray[np.datetime64]") -> "npt.NDArray[np.bool_]":
+        """Checks which dates fall into partitions that aren't frozen.
+
+        Args:
+            dates: dates or date strings
+
+        Returns:
+            boolean array
+        """
+        import numpy as np
+
+        if self.frozen_until is None:
+            return np.ones(len(dates), dtype=bool)
+        return self._periods(dates) > np.datetime64(self.frozen_until)
+
+    def closing_balance(self) -> float | None:
+        """Returns the closing balance of the last frozen partition, None if nothing is frozen."""
+        if self.frozen_until is None:
+            return None
+        return float(self.frozen[self.frozen_until]["closing_balance"])
+
+    def record_dates(self, table: str, dates: "pd.Series", keys: "npt.NDArray[np.str_]") -> None:
+        """Records the first and last date of every partition of a table that isn't frozen.
+
+        Partitions that aren't frozen and have no rows anymore lose their record, frozen ones keep it.
+
+        Args:
+            table: table name
+            dates: dates of all rows of the table
+            keys: partition key of every row
+        """
+        import pandas as pd
+
+        grouped = pd.to_datetime(dates).groupby(keys)
+        first, last = grouped.min(), grouped.max()
+        frozen_until = self.frozen_until or ""
+        recorded = {key: span for key, span in self.dates.get(table, {}).items() if key <= frozen_until}
+        for key in first.index[first.index > frozen_until]:
+            if pd.notna(first[key]):
+                recorded[key] = [first[key].strftime("%Y-%m-%d"), last[key].strftime("%Y-%m-%d")]
+        self.dates[table] = recorded
+
+    def freeze(self, key: str, storage: "Storage", closing_balance: float) -> None:
+        """Records a partition as frozen.
+
+        Args:
+            key: partition key
+            storage: storage the partition is written to
+            closing_balance: balance at the end of the period
+        """
+        tables = {}
+        for table in PARTITIONED_TABLES:
+            name = f"{table}/{key}"
+            if storage.exists(name):
+                tables[table] = {
+                    "digest": PipelineState.file_digest(storage.source(name)),
+                    "files": PipelineState.stats(storage.files(name)),
+                }
+        self.frozen[key] = {"tables": tables, "closing_balance": closing_balance}
+
+    def verify(self, storage: "Storage") -> None:
+        """Checks if frozen partitions are unchanged.
+
+        Partitions are compared like tables in PipelineState, by file stats first and by digest if those differ.
+
+        Args:
+            storage: storage of the partitions
+
+        Raises:
+            FrozenPartitionError: a frozen partition is missing or was modified
+        """
+        for key, partition in self.frozen.items():
+            for table, record in partition["tables"].items():
+                name = f"{table}/{key}"
+                if storage.exists(name) is False:
+                    raise FrozenPartitionError(f"The frozen partition {name} is missing. Please restore it!")
+                if record["files"] == PipelineState.stats(storage.files(name)):
+                    continue
+                if PipelineState.file_digest(storage.source(name)) != record["digest"]:
+                    raise FrozenPartitionError(f"The frozen partition {name} was modified. Please restore it!")
+
+    def _periods(self, dates: "pd.Series | npt.NDArray[np.datetime64]") -> "npt.NDArray[np.datetime64]":
+        """Returns the start of the period of every date, in the unit of the partition period."""
+        import pandas as pd
+
+        unit = PERIODS[self.period or "month"]
+        periods: npt.NDArray[np.datetime64] = pd.to_datetime(dates).to_numpy(dtype=f"datetime64[{unit}]")
+        return periods
@@ -0,0 +1,139 @@
+"""Profiling.
+
+This module records where the Ledger spends its time. The Ledger reports spans, like stages of update or reading and
+writing a table, to hooks registered with it. Without hooks, spans cost next to nothing.
+
+Profiler is a hook recording wall time, CPU time, peak RSS and row counts of every span. It writes them as Chrome
+trace, a JSON file that chrome://tracing, Perfetto or speedscope show as a timeline, and optionally dumps a cProfile
+profile per stage, which snakeviz or pstats can break down by function.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Protocol
+
+if sys.platform != "win32":
+    import resource
+
+# categories of spans, stages don't nest and are profiled with cProfile
+CATEGORIES = ["ledger", "stage", "io", "import"]
+
+
+class Hook(Protocol):
+    """Hook.
+
+    Gets notified when the Ledger starts and ends a span. Spans nest, they end in reverse order of their start within
+    a thread. Tables are read in parallel threads, so spans of different threads overlap.
+    """
+
+    def start(self, name: str, category: str) -> None:
+        """Called when a span starts.
+
+        Args:
+            name: span name, e.g. the stage or table
+            category: one of CATEGORIES
+        """
+
+    def end(self, name: str, category: str, args: dict[str, Any]) -> None:
+        """Called when a span ends, even if it raised.
+
+        Args:
+            name: span name, e.g. the stage or table
+            category: one of CATEGORIES
+            args: details of the span, like the number of rows read or written
+        """
+
+
+def peak_rss() -> int | None:
+    """Returns the peak resident set size of the process in bytes, None if it can't be determined."""
+    if sys.platform == "win32":  # pragma: no cover
+        # resource isn't available on Windows
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class Profiler:
+    """Profiler.
+
+    Records wall time, CPU time, peak RSS and the details reported by the Ledger for every span. CPU time is the
+    time of the whole process, so it includes other threads, but not worker processes parsing exports.
+    """
+
+    def __init__(self, cprofile_dir: Path | None = None) -> None:
+        """Initializes the profiler.
+
+        Args:
+            cprofile_dir: dir to dump a cProfile profile per stage to, no profiles are dumped if None
+        """
+        self.cprofile_dir = cprofile_dir
+        self.events: list[dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        # started spans per thread
+        self._started: dict[int, list[tuple[float, float, int | None, cProfile.Profile | None]]] = {}
+
+    def start(self, name: str, category: str) -> None:
+        """Starts recording a span."""
+        profile = None
+        if self.cprofile_dir is not None and category == "stage":
+            profile = cProfile.Profile()
+            profile.enable()
+        started = self._started.setdefault(threading.get_ident(), [])
+        started.append((time.perf_counter(), time.process_time(), peak_rss(), profile))
+
+    def end(self, name: str, category: str, args: dict[str, Any]) -> None:
+        """Records a span."""
+        end, cpu_end, rss = time.perf_counter(), time.process_time(), peak_rss()
+        start, cpu_start, rss_start, profile = self._started[threading.get_ident()].pop()
+        event: dict[str, Any] = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {"cpu_ms": round((cpu_end - cpu_start) * 1e3, 3), **args},
+        }
+        if rss is not None and rss_start is not None:
+            event["args"]["peak_rss_mb"] = round(rss / 2**20, 1)
+            event["args"]["peak_rss_growth_mb"] = round((rss - rss_start) / 2**20, 1)
+        if profile is not None:
+            profile.disable()
+            self.cprofile_dir.mkdir(parents=True, exist_ok=True)  # type: ignore[union-attr]
+            path = self.cprofile_dir / f"{len(self.events):03d}-{name}.prof"  # type: ignore[operator]
+            profile.dump_stats(path)
+            event["args"]["cprofile"] = str(path)
+        self.events.append(event)
+
+    def trace(self) -> dict[str, Any]:
+        """Returns recorded spans as Chrome trace, in order of their start."""
+        return {"traceEvents": sorted(self.events, key=lambda e: e["ts"]), "displayTimeUnit": "ms"}
+
+    def write(self, path: Path) -> None:
+        """Writes recorded spans as Chrome trace.
+
+        Args:
+            path: path of the JSON file
+        """
+        path.write_text(json.dumps(self.trace(), indent=1))
+
+    def summary(self) -> list[str]:
+        """Returns one line per recorded span with its wall time, CPU time, peak RSS and rows, in order of start."""
+        lines = [f"{'span':<36} {'wall ms':>10} {'cpu ms':>10} {'peak MB':>9} {'rows':>10}"]
+        for event in self.trace()["traceEvents"]:
+            depth = sum(
+                other["ts"] <= event["ts"] and event["ts"] + event["dur"] <= other["ts"] + other["dur"]
+                for other in self.events
+                if other is not event
+            )
+            name = f"{'  ' * depth}{event['name']}"
+            rss = event["args"].get("peak_rss_mb", "")
+            rows = event["args"].get("rows", "")
+            lines.append(f"{name:<36} {event['dur'] / 1e3:>10.1f} {event['args']['cpu_ms']:>10.1f} {rss:>9} {rows:>10}")
+        return lines
@@ -0,0 +1,224 @@
+"""Query.
+
+This module filters stored tables by date range, labels, recipient and amount without reading them in full.
+
+Filters are pushed down into the storage: Parquet skips row groups by their statistics, Arrow IPC filters memory-mapped
+record batches and CSV is read in chunks. Tables sorted by date, like tx_distributed, stop being read after the end of
+the date range. CSV has no index to seek to the start of the range, so CSV tables are always read from their first row;
+large ledgers that get queried often are better stored as Parquet.
+
+Partitions whose recorded date range lies outside the query's aren't read at all.
+"""
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, fields
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from ledgercli.schema import TEXT_COLUMNS
+
+if TYPE_CHECKING:
+    import pyarrow.compute as pc
+
+    from ledgercli.storage import Storage
+
+# tables written in order of date
+DATE_SORTED_TABLES = ["tx_distributed"]
+
+
+@dataclass(frozen=True)
+class Query:
+    """Query.
+
+    All given filters have to match. Dates are inclusive, labels have to be equal and recipient matches any recipient
+    containing it, ignoring case.
+    """
+
+    start: pd.Timestamp | None = None
+    end: pd.Timestamp | None = None
+    label1: str | None = None
+    label2: str | None = None
+    label3: str | None = None
+    recipient: str | None = None
+    min_amount: float | None = None
+    max_amount: float | None = None
+
+    @classmethod
+    def from_dict(cls, filters: dict[str, Any]) -> "Query":
+        """Creates a query from filters, e.g. command line options or daemon request arguments.
+
+        Args:
+            filters: filters by field name, None values are ignored
+
+        Returns:
+            query
+        """
+        kwargs = {k: v for k, v in filters.items() if v is not None}
+        for k in ["start", "end"]:
+            if k in kwargs:
+                kwargs[k] = pd.Timestamp(kwargs[k])
+        return cls(**kwargs)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns the given filters as JSON serializable dict."""
+        filters = {f.name: getattr(self, f.name) for f in fields(self) if getattr(self, f.name) is not None}
+        return {k: v.isoformat() if isinstance(v, pd.Timestamp) else v for k, v in filters.items()}
+
+    def mask(self, frame: pd.DataFrame) -> npt.NDArray[np.bool_]:
+        """Returns which rows of frame match.
+
+        Args:
+            frame: table with the filtered columns
+
+        Returns:
+            boolean array
+        """
+        mask = np.ones(len(frame), dtype=bool)
+        if self.start is not None or self.end is not None:
+            dates = pd.to_datetime(frame["date"])
+            if self.start is not None:
+                mask &= (dates >= self.start).to_numpy()
+            if self.end is not None:
+                mask &= (dates <= self.end).to_numpy()
+        for k in ["label1", "label2", "label3"]:
+            value = getattr(self, k)
+            if value is not None:
+                # compared on the categories of categorical labels, missing labels are empty
+                matches = frame[k] == value
+                mask &= (matches | frame[k].isna() if value == "" else matches).to_numpy()
+        if self.recipient is not None:
+            recipients = frame["recipient"]
+            if isinstance(recipients.dtype, pd.CategoricalDtype) is False:
+                recipients = recipients.fillna("").astype(str)
+            mask &= recipients.str.contains(self.recipient, case=False, regex=False, na=False).to_numpy()
+        if self.min_amount is not None:
+            mask &= (frame["amount"] >= self.min_amount).to_numpy()
+        if self.max_amount is not None:
+            mask &= (frame["amount"] <= self.max_amount).to_numpy()
+        return mask
+
+    def expression(self) -> "pc.Expression | None":
+        """Returns the filters as pyarrow expression, used for predicate pushdown.
+
+        Returns:
+            expression or None if nothing is filtered
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        conditions = []
+        if self.start is not None:
+            conditions.append(ds.field("date") >= self.start.to_pydatetime())
+        if self.end is not None:
+            conditions.append(ds.field("date") <= self.end.to_pydatetime())
+        for k in ["label1", "label2", "label3"]:
+            value = getattr(self, k)
+            if value == "":
+                conditions.append(ds.field(k).is_null() | (ds.field(k) == ""))
+            elif value is not None:
+                conditions.append(ds.field(k) == value)
+        if self.recipient is not None:
+            # dictionary encoded recipients have no substring kernel
+            recipient = ds.field("recipient").cast(pa.string())
+            conditions.append(pc.match_substring(recipient, self.recipient, ignore_case=True))
+        if self.min_amount is not None:
+            conditions.append(ds.field("amount") >= self.min_amount)
+        if self.max_amount is not None:
+            conditions.append(ds.field("amount") <= self.max_amount)
+
+        if not conditions:
+            return None
+        expression = conditions[0]
+        for condition in conditions[1:]:
+            expression = expression & condition
+        return expression
+
+    def overlaps(self, first: str, last: str) -> bool:
+        """Checks if a date range intersects the date range of the query.
+
+        Args:
+            first: first date, e.g. of a partition
+            last: last date
+
+        Returns:
+            false if no date in the range can match
+        """
+        if self.start is not None and pd.Timestamp(last) < self.start:
+            return False
+        return self.end is None or pd.Timestamp(first) <= self.end
+
+    def past_end(self, frame: pd.DataFrame) -> bool:
+        """Checks if the last row of a frame sorted by date lies after the end of the date range.
+
+        Args:
+            frame: table sorted by date
+
+        Returns:
+            true if no later rows can match
+        """
+        return self.end is not None and len(frame) > 0 and pd.Timestamp(frame["date"].iloc[-1]) > self.end
+
+
+def scan(
+    storage: "Storage",
+    table: str,
+    query: Query,
+    columns: list[str] | None = None,
+    chunksize: int = 100_000,
+    dates: dict[str, list[str]] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Reads the rows of a stored table that match query, in chunks.
+
+    Args:
+        storage: storage of the table
+        table: table name
+        query: filters
+        columns: only return these columns, all columns if None
+        chunksize: maximum number of rows read at once
+        dates: first and last date per partition key, see Partitions.dates
+
+    Yields:
+        matching rows, a single empty chunk if nothing matches
+    """
+    matched = False
+    empty = None
+    sorted_by_date = table in DATE_SORTED_TABLES
+    for chunk in storage.scan(table, query, columns, chunksize, sorted_by_date, dates):
+        if len(chunk):
+            matched = True
+            yield chunk
+        elif empty is None:
+            empty = chunk
+    if matched is False and empty is not None:
+        yield empty
+
+
+def dump(chunks: Iterable[pd.DataFrame], fmt: str = "csv") -> Iterator[str]:
+    """Formats chunks of a table as they arrive.
+
+    Args:
+        chunks: chunks of a table
+        fmt: "csv" or "json", which writes one JSON object per row and line. Empty text is "" in both.
+
+    Yields:
+        formatted text
+
+    Raises:
+        KeyError: unknown format
+    """
+    if fmt not in ["csv", "json"]:
+        raise KeyError(f"Unknown format {fmt}.")
+
+    header = True
+    for chunk in chunks:
+        # empty labels are missing or "" depending on where the table was read from, both formats write them as ""
+        text = [c for c in TEXT_COLUMNS if c in chunk.columns]
+        chunk = chunk.assign(**{c: chunk[c].astype(object).fillna("") for c in text})
+        if fmt == "csv":
+            yield chunk.to_csv(index=False, header=header, date_format="%Y-%m-%d", float_format="%.2f")
+            header = False
+        elif len(chunk):
+            yield chunk.to_json(orient="records", lines=True, date_format="iso", date_unit="s").rstrip("\n") + "\n"
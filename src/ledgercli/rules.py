@@ -0,0 +1,176 @@
+"""Rules.
+
+This module maps recipients to clean names, labels and occurence by rules, so recipients that change with every
+payment, like "PAYPAL *SHOP 1234", don't each need their own row in the mapping table.
+
+Rules are compiled into two regular expressions, one for prefix and substring rules and one for regex rules, with one
+alternative per rule, ordered by priority. Searching a recipient finds the leftmost match, taking the first matching
+alternative at that position. Rules of higher priority can only match further right, so the search continues after it
+with just their alternatives, until none of them matches. The expression of prefix and substring rules starts with a
+lookahead on their first characters, which lets the regex engine skip positions none of them can match at. Regex rules
+with groups, backreferences or inline flags can't be alternatives and are searched on their own. Recipients are
+classified once per distinct value and broadcast back to all transactions by their factorized codes.
+"""
+import re
+from bisect import bisect_left
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+
+KINDS = ["prefix", "substring", "regex"]
+
+# values rules assign, same as the mapping table's
+MAPPING_COLUMNS = ["recipient_clean", "label1", "label2", "label3", "occurence"]
+
+
+class RuleError(ValueError):
+    """Raised if a rule is invalid."""
+
+
+def _combinable(pattern: str) -> bool:
+    """Checks if a valid regex can be an alternative of a combined expression.
+
+    Groups and backreferences would get renumbered and named groups could clash, inline flags must come first.
+    """
+    try:
+        return re.compile(f"(?:{pattern})").groups == 0
+    except re.error:
+        return False
+
+
+class RuleSet:
+    """RuleSet.
+
+    A rule matches recipients starting with its pattern (prefix), containing it (substring) or containing a match of
+    it as regular expression (regex), ignoring case. If several rules match, the one with the highest priority
+    applies, ties go to the rule listed first.
+    """
+
+    def __init__(self, rules: "pd.DataFrame") -> None:
+        """Compiles rules.
+
+        Args:
+            rules: rules table with kind, pattern, priority and the assigned values
+
+        Raises:
+            RuleError: unknown kind, missing pattern or bad regular expression
+        """
+        import numpy as np
+        import pandas as pd
+
+        self.rules = rules
+        priority = pd.to_numeric(rules["priority"]).fillna(0).to_numpy(dtype="float64")
+        # positions of rules in the rules table, in order of precedence
+        self.order = np.argsort(-priority, kind="stable")
+
+        # precedences, alternatives and first characters of literal and regex rules
+        self._groups: list[tuple[list[int], list[str], list[str] | None]] = [([], [], []), ([], [], None)]
+        # precedences and expressions of regex rules matched on their own
+        self._separate: list[tuple[int, re.Pattern[str]]] = []
+        for precedence, position in enumerate(self.order):
+            kind, pattern = rules["kind"].iloc[position], rules["pattern"].iloc[position]
+            if not isinstance(kind, str) or kind not in KINDS:
+                raise RuleError(f"Rule {position + 1} has an unknown kind {kind}, use one of {', '.join(KINDS)}.")
+            if not isinstance(pattern, str) or pattern == "":
+                raise RuleError(f"Rule {position + 1} has no pattern.")
+            if kind == "regex":
+                try:
+                    compiled = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+                except re.error as exc:
+                    raise RuleError(f"Rule {position + 1} has an invalid regex {pattern}: {exc}.") from exc
+                if _combinable(pattern) is False:
+                    self._separate.append((precedence, compiled))
+                    continue
+
+            precedences, alternatives, firsts = self._groups[kind == "regex"]
+            group = f"r{len(alternatives)}"
+            precedences.append(precedence)
+            if kind == "regex":
+                alternatives.append(f"(?P<{group}>{pattern})")
+            else:
+                alternatives.append(f"(?P<{group}>{'^' if kind == 'prefix' else ''}{re.escape(pattern)})")
+                firsts.append(re.escape(pattern[0]))  # type: ignore[union-attr]
+        self._patterns: dict[tuple[int, int], re.Pattern[str]] = {}
+
+    def _pattern(self, group: int, n: int) -> "re.Pattern[str]":
+        """Returns the expression of the first n alternatives of a group, compiling it once."""
+        if (group, n) not in self._patterns:
+            _, alternatives, firsts = self._groups[group]
+            pattern = "|".join(alternatives[:n])
+            if firsts is not None:
+                pattern = f"(?=[{''.join(sorted(set(firsts[:n])))}])(?:{pattern})"
+            self._patterns[group, n] = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+        return self._patterns[group, n]
+
+    def classify(self, recipients: "npt.NDArray[np.str_]") -> "npt.NDArray[np.int64]":
+        """Returns the rule every recipient is matched by.
+
+        Args:
+            recipients: distinct recipients
+
+        Returns:
+            positions of the matching rules in the rules table, -1 if none matches
+        """
+        import numpy as np
+
+        matched = np.full(len(recipients), -1, dtype="int64")
+        for i, recipient in enumerate(recipients):
+            best = len(self.order)
+            for group, (precedences, _, _) in enumerate(self._groups):
+                # only alternatives preceding the best match so far
+                n, pos = bisect_left(precedences, best), 0
+                while n > 0:
+                    m = self._pattern(group, n).search(recipient, pos)
+                    if m is None:
+                        break
+                    # alternatives have no groups of their own, so the last group is the rule's
+                    n, pos = int(m.lastgroup[1:]), m.start() + 1  # type: ignore[index]
+                    best = precedences[n]
+            for precedence, compiled in self._separate:
+                if precedence >= best:
+                    break
+                if compiled.search(recipient) is not None:
+                    best = precedence
+                    break
+            if best < len(self.order):
+                matched[i] = self.order[best]
+        return matched
+
+    def match(self, recipients: "pd.Series") -> "npt.NDArray[np.int64]":
+        """Returns the rule every recipient is matched by, classifying every distinct recipient once.
+
+        Args:
+            recipients: recipients, missing ones match no rule
+
+        Returns:
+            positions of the matching rules in the rules table, -1 if none matches
+        """
+        import numpy as np
+        import pandas as pd
+
+        codes, uniques = pd.factorize(recipients)
+        classified = np.append(self.classify(np.asarray(uniques, dtype=np.str_)), -1)
+        # missing recipients have code -1, which picks the appended -1
+        return classified[codes]
+
+    def values(self, recipients: "pd.Series") -> "pd.DataFrame":
+        """Returns the values assigned to every recipient by rules.
+
+        Args:
+            recipients: recipients
+
+        Returns:
+            values per recipient, aligned with recipients, missing if no rule matches
+        """
+        import numpy as np
+        import pandas as pd
+
+        matched = self.match(recipients)
+        if len(self.rules) == 0:
+            return pd.DataFrame(np.nan, index=recipients.index, columns=MAPPING_COLUMNS)
+        hit = pd.Series(matched >= 0, index=recipients.index)
+        values = self.rules[MAPPING_COLUMNS].iloc[np.maximum(matched, 0)].set_axis(recipients.index)
+        return values.where(hit, axis=0)
@@ -0,0 +1,166 @@
+"""Schema.
+
+This module declares the columns of every table and their kinds once. Tables are typed when they are read, CSV columns
+get parsed into their dtypes instead of being inferred, and again at the end of every update. Columns already of their
+dtype are left as they are, so typing a typed table copies nothing. Headers of stored tables are validated before
+they are used, so a missing column is reported by name instead of failing somewhere in update.
+
+Missing values are NaN and NaT, or pd.NA for nullable integers, amounts in cents included. Text columns are
+categoricals sharing the Ledger's dictionary, in which the empty string stands for no value.
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# dtype of every kind of column, with amounts in currency units and in cents
+KINDS = {
+    "amount": ("float64", "int64"),
+    "nullable_amount": ("float64", "Int64"),
+    "number": ("float64", "float64"),
+    "integer": ("Int64", "Int64"),
+    "count": ("int64", "int64"),
+    "date": ("datetime64[ns]", "datetime64[ns]"),
+    # encoded with the Ledger's shared dictionary
+    "text": ("category", "category"),
+    # income or expense, missing for zero amounts
+    "type": ("category", "category"),
+    "string": ("string", "string"),
+}
+
+TYPES = ["expense", "income"]
+
+
+class SchemaError(ValueError):
+    """Raised if a stored table doesn't match its schema."""
+
+
+@dataclass(frozen=True)
+class Schema:
+    """Schema.
+
+    Attributes:
+        columns: kind of every column, in the order tables are stored in
+    """
+
+    columns: dict[str, str]
+
+    def dtypes(self, cents: bool = False) -> dict[str, Any]:
+        """Returns the dtype of every column.
+
+        Args:
+            cents: if true, amounts are int64 cents
+
+        Returns:
+            dtypes, text columns as categoricals without categories
+        """
+        import pandas as pd
+
+        dtypes: dict[str, Any] = {k: KINDS[kind][cents] for k, kind in self.columns.items()}
+        dtypes.update({k: pd.CategoricalDtype(TYPES) for k, kind in self.columns.items() if kind == "type"})
+        return dtypes
+
+    def csv_dtypes(self) -> dict[str, Any]:
+        """Returns the dtypes CSV columns are parsed into, amounts in currency units."""
+        return self.dtypes()
+
+    def empty(self, cents: bool = False, text: Any = "category") -> "pd.DataFrame":
+        """Returns an empty table.
+
+        Args:
+            cents: if true, amounts are int64 cents
+            text: dtype of text columns, e.g. the shared dictionary
+
+        Returns:
+            table without rows
+        """
+        import pandas as pd
+
+        dtypes = self.dtypes(cents)
+        return pd.DataFrame(
+            {k: pd.Series(dtype=text if kind == "text" else dtypes[k]) for k, kind in self.columns.items()}
+        )
+
+    def validate(self, columns: "pd.Index | list[str]", name: str) -> None:
+        """Checks if a table has all columns of the schema.
+
+        Args:
+            columns: header of the table
+            name: table name, for the error message
+
+        Raises:
+            SchemaError: if columns are missing
+        """
+        missing = [k for k in self.columns if k not in set(columns)]
+        if missing:
+            raise SchemaError(f"{name} is missing the columns {', '.join(missing)}.")
+
+    def enforce(self, df: "pd.DataFrame", cents: bool = False) -> None:
+        """Casts columns to their dtypes in place, skipping columns already of their dtype.
+
+        Text columns are left to the Ledger, which encodes them with its shared dictionary. Columns that aren't part
+        of the schema are left as they are.
+
+        Args:
+            df: table
+            cents: if true, amounts are int64 cents
+        """
+        for k, dtype in self.dtypes(cents).items():
+            if k in df.columns and self.columns[k] != "text" and df[k].dtype != dtype:
+                df[k] = df[k].astype(dtype)
+
+
+MAPPING = {
+    "recipient_clean": "text",
+    "label1": "text",
+    "label2": "text",
+    "label3": "text",
+    "occurence": "number",
+}
+
+CUSTOM = {
+    "amount_custom": "nullable_amount",
+    "date_custom": "date",
+    "recipient_clean_custom": "text",
+    "label1_custom": "text",
+    "label2_custom": "text",
+    "label3_custom": "text",
+    "occurence_custom": "number",
+}
+
+# coalesced and distributed transactions, recipients replaced with their clean names
+COALESCED = {
+    "amount": "amount",
+    "date": "date",
+    "recipient": "text",
+    "label1": "text",
+    "label2": "text",
+    "label3": "text",
+    "occurence": "number",
+}
+
+
+def _rollup(period: str) -> Schema:
+    """Returns the schema of the rollup of a period."""
+    columns = {period: "date", "type": "type", "label1": "text", "label2": "text", "label3": "text"}
+    return Schema({**columns, "amount": "amount", "transactions": "count"})
+
+
+SCHEMAS = {
+    "transactions": Schema({"amount": "amount", "date": "date", "recipient": "text", **CUSTOM, **MAPPING}),
+    "metadata": Schema({"starting_balance": "amount", "bank": "string"}),
+    "mapping": Schema({"recipient": "text", **MAPPING}),
+    "rules": Schema({"kind": "string", "pattern": "string", "priority": "integer", **MAPPING}),
+    "history": Schema({"date": "date", "amount": "amount", "balance": "amount"}),
+    "tx_coalesced": Schema(COALESCED),
+    "tx_distributed": Schema(COALESCED),
+    **{f"rollup_{period}": _rollup(period) for period in ["week", "month", "quarter", "year"]},
+    "rollup_recipient": Schema({"recipient": "text", "type": "type", "amount": "amount", "transactions": "count"}),
+}
+
+# columns encoded with the shared dictionary and amount columns, over all tables
+TEXT_COLUMNS = list(dict.fromkeys(k for s in SCHEMAS.values() for k, kind in s.columns.items() if kind == "text"))
+AMOUNT_COLUMNS = list(
+    dict.fromkeys(k for s in SCHEMAS.values() for k, kind in s.columns.items() if kind.endswith("amount"))
+)
@@ -0,0 +1,189 @@
+"""PipelineState.
+
+This module persists what the Ledger wrote last time, so unchanged tables and pipeline stages can be skipped.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+from ledgercli.storage import Storage, write_atomic
+
+TABLES = [
+    "transactions",
+    "metadata",
+    "mapping",
+    "rules",
+    "history",
+    "tx_coalesced",
+    "tx_distributed",
+    "rollup_week",
+    "rollup_month",
+    "rollup_quarter",
+    "rollup_year",
+    "rollup_recipient",
+]
+
+
+class PipelineState:
+    """PipelineState.
+
+    It records a digest and the file stats of every written table and partition, so an untouched file is recognized by
+    its stats and a touched one by its digest. The state is the manifest of a write: it's replaced atomically after all
+    tables, with the generation incremented, so tables of an interrupted write don't match it and count as changed.
+    """
+
+    file = "state.json"
+
+    def __init__(
+        self,
+        tables: dict[str, dict[str, Any]] | None = None,
+        generation: int = 0,
+        rollups: dict[str, str] | None = None,
+    ) -> None:
+        """Initializes the state.
+
+        Args:
+            tables: recorded digest and file stats per table
+            generation: number of writes that changed tables
+            rollups: digest of the distributed transactions per month, as of the stored rollups
+        """
+        self.tables = tables or {}
+        self.generation = generation
+        self.rollups = rollups or {}
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """Calculates a content digest.
+
+        Args:
+            data: serialized table
+
+        Returns:
+            hex digest
+        """
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    @staticmethod
+    def file_digest(path: Path) -> str:
+        """Calculates the content digest of a file.
+
+        Args:
+            path: path to file
+
+        Returns:
+            hex digest, same as digest over the file's content
+        """
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def stats(paths: list[Path]) -> dict[str, list[int]]:
+        """Returns modification time and size of files.
+
+        Args:
+            paths: paths to existing files
+
+        Returns:
+            modification time in ns and size in bytes per file name
+        """
+        stats = {}
+        for p in paths:
+            stat = p.stat()
+            stats[p.name] = [stat.st_mtime_ns, stat.st_size]
+        return stats
+
+    @classmethod
+    def read(cls, output_dir: Path) -> "PipelineState":
+        """Reads state from output_dir.
+
+        A missing or unreadable state file results in an empty state, so everything counts as changed.
+
+        Args:
+            output_dir: dir where files get written to
+
+        Returns:
+            state
+        """
+        try:
+            raw = json.loads((output_dir / cls.file).read_text())
+            return cls(tables=raw["tables"], generation=raw["generation"], rollups=raw.get("rollups"))
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+    def write(self, output_dir: Path, fsync: bool = False) -> None:
+        """Writes state to output_dir atomically.
+
+        Args:
+            output_dir: dir where files get written to
+            fsync: if true, the state is flushed to disk before it replaces the stored one
+        """
+        raw = {"generation": self.generation, "tables": self.tables, "rollups": self.rollups}
+        write_atomic(output_dir / self.file, json.dumps(raw).encode(), fsync)
+
+    def record(self, name: str, storage: Storage, digest: str) -> None:
+        """Records a table after it has been written.
+
+        Args:
+            name: table name
+            storage: storage the table was written to
+            digest: digest of the written table
+        """
+        self.tables[name] = {"digest": digest, "files": self.stats(storage.files(name))}
+
+    def is_current(self, name: str, storage: Storage, digest: str) -> bool:
+        """Checks if a table with the given digest is already stored.
+
+        Args:
+            name: table name
+            storage: storage of the table
+            digest: digest of the serialized table
+
+        Returns:
+            true if the stored table is unchanged and has the same digest
+        """
+        return self.tables.get(name, {}).get("digest") == digest and self.changed(name, storage) is False
+
+    def changed(self, name: str, storage: Storage) -> bool:
+        """Checks if a table changed since it was recorded.
+
+        Args:
+            name: table name
+            storage: storage of the table
+
+        Returns:
+            true if the table is unknown, missing or its content differs
+        """
+        partitions = self._partitions(name, storage)
+        if partitions:
+            return any(self.changed(partition, storage) for partition in partitions)
+        record = self.tables.get(name)
+        if record is None or storage.exists(name) is False:
+            return True
+        if record["files"] == self.stats(storage.files(name)):
+            return False
+        return bool(self.file_digest(storage.source(name)) != record["digest"])
+
+    def is_clean(self, storage: Storage) -> bool:
+        """Checks if no table changed since the last write, using file stats only.
+
+        Args:
+            storage: storage of the tables
+
+        Returns:
+            true if all tables are recorded and their files are untouched
+        """
+        for table in TABLES:
+            for name in self._partitions(table, storage) or [table]:
+                record = self.tables.get(name)
+                if record is None or record["files"] != self.stats(storage.files(name)):
+                    return False
+        return True
+
+    def _partitions(self, name: str, storage: Storage) -> list[str]:
+        """Returns the names of all recorded and stored partitions of a table."""
+        recorded = {k for k in self.tables if k.startswith(f"{name}/")}
+        return sorted(recorded | {f"{name}/{key}" for key in storage.partitions(name)})
@@ -0,0 +1,463 @@
+"""Storage.
+
+This module provides interchangeable backends for reading and writing ledger tables. CSV keeps tables hand-editable,
+the binary backends (Parquet and Arrow IPC) need pyarrow, keep dtypes and read memory-mapped. A CSV copy of an editable
+table that is newer than the stored table is read instead, so hand-edits are picked up.
+
+Tables are typed by their schema when read and can be scanned with a query that is pushed down into the backend.
+Partitions are stored as one file each in a dir named like their table and addressed as "<table>/<key>".
+
+Files are written atomically via a temp file next to them, optionally flushed to disk first. pandas is only imported
+when a table is read, like in the other modules the command line loads before reading tables.
+"""
+import io
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from ledgercli.schema import SCHEMAS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from ledgercli.query import Query
+
+EDITABLE_TABLES = ["mapping", "rules", "transactions"]
+
+# rows per Parquet row group and Arrow record batch
+ROW_GROUP_SIZE = 65_536
+
+
+class Storage(ABC):
+    """Storage.
+
+    Tables are addressed by name, e.g. "transactions", and stored as one file per table in output_dir. Partitions of
+    a table are addressed by table name and key, e.g. "transactions/2023".
+    """
+
+    suffix = ""
+    # pyarrow dataset format of binary backends
+    _dataset_format = ""
+
+    def __init__(self, output_dir: Path) -> None:
+        """Initializes the storage.
+
+        Args:
+            output_dir: dir where tables are stored
+        """
+        self.output_dir = output_dir
+
+    def path(self, name: str) -> Path:
+        """Returns path of a table.
+
+        Args:
+            name: table name
+
+        Returns:
+            path of table
+        """
+        return self.output_dir / f"{name}{self.suffix}"
+
+    def exists(self, name: str) -> bool:
+        """Checks if a table exists.
+
+        Args:
+            name: table name
+
+        Returns:
+            true if table or any of its partitions exists
+        """
+        return self.path(name).exists() or self._csv_copy(name) is not None or bool(self.partitions(name))
+
+    def partitions(self, name: str) -> list[str]:
+        """Returns the keys of the stored partitions of a table.
+
+        Args:
+            name: table name
+
+        Returns:
+            sorted keys, empty if the table isn't partitioned
+        """
+        folder = self.output_dir / name
+        if folder.is_dir() is False:
+            return []
+        suffixes = {self.suffix, CsvStorage.suffix} if name in EDITABLE_TABLES else {self.suffix}
+        return sorted({p.stem for p in folder.iterdir() if p.suffix in suffixes})
+
+    def read(self, name: str, columns: list[str] | None = None) -> "pd.DataFrame":
+        """Reads a table.
+
+        Args:
+            name: table name
+            columns: only read these columns, all columns if None
+
+        Returns:
+            table typed by its schema, partitioned tables concatenated in order of their keys
+        """
+        keys = self.partitions(name)
+        if keys:
+            import pandas as pd
+
+            return pd.concat([self.read(f"{name}/{key}", columns) for key in keys], ignore_index=True)
+        csv_copy = self._csv_copy(name)
+        if csv_copy is not None:
+            return CsvStorage(self.output_dir).read(name, columns)
+        schema = SCHEMAS.get(_table(name))
+        table = self._read(self.path(name), columns, None if schema is None else schema.csv_dtypes())
+        if schema is not None:
+            schema.enforce(table)
+        return table
+
+    def scan(
+        self,
+        name: str,
+        query: "Query",
+        columns: list[str] | None,
+        chunksize: int,
+        sorted_by_date: bool = False,
+        dates: dict[str, list[str]] | None = None,
+    ) -> Iterator["pd.DataFrame"]:
+        """Reads the rows of a table matching query, in chunks.
+
+        Args:
+            name: table name
+            query: filters
+            columns: only return these columns, all columns if None
+            chunksize: maximum number of rows read at once
+            sorted_by_date: if true, reading stops after the end of the date range
+            dates: first and last date per partition key, partitions outside the date range of query are skipped
+
+        Yields:
+            matching rows, chunks can be empty
+        """
+        keys = self.partitions(name)
+        if keys:
+            dates = dates or {}
+            for key in keys:
+                if key in dates and query.overlaps(*dates[key]) is False:
+                    continue
+                yield from self.scan(f"{name}/{key}", query, columns, chunksize, sorted_by_date)
+            return
+        csv_copy = self._csv_copy(name)
+        if csv_copy is not None:
+            yield from CsvStorage(self.output_dir)._scan(csv_copy, query, columns, chunksize, sorted_by_date)
+        else:
+            yield from self._scan(self.path(name), query, columns, chunksize, sorted_by_date)
+
+    def source(self, name: str) -> Path:
+        """Returns the file a table is read from.
+
+        Args:
+            name: table name
+
+        Returns:
+            path of the stored table or of its CSV copy, if that is newer
+        """
+        return self._csv_copy(name) or self.path(name)
+
+    def files(self, name: str) -> list[Path]:
+        """Returns all existing files of a table, including CSV copies and partitions.
+
+        Args:
+            name: table name
+
+        Returns:
+            list of paths
+        """
+        paths = [self.path(name), CsvStorage(self.output_dir).path(name)]
+        paths += [p for key in self.partitions(name) for p in self.files(f"{name}/{key}")]
+        return sorted({p for p in paths if p.exists()})
+
+    @abstractmethod
+    def serialize(self, df: "pd.DataFrame") -> bytes:
+        """Serializes a table into the storage format.
+
+        Args:
+            df: table
+
+        Returns:
+            serialized table
+        """
+
+    def write(self, name: str, df: "pd.DataFrame", data: bytes | None = None, fsync: bool = False) -> None:
+        """Writes a table atomically.
+
+        Existing CSV copies of editable tables are refreshed before the table itself is written, so the table stays
+        the newer file until the copy gets edited.
+
+        Args:
+            name: table name
+            df: table
+            data: df already serialized with serialize, serialized on demand if None
+            fsync: if true, the table is flushed to disk before it replaces the stored one
+        """
+        csv = CsvStorage(self.output_dir)
+        if self.suffix != csv.suffix and _table(name) in EDITABLE_TABLES and csv.path(name).exists():
+            csv.write(name, df, fsync=fsync)
+        self.path(name).parent.mkdir(exist_ok=True)
+        write_atomic(self.path(name), self.serialize(df) if data is None else data, fsync)
+
+    def remove(self, name: str) -> None:
+        """Removes the file of a table or partition and its CSV copy.
+
+        Args:
+            name: table or partition name
+        """
+        for path in [self.path(name), CsvStorage(self.output_dir).path(name)]:
+            path.unlink(missing_ok=True)
+
+    def export_csv(self, name: str) -> Path:
+        """Writes a CSV copy of a table for hand-editing.
+
+        Args:
+            name: table name
+
+        Returns:
+            path of the CSV copy
+        """
+        table = self.read(name)
+        csv = CsvStorage(self.output_dir)
+        csv.write(name, table)
+        if self.suffix != csv.suffix:
+            # keep the stored table the newer file, the copy hasn't been edited yet
+            self.path(name).touch()
+        return csv.path(name)
+
+    def _csv_copy(self, name: str) -> Path | None:
+        """Returns the CSV copy of an editable table if it's newer than the stored table."""
+        csv_path = self.output_dir / f"{name}{CsvStorage.suffix}"
+        if self.suffix == CsvStorage.suffix or _table(name) not in EDITABLE_TABLES or csv_path.exists() is False:
+            return None
+        path = self.path(name)
+        if path.exists() and path.stat().st_mtime_ns >= csv_path.stat().st_mtime_ns:
+            return None
+        return csv_path
+
+    @abstractmethod
+    def _read(self, path: Path, columns: list[str] | None, dtypes: dict[str, Any] | None) -> "pd.DataFrame":
+        """Reads a table file, CSV columns are parsed into dtypes."""
+
+    def _scan(
+        self, path: Path, query: "Query", columns: list[str] | None, chunksize: int, sorted_by_date: bool
+    ) -> Iterator["pd.DataFrame"]:
+        """Scans a binary table with pyarrow, filtering record batches with the query expression."""
+        import pyarrow.dataset as ds
+        from pyarrow.fs import LocalFileSystem
+
+        dataset = ds.dataset(path, format=self._dataset_format, filesystem=LocalFileSystem(use_mmap=True))
+        scanner = dataset.scanner(columns=columns, filter=query.expression(), batch_size=chunksize)
+        for batch in scanner.to_batches():
+            yield batch.to_pandas()
+
+
+class CsvStorage(Storage):
+    """CsvStorage."""
+
+    suffix = ".csv"
+
+    def _read(self, path: Path, columns: list[str] | None, dtypes: dict[str, Any] | None) -> "pd.DataFrame":
+        """Reads a CSV table with the multithreaded pyarrow parser if it's installed, else with the C parser.
+
+        Dates the pyarrow parser can't handle, e.g. hand-edited in another format, are left to Schema.enforce.
+        """
+        import pandas as pd
+
+        dtypes = dtypes or {}
+        if _has_pyarrow():
+            try:
+                return pd.read_csv(path, usecols=columns, dtype=dtypes, engine="pyarrow")
+            except ValueError:
+                pass
+        dates = [k for k, dtype in dtypes.items() if dtype == "datetime64[ns]"]
+        header = pd.read_csv(path, nrows=0).columns
+        return pd.read_csv(
+            path,
+            usecols=columns,
+            dtype={k: dtype for k, dtype in dtypes.items() if k not in dates},
+            parse_dates=[k for k in dates if k in header and (columns is None or k in columns)],
+            date_format="ISO8601",
+        )
+
+    def serialize(self, df: "pd.DataFrame") -> bytes:  # noqa: D102
+        return df.to_csv(index=False, date_format="%Y-%m-%d", float_format="%.2f").encode()
+
+    def _scan(
+        self, path: Path, query: "Query", columns: list[str] | None, chunksize: int, sorted_by_date: bool
+    ) -> Iterator["pd.DataFrame"]:
+        """Reads a CSV table in chunks from its first row, filtering every chunk."""
+        import pandas as pd
+
+        with pd.read_csv(path, chunksize=chunksize) as reader:
+            for chunk in reader:
+                if "date" in chunk.columns:
+                    chunk["date"] = pd.to_datetime(chunk["date"])
+                matches = chunk[query.mask(chunk)]
+                yield matches if columns is None else matches[columns]
+                if sorted_by_date and query.past_end(chunk):
+                    break
+
+
+class ParquetStorage(Storage):
+    """ParquetStorage."""
+
+    suffix = ".parquet"
+    _dataset_format = "parquet"
+
+    def __init__(self, output_dir: Path) -> None:  # noqa: D107
+        _require_pyarrow()
+        super().__init__(output_dir)
+
+    def _read(self, path: Path, columns: list[str] | None, dtypes: dict[str, Any] | None) -> "pd.DataFrame":
+        import pyarrow.parquet as pq
+
+        table: pd.DataFrame = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+        return table
+
+    def serialize(self, df: "pd.DataFrame") -> bytes:  # noqa: D102
+        buffer = io.BytesIO()
+        _used_categories(df).to_parquet(buffer, index=False, engine="pyarrow", row_group_size=ROW_GROUP_SIZE)
+        return buffer.getvalue()
+
+
+class ArrowStorage(Storage):
+    """ArrowStorage.
+
+    Tables are stored uncompressed in the Arrow IPC file format, so reads are zero-copy memory maps.
+    """
+
+    suffix = ".arrow"
+    _dataset_format = "ipc"
+
+    def __init__(self, output_dir: Path) -> None:  # noqa: D107
+        _require_pyarrow()
+        super().__init__(output_dir)
+
+    def _read(self, path: Path, columns: list[str] | None, dtypes: dict[str, Any] | None) -> "pd.DataFrame":
+        import pyarrow.feather as feather
+
+        table: pd.DataFrame = feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+        return table
+
+    def serialize(self, df: "pd.DataFrame") -> bytes:  # noqa: D102
+        import pyarrow.feather as feather
+
+        buffer = io.BytesIO()
+        feather.write_feather(
+            _used_categories(df).reset_index(drop=True), buffer, compression="uncompressed", chunksize=ROW_GROUP_SIZE
+        )
+        return buffer.getvalue()
+
+
+STORAGE_FMTS: dict[str, type[Storage]] = {
+    "csv": CsvStorage,
+    "parquet": ParquetStorage,
+    "arrow": ArrowStorage,
+}
+
+
+def get_storage(storage_fmt: str | None, output_dir: Path) -> Storage:
+    """Returns the storage for a storage format.
+
+    If no storage format is provided, it's detected from the transactions table in output_dir and defaults to csv.
+
+    Args:
+        storage_fmt: a storage format
+        output_dir: dir where tables are stored
+
+    Returns:
+        storage
+
+    Raises:
+        KeyError: bad storage_fmt
+    """
+    if storage_fmt is None:
+        storage_fmt = next(
+            (
+                k
+                for k, v in STORAGE_FMTS.items()
+                if k != "csv"
+                and (
+                    (output_dir / f"transactions{v.suffix}").exists()
+                    or any(output_dir.glob(f"transactions/*{v.suffix}"))
+                )
+            ),
+            "csv",
+        )
+    if storage_fmt not in STORAGE_FMTS:
+        raise KeyError("The storage_fmt you provided is not supported.")
+    return STORAGE_FMTS[storage_fmt](output_dir)
+
+
+def write_atomic(path: Path, data: bytes, fsync: bool = False) -> None:
+    """Writes a file atomically, by writing a temp file in the same dir and renaming it to path.
+
+    Args:
+        path: path of the file
+        data: content of the file
+        fsync: if true, the temp file is flushed to disk before the rename and the dir after it, so the write
+            survives a power loss
+    """
+    # unique per thread, tables are written concurrently; the suffix keeps it out of partition listings
+    tmp = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if fsync and os.name == "posix":
+        # persists the rename, directories can't be opened on Windows
+        fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _used_categories(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Reduces categorical columns to their used categories in sorted order, which get stored as dictionaries.
+
+    The Ledger's shared dictionary grows with every distinct value in order of appearance, so tables and partitions
+    would otherwise change whenever a value shows up anywhere else.
+    """
+    import pandas as pd
+
+    categorical = [k for k in df.columns if isinstance(df[k].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    reduced = {}
+    for k in categorical:
+        column = df[k].cat.remove_unused_categories()
+        reduced[k] = column.cat.reorder_categories(column.cat.categories.sort_values())
+    return df.assign(**reduced)
+
+
+def _table(name: str) -> str:
+    """Returns the table name of a table or partition name."""
+    return name.split("/")[0]
+
+
+def _has_pyarrow() -> bool:
+    """Checks if the optional pyarrow dependency is installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _require_pyarrow() -> None:
+    """Raises a helpful error if the optional pyarrow dependency is missing."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise ImportError(
+            "Binary storage formats need pyarrow. Please install ledger-cli with the arrow extra!"
+        ) from exc
@@ -0,0 +1,12 @@
+"""Fixtures shared by the tests."""
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def output_dir(tmp_path: Path) -> Path:
+    """Creates an output dir for storing output."""
+    o = tmp_path / "output_dir"
+    o.mkdir()
+    return o
@@ -0,0 +1,35 @@
+"""Helpers shared by the tests."""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_tx_d(n: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """Returns n random distributed transactions over two years, sorted by date."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "amount": rng.normal(0, 100, size=n).round(2),
+            "date": pd.to_datetime("2020-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 700, size=n)), unit="D"),
+            "recipient": rng.choice(["Grocery Store", "Landlord", "Employer"], size=n),
+            "label1": rng.choice(["groceries", "rent", ""], size=n),
+            "label2": "",
+            "label3": "",
+            "occurence": 0.0,
+        }
+    )
+
+
+def dkb_export(tmp_path: Path, rows: list[tuple[str, str, str]], name: str = "export.csv") -> Path:
+    """Writes a DKB export with the given date, recipient and amount rows."""
+    sample = Path("tests/dkb_sample.csv").read_bytes().splitlines(keepends=True)
+    row = sample[-1]
+    lines = [
+        row.replace(b"01.01.2021", date.encode()).replace(b'"Test"', f'"{recipient}"'.encode())
+        for date, recipient, _ in rows
+    ]
+    lines = [line.replace(b"1000,01", amount.encode()) for line, (_, _, amount) in zip(lines, rows, strict=True)]
+    path = tmp_path / name
+    path.write_bytes(b"".join(sample[:-1] + lines).replace(b"1.000,01 EUR", b"100,00 EUR"))
+    return path
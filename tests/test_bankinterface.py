@@ -5,7 +5,10 @@ BankInterface provides an extendable interface between ledgercli and CSV exports
 Incase you want to create a PR with your bank format, please create a dummy with
 the expected values and redacted other information but still keeping the report structure.
 """
+import re
+import shutil
 from pathlib import Path
+from typing import Any
 
 import numpy as np
 import pandas as pd
@@ -87,3 +90,90 @@ def test_bankinterface(
     metadata = BankInterface().get_metadata(bank_fmt, export_path)
     assert set(metadata["bank"]) == {bank_fmt}
     assert set(metadata["starting_balance"]) == {0.0}
+
+
+def test_read_export(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if an export is parsed in a single read."""
+    export_path = tmp_path / "dkb_sample.csv"
+    shutil.copy(Path("tests/dkb_sample.csv"), export_path)
+
+    calls = []
+    read_csv = pd.read_csv
+
+    def counting_read_csv(*args: Any, **kwargs: Any) -> Any:
+        calls.append(args)
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", counting_read_csv)
+
+    export = BankInterface().read_export("dkb", export_path)
+    assert export.header["Kontonummer"] == "DE38120300001064287814 / Girokonto"
+    assert export.end_balance == 1000.01
+    assert np.isnan(export.start_balance)
+
+    assert len(calls) == 1
+
+    # metadata takes balances and transactions from the same read
+    BankInterface().get_metadata("dkb", export_path)
+    assert len(calls) == 2
+
+    # reads aren't cached, changed files are read as they are now
+    export_path.write_bytes(Path("tests/dkb_sample.csv").read_bytes() + b"\n")
+    BankInterface().get_transactions("dkb", export_path)
+    assert len(calls) == 3
+
+
+def test_iter_export(tmp_path: Path) -> None:
+    """Tests if streaming an export in chunks yields the same transactions as reading it at once."""
+    export_path = tmp_path / "dkb_large.csv"
+    sample = Path("tests/dkb_sample.csv").read_bytes()
+    row = sample.splitlines(keepends=True)[-1]
+    export_path.write_bytes(sample + row.replace(b"1000,01", b"-1.234,50") * 4)
+
+    chunks = list(BankInterface.iter_export("dkb", export_path, chunksize=2))
+    assert [len(c.transactions) for c in chunks] == [2, 2, 1]
+    assert {c.end_balance for c in chunks} == {1000.01}
+
+    tx = pd.concat([c.transactions for c in chunks], ignore_index=True)
+    assert tx.columns.tolist() == ["date", "recipient", "amount"]
+    pd.testing.assert_frame_equal(tx, BankInterface.get_transactions("dkb", export_path))
+    assert tx["amount"].tolist() == [1000.01, -1234.5, -1234.5, -1234.5, -1234.5]
+
+    with pytest.raises(KeyError):
+        next(BankInterface.iter_export("invalid", export_path))
+
+
+def test_two_digit_years(tmp_path: Path) -> None:
+    """Tests if dates with two-digit years are parsed day first and unparseable dates are reported."""
+    export_path = tmp_path / "sp_short.csv"
+    header, row = Path("tests/sp_sample.csv").read_text(encoding="latin1").splitlines()
+    rows = [row.replace("01.01.2021", "05.03.21"), row.replace("01.01.2021", "06.03.2021")]
+    export_path.write_text("\n".join([header, *rows]) + "\n", encoding="latin1")
+
+    tx = BankInterface.get_transactions("sp", export_path)
+    assert tx["date"].dtype == "datetime64[ns]"
+    assert tx["date"].tolist() == [pd.Timestamp(2021, 3, 5), pd.Timestamp(2021, 3, 6)]
+
+    export_path.write_text("\n".join([header, row.replace("01.01.2021", "2021/03/05")]) + "\n", encoding="latin1")
+    with pytest.raises(ValueError, match="has dates like 2021/03/05"):
+        BankInterface.get_transactions("sp", export_path)
+
+
+def test_malformed_header(tmp_path: Path) -> None:
+    """Tests if a header that doesn't match the bank format or the rows is reported with the export and column."""
+    export_path = tmp_path / "sp_malformed.csv"
+    header, row = Path("tests/sp_sample.csv").read_text(encoding="latin1").splitlines()
+    names = header.split(";")
+    escaped = re.escape(str(export_path))
+
+    export_path.write_text("\n".join([";".join(names[:12]), row]) + "\n", encoding="latin1")
+    with pytest.raises(ValueError, match=f"{escaped} has no amount column, sp expects it as column 15"):
+        BankInterface.get_transactions("sp", export_path)
+
+    export_path.write_text("\n".join([header, row + ';"extra"']) + "\n", encoding="latin1")
+    with pytest.raises(ValueError, match=f"{escaped} has an extra column {len(names) + 1} with values like 'extra'"):
+        next(BankInterface.iter_export("sp", export_path))
+
+    export_path.write_text("\n".join([header + ';"Extra"', row]) + "\n", encoding="latin1")
+    with pytest.raises(ValueError, match=f"{escaped} is missing columns 'Extra' of its header"):
+        BankInterface.get_transactions("sp", export_path)
@@ -0,0 +1,120 @@
+"""Tests for the bank format registry."""
+import codecs
+import subprocess
+import sys
+import warnings
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pytest
+
+from ledgercli import banks
+from ledgercli.bankinterface import BankInterface
+from ledgercli.banks import BankFormat, detect_bank_fmt, get_bank_fmt, list_bank_fmts, register
+from ledgercli.main import Ledger
+
+
+def test_list_bank_fmts_is_lazy() -> None:
+    """Tests if listing formats neither imports format specs nor pandas."""
+    code = (
+        "import sys\n"
+        "from ledgercli.banks import list_bank_fmts\n"
+        "assert list_bank_fmts()[:2] == ['dkb', 'sp']\n"
+        "assert 'ledgercli.banks.dkb' not in sys.modules\n"
+        "assert 'pandas' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)  # noqa: S603
+
+
+def test_get_bank_fmt() -> None:
+    """Tests loading of built-in formats."""
+    assert get_bank_fmt("dkb").skiprows == 6
+    assert get_bank_fmt("sp").end_balance is None
+
+    with pytest.raises(KeyError, match="The bank_fmt you provided is not supported."):
+        get_bank_fmt("not-supported")
+
+
+def test_register(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if a declaratively registered format can be parsed."""
+    monkeypatch.setattr(banks, "_registered", {})
+    export_path = tmp_path / "export.csv"
+    export_path.write_text(
+        'Account,12345\nBalance,"EUR 2,000.50"\n\nBooked,Payee,Amount\n2021-01-31,Test,"1,000.25"\n', encoding="utf-8"
+    )
+    register(
+        BankFormat(
+            name="custom",
+            columns={"date": 0, "recipient": 1, "amount": 2},
+            sep=",",
+            decimal=".",
+            thousands=",",
+            encoding="utf-8",
+            skiprows=3,
+            date_formats=("%Y-%m-%d",),
+            end_balance="Balance",
+        )
+    )
+    assert "custom" in list_bank_fmts()
+
+    export = BankInterface().read_export("custom", export_path)
+    assert export.transactions["amount"].tolist() == [1000.25]
+    assert export.transactions["date"].dt.day.tolist() == [31]
+    assert export.end_balance == 2000.50
+
+
+@pytest.mark.parametrize(
+    "bank_fmt, export_path",
+    [
+        ("dkb", Path("tests/dkb_sample.csv")),
+        ("dkb", Path("tests/dkb_empty.csv")),
+        ("sp", Path("tests/sp_sample.csv")),
+        ("sp", Path("tests/sp_empty.csv")),
+    ],
+)
+def test_detect_bank_fmt(bank_fmt: str, export_path: Path) -> None:
+    """Tests if bank formats are detected from export headers."""
+    assert detect_bank_fmt(export_path) == bank_fmt
+
+
+def test_detect_fails_early(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if exports of unknown formats fail before being parsed."""
+    export_path = tmp_path / "unknown.csv"
+    export_path.write_text("a;b;c\n1;2;3\n")
+
+    def no_read_csv(*args: Any, **kwargs: Any) -> pd.DataFrame:
+        raise AssertionError("export should not be parsed")
+
+    monkeypatch.setattr(pd, "read_csv", no_read_csv)
+
+    with pytest.raises(KeyError, match="Couldn't detect the bank_fmt"):
+        BankInterface().read_export("auto", export_path)
+
+
+def test_quoted_export(tmp_path: Path) -> None:
+    """Tests if exports with quoted headers and a byte order mark are detected, and explicit formats are trusted."""
+    header, row = Path("tests/sp_sample.csv").read_text(encoding="latin1").splitlines()
+    quoted = ";".join(f'"{field}"' for field in header.split(";"))
+    export_path = tmp_path / "sp_quoted.csv"
+    export_path.write_bytes(codecs.BOM_UTF8 + f"{quoted}\n{row}\n".encode("latin1"))
+
+    assert detect_bank_fmt(export_path) == "sp"
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        tx = BankInterface().get_transactions("sp", export_path)
+    assert tx["amount"].tolist() == [1000.01]
+
+    # an explicit format is used even if the header doesn't match its signature
+    export_path.write_text(f"{header.replace('Auftragskonto', 'Konto')}\n{row}\n", encoding="latin1")
+    with pytest.warns(UserWarning, match="doesn't look like a sp export"):
+        tx = BankInterface().get_transactions("sp", export_path)
+    assert tx["recipient"].tolist() == ["Test"]
+
+
+def test_ledger_auto(tmp_path: Path) -> None:
+    """Tests if a Ledger imports exports with a detected bank format."""
+    ledger = Ledger(output_dir=tmp_path, bank_fmt="auto")
+    ledger.import_tx(export_path=Path("tests/sp_sample.csv"))
+    assert ledger.metadata["bank"].tolist() == ["sp"]
+    assert ledger.tx.shape[0] == 1
@@ -1,10 +1,14 @@
 """Tests for tmdbasyncmovies CLI."""
 
+import subprocess
+import sys
 from pathlib import Path
+from typing import Any
 
 import pytest
 from click.testing import CliRunner
 
+from ledgercli import daemon
 from ledgercli.cli import cli
 
 
@@ -14,14 +18,6 @@ def runner() -> CliRunner:
     return CliRunner()
 
 
-@pytest.fixture
-def output_dir(tmp_path: Path) -> Path:
-    """Create temporary directory."""
-    d = tmp_path / "output_dir"
-    d.mkdir()
-    return d
-
-
 def test_import(runner: CliRunner, output_dir: Path) -> None:
     """Test CLI import function."""
     result = runner.invoke(
@@ -43,6 +39,54 @@ def test_import(runner: CliRunner, output_dir: Path) -> None:
         assert (output_dir / f).exists()
 
 
+def test_import_cents(runner: CliRunner, output_dir: Path) -> None:
+    """Test CLI import function with integer cents."""
+    result = runner.invoke(
+        cli, ["import", "-b", "dkb", "--cents", "-o", str(output_dir), "-e", str(Path("tests/dkb_sample.csv"))]
+    )
+    assert result.exit_code == 0
+    assert (output_dir / "history.csv").read_text().splitlines()[1] == "2021-01-01,1000.01,1000.01"
+
+
+def test_import_many(runner: CliRunner, output_dir: Path, tmp_path: Path) -> None:
+    """Test CLI import of directories and glob patterns with an error report."""
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    for f in ["dkb_sample.csv", "dkb_empty.csv"]:
+        (exports / f).write_bytes((Path("tests") / f).read_bytes())
+    (exports / "2021-02.csv").write_bytes(
+        Path("tests/dkb_sample.csv").read_bytes().replace(b"01.01.2021", b"01.02.2021")
+    )
+
+    result = runner.invoke(
+        cli,
+        ["import", "-b", "auto", "-o", str(output_dir), "-e", str(exports), "-e", str(exports / "*sample.csv")],
+    )
+    assert result.exit_code == 1
+    assert f"Couldn't import {exports / 'dkb_empty.csv'}" in result.output
+    assert "Imported 2 of 3 exports." in result.output
+    assert len((output_dir / "transactions.csv").read_text().splitlines()) == 3
+
+    result = runner.invoke(cli, ["import", "-o", str(output_dir), "-e", str(exports / "*.txt")])
+    assert result.exit_code == 2
+    assert "matches no exports" in result.output
+
+
+def test_import_failed(runner: CliRunner, output_dir: Path, tmp_path: Path) -> None:
+    """Test CLI import into a new ledger where no export can be imported."""
+    broken = tmp_path / "broken.csv"
+    broken.write_text("not an export\n")
+    result = runner.invoke(
+        cli, ["import", "-b", "dkb", "-o", str(output_dir), "-e", "tests/dkb_empty.csv", "-e", str(broken)]
+    )
+    assert result.exit_code == 1
+    assert isinstance(result.exception, SystemExit)
+    assert "Couldn't import tests/dkb_empty.csv" in result.output
+    assert f"Couldn't import {broken}" in result.output
+    assert "Imported 0 of 2 exports." in result.output
+    assert (output_dir / "transactions.csv").exists() is False
+
+
 def test_update(runner: CliRunner, output_dir: Path) -> None:
     """Test CLI update function."""
     result = runner.invoke(
@@ -69,3 +113,92 @@ def test_update(runner: CliRunner, output_dir: Path) -> None:
     )
     assert result.exit_code == 0
     assert result.exception is None
+    assert "Ledger is up to date." in result.output
+
+
+def test_daemon_timeout(runner: CliRunner, output_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test if commands changing the ledger wait for the daemon as long as they run."""
+    requests: dict[str, Any] = {}
+
+    def recording_request(output_dir: Path, command: str, **args: Any) -> Any:
+        requests[command] = args.get("timeout", "default")
+        return {} if command == "import" else []
+
+    monkeypatch.setattr(daemon, "is_running", lambda _: True)
+    monkeypatch.setattr(daemon, "request", recording_request)
+    runner.invoke(cli, ["import", "-o", str(output_dir), "-e", str(Path("tests/dkb_sample.csv"))])
+    runner.invoke(cli, ["update", "-o", str(output_dir)])
+    runner.invoke(cli, ["freeze", "-o", str(output_dir), "--until", "2021"])
+    runner.invoke(cli, ["query", "-o", str(output_dir)])
+    assert requests == {"import": None, "update": None, "freeze": None, "query": "default"}
+
+
+def test_export(runner: CliRunner, output_dir: Path) -> None:
+    """Test CLI export function."""
+    pytest.importorskip("pyarrow")
+    result = runner.invoke(
+        cli,
+        ["import", "-b", "dkb", "-s", "parquet", "-o", str(output_dir), "-e", str(Path("tests/dkb_sample.csv"))],
+    )
+    assert result.exit_code == 0
+    assert (output_dir / "mapping.csv").exists() is False
+
+    result = runner.invoke(cli, ["export", "-o", str(output_dir)])
+    assert result.exit_code == 0
+    for f in ["transactions.csv", "mapping.csv"]:
+        assert (output_dir / f).exists()
+
+
+def test_query(runner: CliRunner, output_dir: Path) -> None:
+    """Test CLI query function."""
+    result = runner.invoke(cli, ["query", "-o", str(output_dir)])
+    assert result.exit_code == 1
+    assert "Please import an export first!" in result.output
+
+    runner.invoke(cli, ["import", "-b", "dkb", "-o", str(output_dir), "-e", str(Path("tests/dkb_sample.csv"))])
+    result = runner.invoke(cli, ["query", "-o", str(output_dir), "--from", "2021-01-01", "-r", "test"])
+    assert result.exit_code == 0
+    assert result.output.splitlines()[1].startswith("1000.01,2021-01-01,Test")
+
+    result = runner.invoke(cli, ["query", "-o", str(output_dir), "--to", "2020-12-31", "-f", "json"])
+    assert result.exit_code == 0
+    assert result.output == ""
+
+
+def test_freeze(runner: CliRunner, output_dir: Path) -> None:
+    """Test CLI partitioning and freeze function."""
+    result = runner.invoke(cli, ["freeze", "-o", str(output_dir), "-b", "dkb", "-u", "2021"])
+    assert result.exit_code == 1
+    assert "Please partition" in result.output
+
+    export = ["-b", "dkb", "-o", str(output_dir), "-e", str(Path("tests/dkb_sample.csv"))]
+    result = runner.invoke(cli, ["import", *export, "-p", "year"])
+    assert result.exit_code == 0
+    assert (output_dir / "transactions" / "2021.csv").exists()
+
+    result = runner.invoke(cli, ["freeze", "-o", str(output_dir), "-u", "2021"])
+    assert result.exit_code == 0
+    assert result.output == "Froze 2021.\n"
+    result = runner.invoke(cli, ["freeze", "-o", str(output_dir), "-u", "2021"])
+    assert result.output == "Nothing to freeze.\n"
+
+    result = runner.invoke(cli, ["update", "-o", str(output_dir), "-p", "month"])
+    assert result.exit_code == 1
+    assert "can't partition by month" in result.output
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["--help"], ["import", "--help"], ["import", "-b", "invalid"], ["import", "-e", "tests/missing-*.csv"]],
+)
+def test_startup_is_lazy(args: list[str]) -> None:
+    """Tests if help and argument errors don't import pandas or numpy."""
+    code = (
+        "import sys\n"
+        "from ledgercli.cli import cli\n"
+        f"try: cli({args!r})\n"
+        "except SystemExit: pass\n"
+        "assert 'pandas' not in sys.modules\n"
+        "assert 'numpy' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)  # noqa: S603
@@ -0,0 +1,134 @@
+"""Tests for the Ledger daemon."""
+import socket
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from ledgercli import daemon
+from ledgercli.cli import cli
+from ledgercli.daemon import DaemonError, LedgerServer
+from ledgercli.main import Ledger
+
+
+@pytest.fixture
+def server(output_dir: Path) -> Iterator[LedgerServer]:
+    """Serves output_dir from a background thread."""
+    server = LedgerServer(output_dir, "dkb", flush_interval=3600)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    yield server
+    if daemon.is_running(output_dir):
+        daemon.request(output_dir, "shutdown")
+    thread.join()
+
+
+def test_request(output_dir: Path, server: LedgerServer) -> None:
+    """Tests if commands run against the Ledger in memory and are flushed on demand."""
+    assert daemon.is_running(output_dir)
+    with pytest.raises(RuntimeError, match="already serving"):
+        LedgerServer(output_dir, "dkb")
+
+    errors = daemon.request(output_dir, "import", export_paths=[str(Path("tests/dkb_sample.csv").resolve())])
+    assert errors == {}
+    status = daemon.request(output_dir, "status")
+    assert status["rows"]["transactions"] == 1
+    assert "transactions" in status["unflushed"]
+    assert (output_dir / "transactions.csv").exists() is False
+    assert daemon.request(output_dir, "query", table="transactions").startswith("amount,date,recipient")
+
+    assert "transactions" in daemon.request(output_dir, "flush")
+    assert daemon.request(output_dir, "flush") == []
+    assert Ledger(output_dir=output_dir, bank_fmt="dkb").tx.shape == (1, 15)
+
+    with pytest.raises(DaemonError, match="Unknown command"):
+        daemon.request(output_dir, "invalid")
+    with pytest.raises(DaemonError, match="Unknown table"):
+        daemon.request(output_dir, "query", table="invalid")
+
+    daemon.request(output_dir, "shutdown")
+    with pytest.raises(ConnectionError):
+        daemon.request(output_dir, "status")
+
+
+def test_flush_every_request(output_dir: Path) -> None:
+    """Tests if a zero flush interval writes changes after every request without polling in a busy loop."""
+    server = LedgerServer(output_dir, "dkb", flush_interval=0)
+    assert server.timeout is not None and server.timeout > 0
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    try:
+        daemon.request(output_dir, "import", export_paths=[str(Path("tests/dkb_sample.csv").resolve())])
+        assert daemon.request(output_dir, "status")["unflushed"] == []
+        assert (output_dir / "transactions.csv").exists()
+    finally:
+        daemon.request(output_dir, "shutdown")
+        thread.join()
+
+
+def test_import_bank_fmt(output_dir: Path, server: LedgerServer) -> None:
+    """Tests if the bank format of an import request only applies to that request."""
+    export_paths = [str(Path("tests/dkb_sample.csv").resolve())]
+    with pytest.raises(DaemonError, match="valid BANK_FMT"):
+        daemon.request(output_dir, "import", export_paths=export_paths, bank_fmt="invalid")
+    daemon.request(output_dir, "import", export_paths=[str(Path("tests/sp_sample.csv").resolve())], bank_fmt="sp")
+    assert server.ledger.bank_fmt == "dkb"
+    assert daemon.request(output_dir, "import", export_paths=export_paths) == {}
+
+
+def test_timeout(output_dir: Path, server: LedgerServer, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if a client that never sends its request doesn't block the daemon."""
+    assert daemon._Handler.timeout == daemon.TIMEOUT
+    monkeypatch.setattr(daemon._Handler, "timeout", 0.5)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled:
+        stalled.connect(str(daemon.socket_path(output_dir)))
+        stalled.sendall(b'{"command": "status"')
+        with pytest.raises(DaemonError, match="in time"):
+            daemon.request(output_dir, "status", timeout=0.05)
+        assert daemon.request(output_dir, "status", timeout=5)["generation"] == 0
+
+
+def test_hand_edits(output_dir: Path, server: LedgerServer) -> None:
+    """Tests if tables edited on disk are read again."""
+    daemon.request(output_dir, "import", export_paths=[str(Path("tests/dkb_sample.csv").resolve())])
+    daemon.request(output_dir, "flush")
+
+    mapping = output_dir / "mapping.csv"
+    mapping.write_text(mapping.read_text().replace("Test,,", "Test,Clean,"))
+    daemon.request(output_dir, "update")
+    assert daemon.request(output_dir, "query", table="tx_distributed").splitlines()[1].split(",")[2] == "Clean"
+
+
+def test_freeze(output_dir: Path, server: LedgerServer) -> None:
+    """Tests if the Ledger in memory gets partitioned and frozen."""
+    export_paths = [str(Path("tests/dkb_sample.csv").resolve())]
+    daemon.request(output_dir, "import", export_paths=export_paths, partition="year")
+    assert daemon.request(output_dir, "freeze", until="2021") == ["2021"]
+    assert (output_dir / "transactions" / "2021.csv").exists()
+    assert daemon.request(output_dir, "status")["unflushed"] == []
+
+
+def test_cli(runner: CliRunner, output_dir: Path, server: LedgerServer) -> None:
+    """Tests if the CLI uses a running daemon and flushes on shutdown."""
+    result = runner.invoke(cli, ["import", "-o", str(output_dir), "-e", "tests/dkb_sample.csv"])
+    assert result.exit_code == 0
+    assert (output_dir / "transactions.csv").exists() is False
+
+    result = runner.invoke(cli, ["export", "-o", str(output_dir)])
+    assert result.exit_code == 0
+    assert (output_dir / "transactions.csv").exists()
+
+    result = runner.invoke(cli, ["flush", "-o", str(output_dir), "--stop"])
+    assert result.exit_code == 0
+    assert daemon.is_running(output_dir) is False
+
+    result = runner.invoke(cli, ["flush", "-o", str(output_dir)])
+    assert result.output == "No daemon is running.\n"
+
+
+@pytest.fixture
+def runner() -> CliRunner:
+    """Fixture for invoking command-line interfaces."""
+    return CliRunner()
@@ -0,0 +1,88 @@
+"""Tests for the dashboard."""
+import json
+import threading
+import urllib.request
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pytest
+
+from ledgercli.dashboard import Dashboard, DashboardServer
+from ledgercli.main import Ledger
+
+
+@pytest.fixture
+def ledger_dir(output_dir: Path) -> Path:
+    """Creates a ledger in the output dir."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path=Path("tests/dkb_sample.csv"))
+    ledger.update()
+    ledger.write()
+    return output_dir
+
+
+def test_respond(ledger_dir: Path) -> None:
+    """Tests if pages and aggregates are rendered."""
+    dashboard = Dashboard(ledger_dir)
+
+    status, content_type, body = dashboard.respond("/")
+    assert status == 200
+    assert content_type.startswith("text/html")
+    assert body.count(b"<svg") == 2
+
+    status, _, body = dashboard.respond("/history.json")
+    assert json.loads(body) == [{"date": "2021-01-01T00:00:00", "balance": 1000.01}]
+    status, _, body = dashboard.respond("/months.json?ignored=1")
+    assert json.loads(body) == [{"month": "2021-01-01T00:00:00", "income": 1000.01, "expense": 0}]
+
+    assert dashboard.respond("/missing")[0] == 404
+
+
+def test_cache(ledger_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if responses are cached until the ledger gets written again."""
+    dashboard = Dashboard(ledger_dir)
+    reads = []
+    read = dashboard.storage.read
+
+    def counting_read(*args: Any, **kwargs: Any) -> pd.DataFrame:
+        reads.append(args)
+        return read(*args, **kwargs)
+
+    monkeypatch.setattr(dashboard.storage, "read", counting_read)
+
+    dashboard.respond("/")
+    dashboard.respond("/")
+    dashboard.respond("/recipients.json")
+    assert len(reads) == 3
+
+    mapping = ledger_dir / "mapping.csv"
+    mapping.write_text(mapping.read_text().replace("Test,,", "Test,,Salary"))
+    ledger = Ledger(output_dir=ledger_dir, bank_fmt="dkb")
+    ledger.update()
+    ledger.write()
+
+    dashboard.respond("/")
+    assert len(reads) == 6
+
+
+def test_empty(tmp_path: Path) -> None:
+    """Tests if a missing ledger is reported."""
+    status, _, body = Dashboard(tmp_path).respond("/")
+    assert status == 200
+    assert b"No ledger found" in body
+
+
+def test_server(ledger_dir: Path) -> None:
+    """Tests if the dashboard is served over HTTP."""
+    server = DashboardServer(Dashboard(ledger_dir), port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with urllib.request.urlopen(f"{server.url}labels.json") as response:  # noqa: S310
+            assert response.status == 200
+            assert json.loads(response.read()) == []
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
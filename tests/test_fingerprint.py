@@ -0,0 +1,76 @@
+"""Tests for FingerprintIndex."""
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from ledgercli.fingerprint import FingerprintIndex
+
+
+def _tx(dates: list[str], amounts: list[float], recipients: list[str]) -> pd.DataFrame:
+    return pd.DataFrame({"date": pd.to_datetime(dates), "amount": amounts, "recipient": recipients})
+
+
+def test_fingerprint() -> None:
+    """Tests if fingerprints are stable across representations and keep same-day duplicates apart."""
+    tx = _tx(["2021-01-01", "2021-01-01", "2021-01-02"], [10.0, 10.0, 10.0], ["a", "a", "a"])
+    fp = FingerprintIndex.fingerprint(tx)
+    assert len(set(fp)) == 3
+
+    # dates as strings and float noise from csv round trips yield the same fingerprints
+    as_read = pd.DataFrame(
+        {"date": ["2021-01-01", "2021-01-01", "2021-01-02"], "amount": [10.000001] * 3, "recipient": ["a"] * 3}
+    )
+    assert (FingerprintIndex.fingerprint(as_read) == fp).all()
+
+
+def test_add() -> None:
+    """Tests if only unseen transactions are reported as new."""
+    index = FingerprintIndex()
+    first = _tx(["2021-01-01", "2021-01-01", "2021-01-02"], [10.0, 10.0, 5.0], ["a", "a", "b"])
+    assert index.add(first).tolist() == [True, True, True]
+    assert len(index) == 3
+
+    # overlapping export with a third same-day duplicate and a new transaction
+    second = _tx(
+        ["2021-01-01", "2021-01-01", "2021-01-01", "2021-01-02", "2021-01-03"],
+        [10.0, 10.0, 10.0, 5.0, 1.0],
+        ["a", "a", "a", "b", "c"],
+    )
+    assert index.add(second).tolist() == [False, False, True, False, True]
+    assert len(index) == 5
+    assert index.add(second.iloc[:0]).tolist() == []
+
+
+def test_read_write(tmp_path: Path) -> None:
+    """Tests if the index survives a round trip."""
+    path = tmp_path / "fingerprints.npy"
+    assert len(FingerprintIndex.read(path)) == 0
+
+    index = FingerprintIndex.from_transactions(_tx(["2021-01-01"], [1.0], ["a"]))
+    index.write(path)
+    assert (FingerprintIndex.read(path).fingerprints == index.fingerprints).all()
+
+
+def test_fingerprint_chunks() -> None:
+    """Tests if counting across chunks yields the same fingerprints as a single table."""
+    tx = _tx(["2021-01-01"] * 3 + ["2021-01-02"], [10.0, 10.0, 10.0, 5.0], ["a", "a", "a", "b"])
+    counts: dict[tuple[Any, ...], int] = {}
+    chunked = [FingerprintIndex.fingerprint(tx.iloc[i : i + 2], counts) for i in range(0, len(tx), 2)]
+    assert (pd.Series([*chunked[0], *chunked[1]]) == FingerprintIndex.fingerprint(tx)).all()
+
+
+def test_add_buffered(tmp_path: Path, monkeypatch: Any) -> None:
+    """Tests if buffered additions are found, counted and written before and after they are merged."""
+    monkeypatch.setattr(FingerprintIndex, "merge_min", 4)
+    tx = _tx([f"2021-01-{d:02}" for d in range(1, 29)], [1.0] * 28, ["a"] * 28)
+    index = FingerprintIndex.from_transactions(tx.iloc[:4])
+    for i in range(4, 28, 3):
+        # one known row, three new ones, merged into the sorted array every other add
+        assert index.add(tx.iloc[i - 1 : i + 3]).tolist() == [False, True, True, True]
+        assert len(index) == i + 3
+        assert index.contains(FingerprintIndex.fingerprint(tx.iloc[: i + 3])).all()
+
+    path = tmp_path / "fingerprints.npy"
+    index.write(path)
+    assert (FingerprintIndex.read(path).fingerprints == FingerprintIndex.from_transactions(tx).fingerprints).all()
@@ -1,19 +1,16 @@
 """Tests for using the Ledger without an already existing Ledger."""
 from datetime import datetime
 from pathlib import Path
+from typing import Any
 
+import numpy as np
 import pandas as pd
 import pytest
 
+from ledgercli.bankinterface import BankInterface, ParsedExport
 from ledgercli.main import Ledger
-
-
-@pytest.fixture
-def output_dir(tmp_path: Path) -> Path:
-    """Creates an output dir for storing output."""
-    o = tmp_path / "output_dir"
-    o.mkdir()
-    return o
+from ledgercli.schema import SchemaError
+from tests.helpers import synthetic_tx_d
 
 
 @pytest.fixture
@@ -68,6 +65,84 @@ def test_init_tx(output_dir: Path, export_path: Path) -> None:
     assert ledger.tx.empty is False
 
 
+def test_import_tx_single_read(output_dir: Path, export_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if an import reads the export once for transactions and metadata."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    reads: list[Path] = []
+    read_export = BankInterface.read_export
+
+    def counting_read_export(bank_fmt: str, export_path: Path) -> ParsedExport:
+        reads.append(export_path)
+        return read_export(bank_fmt, export_path)
+
+    monkeypatch.setattr(BankInterface, "read_export", staticmethod(counting_read_export))
+    ledger.import_tx(export_path=export_path)
+    assert reads == [export_path]
+    assert ledger.tx.empty is False
+    assert ledger.metadata["bank"].tolist() == ["dkb"]
+
+
+def test_init_tx_deduplication(output_dir: Path, export_path: Path) -> None:
+    """Tests if overlapping imports are deduplicated across sessions."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path=export_path)
+    ledger.import_tx(export_path=export_path)
+    assert ledger.tx.shape[0] == 1
+    ledger.update()
+    ledger.write()
+    assert (output_dir / "fingerprints.npy").exists()
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path=export_path)
+    assert ledger.tx.shape[0] == 1
+
+    # a missing index is rebuilt from transactions
+    (output_dir / "fingerprints.npy").unlink()
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path=export_path)
+    assert ledger.tx.shape[0] == 1
+
+
+def test_import_many(output_dir: Path, export_path: Path, tmp_path: Path) -> None:
+    """Tests if many exports are parsed in parallel, deduplicated and reported."""
+    later = tmp_path / "later.csv"
+    later.write_bytes(export_path.read_bytes().replace(b"01.01.2021", b"01.02.2021").replace(b"1.000,01 EUR", b"0 EUR"))
+    missing = tmp_path / "missing.csv"
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    done: list[Path] = []
+    errors = ledger.import_many([later, export_path, export_path, missing], max_workers=2, progress=done.append)
+
+    assert list(errors) == [missing]
+    assert len(done) == 4
+    assert ledger.tx["date"].tolist() == [datetime(2021, 1, 1), datetime(2021, 2, 1)]
+    # metadata comes from the earliest export
+    assert ledger.metadata["starting_balance"].tolist() == [0]
+
+
+def test_import_tx_chunked(output_dir: Path, export_path: Path, tmp_path: Path) -> None:
+    """Tests if streaming an export in chunks imports the same transactions and metadata."""
+    large = tmp_path / "large.csv"
+    row = export_path.read_bytes().splitlines(keepends=True)[-1]
+    large.write_bytes(export_path.read_bytes() + row * 2 + row.replace(b"1000,01", b"-0,01"))
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(large)
+    streamed = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    streamed.import_tx(large, chunksize=1)
+
+    pd.testing.assert_frame_equal(streamed.tx.reset_index(drop=True), ledger.tx.reset_index(drop=True))
+    pd.testing.assert_frame_equal(streamed.metadata, ledger.metadata)
+    assert (streamed.fingerprints.fingerprints == ledger.fingerprints.fingerprints).all()
+
+    # same-day duplicates are counted across chunks, so reimports are skipped
+    streamed.import_tx(large, chunksize=2)
+    assert len(streamed.tx) == 4
+
+    with pytest.raises(Exception, match="no transactions"):
+        streamed.import_tx(Path("tests/dkb_empty.csv"), chunksize=2)
+
+
 def test_init_metadata(output_dir: Path, export_path: Path) -> None:
     """Tests for metadata generation."""
     ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
@@ -132,6 +207,64 @@ def test_init_history(output_dir: Path, export_path: Path) -> None:
     assert set(ledger.history["balance"]) == {1000.01}
 
 
+def test_init_history_incremental(output_dir: Path, export_path: Path, tmp_path: Path) -> None:
+    """Tests if history is only computed again from the earliest added transaction on."""
+    row = export_path.read_bytes().splitlines(keepends=True)[-1]
+    days = [b"04.01.2021", b"02.01.2021", b"06.01.2021", b"03.01.2021"]
+    rows = [row.replace(b"01.01.2021", day, 1).replace(b"1000,01", b"-1,50") for day in days]
+    exports = []
+    for i, added in enumerate([rows[:2], rows[2:3], rows[3:]]):
+        exports.append(tmp_path / f"export{i}.csv")
+        exports[-1].write_bytes(export_path.read_bytes() + b"".join(added))
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(exports[0])
+    ledger.update()
+    ledger.write()
+    # marks the stored rows, which are kept as they are
+    history = pd.read_csv(output_dir / "history.csv")
+    history.loc[0, "amount"] = 0
+    ledger.history = history.astype({"date": "datetime64[ns]"})
+
+    ledger.import_tx(exports[1])
+    ledger.update()
+    assert ledger.history["amount"].tolist() == [0, -1.5, -1.5, -1.5]
+    # added before the latest day, so later days are computed again
+    ledger.import_tx(exports[2])
+    ledger.update()
+    assert ledger.history["amount"].tolist() == [0, -1.5, -1.5, -1.5, -1.5]
+    balances = ledger.history["balance"].tolist()
+
+    ledger.write()
+    ledger = Ledger(output_dir=output_dir, bank_fmt=None)
+    ledger._history_from = None
+    ledger._init_history()
+    assert ledger.history["amount"].tolist() == [1000.01, -1.5, -1.5, -1.5, -1.5]
+    assert ledger.history["balance"].tolist() == pytest.approx(balances)
+
+
+def test_encode(output_dir: Path, export_path: Path) -> None:
+    """Tests if text columns share a single dictionary that grows without recoding encoded columns."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path)
+    ledger.update()
+
+    dtype = ledger.tx["recipient"].dtype
+    assert isinstance(dtype, pd.CategoricalDtype)
+    for frame in [ledger.tx, ledger.tx_c, ledger.tx_d, ledger.mapping, ledger.rollup_month]:
+        assert frame["label1"].dtype == dtype
+    assert set(ledger.tx["label1"]) == {""}
+
+    codes = ledger.tx["recipient"].cat.codes.copy()
+    added = pd.DataFrame({"recipient": ["Test", "New", None], "label1": [np.nan, "food", "New"]})
+    ledger._encode(added, ledger.tx)
+    assert ledger.tx["recipient"].dtype == added["recipient"].dtype
+    assert ledger.tx["recipient"].cat.codes.equals(codes)
+    assert added["recipient"].tolist() == ["Test", "New", ""]
+    assert added["label1"].tolist() == ["", "food", "New"]
+    assert added["recipient"].cat.codes[1] == added["label1"].cat.codes[2]
+
+
 def test_init_c(output_dir: Path, export_path: Path) -> None:
     """Tests if coalesced transactions are generated correctly."""
     ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
@@ -167,6 +300,26 @@ def test_init_c(output_dir: Path, export_path: Path) -> None:
     assert set(ledger.tx_c["amount"]) == {9999}
 
 
+def test_init_c_dtypes(output_dir: Path, export_path: Path) -> None:
+    """Tests if coalescing keeps native dtypes and ignores empty overrides."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger._init_tx(export_path)
+    ledger._init_metadata(export_path)
+    ledger._update_mapping()
+    ledger._update_tx_mapping()
+    ledger.tx["recipient_clean_custom"] = ""
+    ledger.tx["label1"] = "mapped"
+
+    ledger._init_tx_c()
+
+    assert ledger.tx_c["date"].dtype == "datetime64[ns]"
+    assert ledger.tx_c["amount"].dtype == "float64"
+    assert set(ledger.tx_c["recipient"]) == {"Test"}
+    assert set(ledger.tx_c["label1"]) == {"mapped"}
+    assert not {c for c in ledger.tx_c.columns if c.endswith("_custom")}
+    assert "recipient_clean" not in ledger.tx_c.columns
+
+
 def test_init_tx_d(output_dir: Path, export_path: Path) -> None:
     """Tests if distributed transactions are generated correctly."""
     ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
@@ -198,6 +351,132 @@ def test_init_tx_d(output_dir: Path, export_path: Path) -> None:
     assert set(ledger.tx_d["amount"]) == {30, -30, 60}
 
 
+def _reference_tx_d(tx_c: pd.DataFrame) -> pd.DataFrame:
+    """Row-wise distribution as originally implemented, used as parity reference."""
+    mask = pd.notna(tx_c["occurence"]) & ~tx_c["occurence"].between(-1, 1, inclusive="both")
+    distribute = tx_c.loc[mask].copy()
+    keep = tx_c.loc[~mask].copy()
+
+    if distribute.empty is False:
+        months = [
+            (
+                pd.date_range(start=date, periods=int(occurence), freq="MS")
+                if occurence > 0
+                else pd.date_range(end=date, periods=-int(occurence), freq="MS")
+            )
+            for date, occurence in zip(distribute["date"], distribute["occurence"], strict=True)
+        ]
+        distribute["date"] = pd.Series(months, index=distribute.index, dtype=object)
+        distribute = distribute.explode("date")
+        distribute["amount"] = distribute["amount"] / abs(distribute["occurence"])
+        distribute["occurence"] = np.where(distribute["occurence"] > 0, 1, -1)
+
+    return pd.concat([keep, distribute], axis=0, ignore_index=True)
+
+
+def test_init_tx_d_parity(output_dir: Path) -> None:
+    """Tests if the vectorized distribution matches the row-wise reference."""
+    rng = np.random.default_rng(42)
+    n = 500
+    occurence = rng.choice([-13, -3, -2, -1, 0, 1, 2, 5, 24, np.nan], size=n)
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.tx_c = pd.DataFrame(
+        {
+            "amount": rng.normal(0, 500, size=n).round(2),
+            "date": pd.to_datetime("2015-01-01") + pd.to_timedelta(rng.integers(0, 3000, size=n), unit="D"),
+            "recipient": [f"r{i}" for i in rng.integers(0, 20, size=n)],
+            "occurence": occurence,
+        }
+    )
+
+    expected = _reference_tx_d(ledger.tx_c)
+    expected["date"] = pd.to_datetime(expected["date"])
+    expected = expected.sort_values("date", kind="stable", ignore_index=True)
+    ledger._init_tx_d()
+    expected["recipient"] = expected["recipient"].astype(ledger.tx_d["recipient"].dtype)
+
+    pd.testing.assert_frame_equal(ledger.tx_d, expected, check_dtype=False)
+
+
+def test_init_rollups(output_dir: Path) -> None:
+    """Tests if rollups sum up transactions per period, type and labels."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.tx_d = synthetic_tx_d(1000).assign(recipient=np.tile(["a", "b", "c", "d", "e"], 200))
+    ledger._init_rollups()
+
+    tx_d = ledger.tx_d
+    expected = tx_d.groupby([tx_d["date"].dt.to_period("M").dt.start_time, tx_d["amount"] > 0, "label1"])["amount"]
+    rollup = ledger.rollup_month
+    month = rollup.groupby(["month", rollup["type"] == "income", rollup["label1"].astype(str)])["amount"]
+    pd.testing.assert_series_equal(month.sum(), expected.sum(), check_names=False)
+
+    assert ledger.rollup_week["week"].dt.dayofweek.eq(0).all()
+    assert ledger.rollup_quarter["quarter"].dt.month.isin([1, 4, 7, 10]).all()
+    assert ledger.rollup_year["year"].dt.dayofyear.eq(1).all()
+    for rollup in [
+        ledger.rollup_week,
+        ledger.rollup_month,
+        ledger.rollup_quarter,
+        ledger.rollup_year,
+        ledger.rollup_recipient,
+    ]:
+        assert rollup["transactions"].sum() == len(tx_d)
+        assert rollup["amount"].sum() == pytest.approx(tx_d["amount"].sum())
+
+    expenses = ledger.rollup_recipient[ledger.rollup_recipient["type"] == "expense"]
+    spend = tx_d[tx_d["amount"] < 0].groupby(tx_d["recipient"].astype(str))["amount"].sum()
+    assert expenses.set_index(expenses["recipient"].astype(str))["amount"].to_dict() == pytest.approx(spend.to_dict())
+
+
+def test_init_rollups_zero(output_dir: Path) -> None:
+    """Tests if transactions with a zero amount are neither income nor expense."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    tx_d = synthetic_tx_d(10)
+    tx_d["amount"] = [0.0, -1.0, 2.0, 0.0, -3.0, 4.0, -5.0, 0.0, 6.0, -7.0]
+    tx_d["date"] = pd.Timestamp(2021, 1, 4)
+    tx_d["label1"] = "x"
+    ledger.tx_d = tx_d
+    ledger._init_rollups()
+
+    rollup = ledger.rollup_month.set_index(ledger.rollup_month["type"].astype(object).fillna("none"))
+    assert rollup["transactions"].to_dict() == {"expense": 4, "income": 3, "none": 3}
+    assert rollup["amount"].to_dict() == {"expense": -16.0, "income": 12.0, "none": 0.0}
+    assert ledger.rollup_year["transactions"].sum() == 10
+
+
+def test_init_rollups_incremental(output_dir: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if only periods with changed transactions are aggregated again."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.tx_d = synthetic_tx_d(1000)
+    ledger._init_rollups()
+    ledger._unwritten = {"rollup_week", "rollup_month", "rollup_quarter", "rollup_year"}
+    ledger.write()
+
+    tx_d = ledger.tx_d.copy()
+    recent = tx_d["date"] >= "2021-11-01"
+    tx_d.loc[recent, "amount"] += 1
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.tx_d = tx_d
+    aggregated: list[int] = []
+    rollup = ledger._rollup
+
+    def counting_rollup(tx: pd.DataFrame, *args: Any) -> pd.DataFrame:
+        aggregated.append(len(tx))
+        return rollup(tx, *args)
+
+    monkeypatch.setattr(ledger, "_rollup", counting_rollup)
+    ledger._init_rollups()
+    assert aggregated[0] == recent.sum()
+    assert aggregated[1] < len(tx_d)
+
+    full = Ledger(output_dir=tmp_path, bank_fmt="dkb")
+    full.tx_d = tx_d
+    full._init_rollups()
+    for period in ["week", "month", "quarter", "year"]:
+        pd.testing.assert_frame_equal(getattr(ledger, f"rollup_{period}"), getattr(full, f"rollup_{period}"))
+
+
 def test_write(output_dir: Path, export_path: Path) -> None:
     """Tests if all tables are written."""
     ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
@@ -211,11 +490,50 @@ def test_write(output_dir: Path, export_path: Path) -> None:
         "mapping.csv",
         "tx_coalesced.csv",
         "tx_distributed.csv",
+        "rollup_week.csv",
+        "rollup_month.csv",
+        "rollup_quarter.csv",
+        "rollup_year.csv",
+        "rollup_recipient.csv",
     ]:
         tmp = output_dir / item
         assert tmp.exists()
 
 
+def test_write_interrupted(output_dir: Path, export_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if tables replaced by an interrupted write count as changed, since the state wasn't replaced."""
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path=export_path)
+    ledger.update()
+    ledger.write()
+
+    mapping = pd.read_csv(output_dir / "mapping.csv")
+    mapping["label1"] = "edited"
+    mapping.to_csv(output_dir / "mapping.csv", index=False)
+    ledger = Ledger(output_dir, bank_fmt="dkb", fsync=True)
+    ledger.update()
+    write = ledger.storage.write
+
+    def fail(name: str, df: pd.DataFrame, data: bytes | None = None, fsync: bool = False) -> None:
+        if name == "rollup_year":
+            raise OSError("disk full")
+        write(name, df, data, fsync)
+
+    monkeypatch.setattr(ledger.storage, "write", fail)
+    with pytest.raises(OSError, match="disk full"):
+        ledger.write()
+    assert not list(output_dir.glob(".*.tmp"))
+    assert pd.read_csv(output_dir / "tx_distributed.csv")["label1"].tolist() == ["edited"]
+
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    assert ledger.state.generation == 1
+    assert "mapping" in ledger._changed
+    ledger.update()
+    ledger.write()
+    assert pd.read_csv(output_dir / "rollup_year.csv")["label1"].tolist() == ["edited"]
+    assert ledger.state.generation == 2
+
+
 def test_update(output_dir: Path, export_path: Path) -> None:
     """Tests for updating existing files."""
     # setup existing files
@@ -230,13 +548,125 @@ def test_update(output_dir: Path, export_path: Path) -> None:
     assert ledger.mapping.empty is False
     assert ledger.metadata.empty is False
 
-    # adding more transactions
+    # reimporting the same export doesn't duplicate transactions
     ledger.import_tx(export_path=export_path)
     ledger.update()
     ledger.import_tx(export_path=export_path)
     ledger.update()
-    assert ledger.tx.shape == (3, 15)
+    assert ledger.tx.shape == (1, 15)
 
     # update without new export
     ledger.update()
-    assert ledger.tx.shape == (3, 15)
+    assert ledger.tx.shape == (1, 15)
+
+
+def test_read_existing(output_dir: Path, export_path: Path) -> None:
+    """Tests if existing tables are read independently of each other and validated against their schema."""
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path=export_path)
+    ledger.update()
+    ledger.write()
+
+    (output_dir / "mapping.csv").unlink()
+    ledger = Ledger(output_dir, bank_fmt=None)
+    assert len(ledger.tx) == 1
+    assert ledger.tx["date"].dtype == "datetime64[ns]"
+    assert ledger._changed == {"mapping"}
+    ledger.update()
+    assert ledger.mapping["recipient"].tolist() == ledger.tx["recipient"].unique().tolist()
+
+    (output_dir / "metadata.csv").unlink()
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    assert ledger.metadata["starting_balance"].tolist() == [0.0]
+    ledger.update()
+
+    tx = pd.read_csv(output_dir / "transactions.csv").drop(columns="amount_custom")
+    tx.to_csv(output_dir / "transactions.csv", index=False)
+    with pytest.raises(SchemaError, match="transactions is missing the columns amount_custom"):
+        Ledger(output_dir, bank_fmt="dkb")
+
+
+def test_update_missing_derived(output_dir: Path, export_path: Path) -> None:
+    """Tests if derived tables missing from storage, like ones added by a newer version, are created on update."""
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path=export_path)
+    ledger.update()
+    ledger.write()
+
+    (output_dir / "rollup_recipient.csv").unlink()
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    ledger.update()
+    ledger.write()
+    assert pd.read_csv(output_dir / "rollup_recipient.csv")["transactions"].sum() == len(ledger.tx_d)
+
+
+def test_update_skips_unchanged(output_dir: Path, export_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if update only runs stages downstream of changed tables and write skips unchanged tables."""
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    ledger.import_tx(export_path=export_path)
+    ledger.update()
+    ledger.write()
+    generation = ledger.state.generation
+    assert generation == 1
+
+    def fail() -> None:
+        raise AssertionError("stage should have been skipped")
+
+    # nothing changed
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    for stage in ["_update_mapping", "_init_tx_c", "_init_tx_d", "_init_rollups", "_init_history"]:
+        monkeypatch.setattr(ledger, stage, fail)
+    ledger.update()
+    assert ledger.tx_d.shape[0] == 1
+    ledger.write()
+    assert ledger.state.generation == generation
+
+    # touched but unchanged files don't count as changed
+    (output_dir / "mapping.csv").touch()
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    assert ledger._changed == set()
+
+    # edited mapping reruns the mapping stages, but not history
+    mapping = pd.read_csv(output_dir / "mapping.csv")
+    mapping["label1"] = "edited"
+    mapping.to_csv(output_dir / "mapping.csv", index=False)
+    history_mtime = (output_dir / "history.csv").stat().st_mtime_ns
+
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    monkeypatch.setattr(ledger, "_init_history", fail)
+    ledger.update()
+    ledger.write()
+    assert ledger.state.generation == generation + 1
+    assert set(pd.read_csv(output_dir / "tx_distributed.csv")["label1"]) == {"edited"}
+    assert (output_dir / "history.csv").stat().st_mtime_ns == history_mtime
+
+
+def test_cents(output_dir: Path, export_path: Path) -> None:
+    """Tests if amounts are handled as exact int64 cents."""
+    ledger = Ledger(output_dir, bank_fmt="dkb", cents=True)
+    ledger.import_tx(export_path=export_path)
+    assert ledger.tx["amount"].tolist() == [100001]
+    assert ledger.metadata["starting_balance"].tolist() == [0]
+
+    ledger.update()
+    assert ledger.history["balance"].dtype == "int64"
+    ledger.write()
+    assert pd.read_csv(output_dir / "transactions.csv")["amount"].tolist() == [1000.01]
+    assert pd.read_csv(output_dir / "history.csv")["balance"].tolist() == [1000.01]
+
+    # distributed parts add up exactly
+    ledger.tx_c = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2021-06-01", "2021-06-15"]),
+            "amount": [10000, -10001],
+            "occurence": [3, -7],
+        }
+    )
+    ledger._init_tx_d()
+    assert sorted(ledger.tx_d["amount"]) == sorted([3334, 3333, 3333, -1429, -1429, -1429, -1429, -1429, -1428, -1428])
+
+    # tables written with cents read back the same in float mode and vice versa
+    ledger = Ledger(output_dir, bank_fmt="dkb")
+    assert ledger.tx["amount"].tolist() == [1000.01]
+    ledger = Ledger(output_dir, bank_fmt="dkb", cents=True)
+    assert ledger.tx["amount"].tolist() == [100001]
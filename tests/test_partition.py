@@ -0,0 +1,187 @@
+"""Tests for partitioned and frozen tables."""
+import os
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledgercli.main import Ledger
+from ledgercli.partition import FrozenPartitionError, Partitions
+from ledgercli.query import Query
+from ledgercli.storage import CsvStorage
+from tests.helpers import dkb_export
+
+ROWS = [
+    ("15.11.2021", "Grocery", "-10,00"),
+    ("20.12.2021", "Insurance", "-120,00"),
+    ("05.01.2022", "Grocery", "-20,00"),
+    ("01.02.2022", "Employer", "500,00"),
+]
+
+
+def test_keys() -> None:
+    """Tests partition keys, open dates and the manifest."""
+    dates = pd.Series(pd.to_datetime(["2021-12-31", "2022-01-01"]))
+    assert Partitions("year").keys(dates).tolist() == ["2021", "2022"]
+    assert Partitions("month").keys(dates).tolist() == ["2021-12", "2022-01"]
+    assert Partitions("month").is_open(dates).all()
+    assert Partitions("year", {"2021": {}}).is_open(dates).tolist() == [False, True]
+
+    with pytest.raises(KeyError, match="not supported"):
+        Partitions("week")
+
+
+def test_write(output_dir: Path, tmp_path: Path) -> None:
+    """Tests if partitioned tables are written per period and read back in full."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(dkb_export(tmp_path, ROWS))
+    ledger.update()
+    ledger.write()
+    assert (output_dir / "transactions.csv").exists()
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb", partition="year")
+    ledger.update()
+    ledger.write()
+    for table in ["transactions", "tx_coalesced", "tx_distributed", "history"]:
+        assert (output_dir / f"{table}.csv").exists() is False
+        assert CsvStorage(output_dir).partitions(table) == ["2021", "2022"]
+    assert Partitions.read(output_dir).period == "year"
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt=None)
+    assert ledger.partitions.period == "year"
+    assert ledger._changed == set()
+    assert len(ledger.tx) == 4
+
+
+def test_distributed_partitions(output_dir: Path, tmp_path: Path) -> None:
+    """Tests if distributed rows belong to the partition of their transaction."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb", partition="year")
+    ledger.import_tx(dkb_export(tmp_path, ROWS))
+    ledger.update()
+    ledger.mapping.loc[ledger.mapping["recipient"] == "Insurance", "occurence"] = 3
+    ledger._changed.add("mapping")
+    ledger.update()
+    ledger.write()
+
+    distributed = pd.read_csv(output_dir / "tx_distributed" / "2021.csv")
+    assert distributed["date"].tolist() == ["2021-11-15", "2022-01-01", "2022-02-01", "2022-03-01"]
+    assert ledger.tx_d["date"].is_monotonic_increasing
+
+
+def test_pruning(output_dir: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if scans skip partitions outside the date range, counting distributed rows spread into later periods."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb", partition="year")
+    ledger.import_tx(dkb_export(tmp_path, ROWS))
+    ledger.update()
+    ledger.mapping.loc[ledger.mapping["recipient"] == "Insurance", "occurence"] = 3
+    ledger._changed.add("mapping")
+    ledger.update()
+    ledger.write()
+
+    dates = Partitions.read(output_dir).dates
+    assert dates["tx_distributed"] == {"2021": ["2021-11-15", "2022-03-01"], "2022": ["2022-01-05", "2022-02-01"]}
+    assert "transactions" not in dates
+
+    scanned: list[str] = []
+    scan = CsvStorage._scan
+
+    def counting_scan(storage: CsvStorage, path: Path, *args: Any) -> Iterator[pd.DataFrame]:
+        scanned.append(path.stem)
+        return scan(storage, path, *args)
+
+    monkeypatch.setattr(CsvStorage, "_scan", counting_scan)
+    ledger = Ledger(output_dir=output_dir, bank_fmt=None)
+    late = pd.concat(ledger.query(Query(start=pd.Timestamp("2022-02-15"))))
+    assert late["date"].tolist() == [pd.Timestamp("2022-03-01")]
+    assert scanned == ["2021"]
+
+    scanned.clear()
+    early = pd.concat(ledger.query(Query(end=pd.Timestamp("2021-12-31"))))
+    assert early["date"].tolist() == [pd.Timestamp("2021-11-15")]
+    assert scanned == ["2021"]
+
+
+def test_freeze(output_dir: Path, tmp_path: Path) -> None:
+    """Tests if frozen partitions are kept as stored and history continues from their closing balance."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb", partition="year")
+    ledger.import_tx(dkb_export(tmp_path, ROWS))
+    ledger.update()
+    ledger.write()
+
+    assert ledger.freeze("2021") == ["2021"]
+    assert ledger.freeze("2021") == []
+    manifest = Partitions.read(output_dir)
+    assert manifest.frozen_until == "2021"
+    assert manifest.closing_balance() == pytest.approx(-380)
+
+    frozen = output_dir / "tx_coalesced" / "2021.csv"
+    os.utime(frozen, ns=(0, 0))
+    mapping = output_dir / "mapping.csv"
+    mapping.write_text(mapping.read_text().replace("Grocery,,", "Grocery,,Food"))
+    ledger = Ledger(output_dir=output_dir, bank_fmt=None)
+    ledger.update()
+    ledger.write()
+
+    assert frozen.stat().st_mtime_ns == 0
+    labels = ledger.tx_c.set_index("date")["label1"]
+    assert labels[pd.Timestamp("2021-11-15")] == ""
+    assert labels[pd.Timestamp("2022-01-05")] == "Food"
+    assert ledger.history["balance"].tolist() == pytest.approx([-260, -380, -400, 100])
+    assert len(ledger.rollup_month) == 4
+
+    # starting balance doesn't apply to frozen periods anymore
+    ledger.metadata["starting_balance"] = 0
+    ledger._changed.add("metadata")
+    ledger.update()
+    assert ledger.history["balance"].tolist() == pytest.approx([-260, -380, -400, 100])
+
+    with pytest.raises(FrozenPartitionError, match="frozen until 2021"):
+        ledger.import_tx(dkb_export(tmp_path, [("24.12.2021", "Gift", "-5,00")], "late.csv"))
+    assert len(ledger.tx) == 4
+    assert len(ledger.fingerprints) == 4
+    # reimports of frozen transactions are skipped
+    ledger.import_tx(dkb_export(tmp_path, ROWS))
+
+    with pytest.raises(FrozenPartitionError, match="can't partition by month"):
+        ledger.partition_by("month")
+
+
+def test_freeze_invalid(output_dir: Path, tmp_path: Path) -> None:
+    """Tests if only closed periods of partitioned ledgers can be frozen."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(dkb_export(tmp_path, ROWS))
+    with pytest.raises(ValueError, match="Please partition"):
+        ledger.freeze("2021")
+
+    ledger.partition_by("month")
+    with pytest.raises(ValueError, match="like 2023-12"):
+        ledger.freeze("2021")
+    with pytest.raises(ValueError, match="like 2023-12"):
+        ledger.freeze("invalid")
+    with pytest.raises(ValueError, match="isn't closed yet"):
+        ledger.freeze(str(np.datetime64("today", "M")))
+
+    assert ledger.freeze("2021-11") == ["2021-11"]
+
+
+def test_modified(output_dir: Path, tmp_path: Path) -> None:
+    """Tests if modified frozen partitions are refused."""
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb", partition="month")
+    ledger.import_tx(dkb_export(tmp_path, ROWS))
+    ledger.freeze("2021-12")
+
+    # touched, but not edited
+    frozen = output_dir / "transactions" / "2021-11.csv"
+    frozen.touch()
+    Ledger(output_dir=output_dir, bank_fmt=None)
+
+    frozen.write_text(frozen.read_text().replace("-10.00", "-11.00"))
+    with pytest.raises(FrozenPartitionError, match="transactions/2021-11 was modified"):
+        Ledger(output_dir=output_dir, bank_fmt=None)
+
+    frozen.unlink()
+    with pytest.raises(FrozenPartitionError, match="transactions/2021-11 is missing"):
+        Ledger(output_dir=output_dir, bank_fmt=None)
@@ -0,0 +1,89 @@
+"""Tests for profiling the Ledger."""
+import json
+import pstats
+import threading
+from pathlib import Path
+from typing import Any
+
+from click.testing import CliRunner
+
+from ledgercli.cli import cli
+from ledgercli.main import Ledger
+from ledgercli.profiling import Profiler
+
+
+class _Recorder:
+    """Records the spans the Ledger reports."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, str, int]] = []
+
+    def start(self, name: str, category: str) -> None:
+        self.calls.append(("start", name, threading.get_ident()))
+
+    def end(self, name: str, category: str, args: dict[str, Any]) -> None:
+        self.calls.append(("end", name, threading.get_ident()))
+
+
+def test_hooks(tmp_path: Path) -> None:
+    """Tests if hooks get notified of nested spans."""
+    recorder = _Recorder()
+    ledger = Ledger(output_dir=tmp_path, bank_fmt="dkb", hooks=[recorder])
+    ledger.import_tx(Path("tests/dkb_sample.csv"))
+    ledger.update()
+    ledger.write()
+
+    names = [name for call, name, _ in recorder.calls if call == "start"]
+    assert names[:2] == ["read_existing", "import dkb_sample.csv"]
+    assert names.index("update") < names.index("update_mapping") < names.index("init_history")
+    assert "write transactions" in names
+    # spans end in reverse order of their start within a thread
+    stacks: dict[int, list[str]] = {}
+    for call, name, thread in recorder.calls:
+        if call == "start":
+            stacks.setdefault(thread, []).append(name)
+        else:
+            assert stacks[thread].pop() == name
+    assert all(stack == [] for stack in stacks.values())
+
+
+def test_profiler(tmp_path: Path) -> None:
+    """Tests if the profiler records timings and rows of every span and dumps profiles per stage."""
+    profiler = Profiler(cprofile_dir=tmp_path / "cprofile")
+    output_dir = tmp_path / "output_dir"
+    output_dir.mkdir()
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb", hooks=[profiler])
+    ledger.import_tx(Path("tests/dkb_sample.csv"))
+    ledger.update()
+    ledger.write()
+
+    events = {event["name"]: event for event in profiler.events}
+    assert events["import dkb_sample.csv"]["args"]["rows"] == len(ledger.tx)
+    assert events["init_tx_d"]["args"]["outputs"] == {"tx_distributed": len(ledger.tx_d)}
+    assert events["write tx_distributed"]["args"]["written"] is True
+    update = events["update"]
+    for name in ["update_mapping", "init_tx_c", "assign_types"]:
+        event = events[name]
+        assert update["ts"] <= event["ts"] and event["ts"] + event["dur"] <= update["ts"] + update["dur"]
+        assert event["args"]["peak_rss_mb"] > 0
+        stats = pstats.Stats(event["args"]["cprofile"])
+        assert stats.total_calls > 0  # type: ignore[attr-defined]
+    assert "cprofile" not in events["write transactions"]["args"]
+
+    profiler.write(tmp_path / "trace.json")
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    assert len(trace["traceEvents"]) == len(profiler.events)
+    assert len(profiler.summary()) == len(profiler.events) + 1
+
+
+def test_cli_profile(tmp_path: Path) -> None:
+    """Tests if commands write a Chrome trace."""
+    trace = tmp_path / "trace.json"
+    result = CliRunner().invoke(
+        cli,
+        ["import", "-o", str(tmp_path), "-b", "dkb", "-e", "tests/dkb_sample.csv", "--profile", str(trace)],
+    )
+    assert result.exit_code == 0
+    assert "init_tx_c" in result.output
+    events = json.loads(trace.read_text())["traceEvents"]
+    assert {"ledger", "stage", "io", "import"} == {event["cat"] for event in events}
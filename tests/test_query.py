@@ -0,0 +1,115 @@
+"""Tests for querying stored tables."""
+import io
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import pytest
+
+from ledgercli.main import Ledger
+from ledgercli.query import Query, dump, scan
+from ledgercli.storage import get_storage
+from tests.helpers import synthetic_tx_d
+
+QUERIES = [
+    Query(),
+    Query(start=pd.Timestamp("2020-04-01"), end=pd.Timestamp("2020-06-30"), label1="groceries"),
+    Query(end=pd.Timestamp("2020-01-31")),
+    Query(label1=""),
+    Query(recipient="grocery", min_amount=-50, max_amount=50),
+    Query(start=pd.Timestamp("2030-01-01")),
+]
+
+
+@pytest.mark.parametrize("storage_fmt", ["csv", "parquet", "arrow"])
+@pytest.mark.parametrize("query", QUERIES)
+def test_scan(tmp_path: Path, storage_fmt: str, query: Query) -> None:
+    """Tests if pushed down filters match filtering the full table."""
+    if storage_fmt != "csv":
+        pytest.importorskip("pyarrow")
+    tx_d = synthetic_tx_d()
+    storage = get_storage(storage_fmt, tmp_path)
+    storage.write("tx_distributed", tx_d)
+
+    expected = tx_d[query.mask(tx_d)].reset_index(drop=True)
+    result = pd.concat(scan(storage, "tx_distributed", query, chunksize=100), ignore_index=True)
+    result["label1"] = result["label1"].fillna("")
+    pd.testing.assert_frame_equal(result[["amount", "date", "label1"]], expected[["amount", "date", "label1"]])
+
+
+def test_scan_stops_early(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if tables sorted by date stop being read after the end of the date range."""
+    storage = get_storage("csv", tmp_path)
+    storage.write("tx_distributed", synthetic_tx_d())
+    storage.write("transactions", synthetic_tx_d())
+
+    chunks: list[int] = []
+    mask = Query.mask
+
+    def counting_mask(self: Query, frame: pd.DataFrame) -> npt.NDArray[np.bool_]:
+        chunks.append(len(frame))
+        return mask(self, frame)
+
+    monkeypatch.setattr(Query, "mask", counting_mask)
+
+    query = Query(end=pd.Timestamp("2020-01-31"))
+    list(scan(storage, "tx_distributed", query, chunksize=100))
+    assert len(chunks) == 1
+    chunks.clear()
+    list(scan(storage, "transactions", query, chunksize=100))
+    assert len(chunks) == 10
+
+
+def test_parquet_row_groups(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if Parquet tables are written in row groups with statistics."""
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    monkeypatch.setattr("ledgercli.storage.ROW_GROUP_SIZE", 100)
+    storage = get_storage("parquet", tmp_path)
+    storage.write("tx_distributed", synthetic_tx_d())
+
+    metadata = pq.ParquetFile(storage.path("tx_distributed")).metadata
+    assert metadata.num_row_groups == 10
+    assert metadata.row_group(0).column(1).statistics.has_min_max
+
+
+def test_dump() -> None:
+    """Tests if chunks are formatted as CSV with a single header or as JSON lines."""
+    chunks = [synthetic_tx_d(2), synthetic_tx_d(1)]
+    csv = "".join(dump(chunks, "csv"))
+    assert csv.count("amount,date") == 1
+    assert len(csv.splitlines()) == 4
+    assert len("".join(dump(chunks, "json")).splitlines()) == 3
+
+    with pytest.raises(KeyError):
+        list(dump(chunks, "xml"))
+
+
+def test_dump_formats_agree() -> None:
+    """Tests if CSV and JSON write the same values, with empty labels as "" whether they are missing or empty."""
+    tx = synthetic_tx_d(3)
+    tx["label1"] = tx["label1"].astype("category")
+    tx.loc[0, "label2"] = None
+    tx.loc[1, "label3"] = np.nan
+
+    csv = pd.read_csv(io.StringIO("".join(dump([tx], "csv"))), keep_default_na=False, parse_dates=["date"])
+    json = pd.read_json(io.StringIO("".join(dump([tx], "json"))), lines=True, dtype=False, convert_dates=["date"])
+    pd.testing.assert_frame_equal(csv, json)
+    assert json.loc[0, "label2"] == json.loc[1, "label3"] == ""
+
+
+def test_ledger_query(tmp_path: Path) -> None:
+    """Tests if the Ledger filters tables in memory or scans stored ones."""
+    ledger = Ledger(output_dir=tmp_path, bank_fmt="dkb")
+    ledger.import_tx(export_path=Path("tests/dkb_sample.csv"))
+    ledger.update()
+    ledger.write()
+
+    query = Query(start=pd.Timestamp("2021-01-01"), recipient="test")
+    assert len(next(ledger.query(query))) == 1
+    assert len(next(Ledger(output_dir=tmp_path, bank_fmt="dkb").query(query, columns=["amount"])).columns) == 1
+    assert len(next(ledger.query(Query(end=pd.Timestamp("2020-12-31"))))) == 0
+
+    with pytest.raises(KeyError):
+        next(ledger.query(query, table="invalid"))
@@ -0,0 +1,144 @@
+"""Tests for rule-based recipient mapping."""
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from ledgercli.cli import cli
+from ledgercli.main import Ledger
+from ledgercli.rules import RuleError, RuleSet
+from tests.helpers import dkb_export
+
+
+def _rules(rows: list[tuple[str, str, int, str]]) -> pd.DataFrame:
+    """Creates rules with the given kind, pattern, priority and label1 rows."""
+    rules = pd.DataFrame(rows, columns=["kind", "pattern", "priority", "label1"])
+    rules["recipient_clean"] = rules["pattern"]
+    rules[["label2", "label3"]] = ""
+    rules["occurence"] = 0.0
+    return rules
+
+
+def test_match() -> None:
+    """Tests if the matching rule with the highest priority applies, ties going to the first one."""
+    rules = RuleSet(
+        _rules(
+            [
+                ("substring", "shop", 0, "shopping"),
+                ("prefix", "PAYPAL *", 0, "paypal"),
+                ("regex", r"(\d{4})$", 1, "numbered"),
+                ("substring", "Rewe", 0, "groceries"),
+                ("prefix", "Rewe", 0, "groceries"),
+            ]
+        )
+    )
+    recipients = pd.Series(["PAYPAL *SHOP", "paypal *shop 1234", "Rewe Markt", "City Rewe", "Landlord", None])
+    assert rules.match(recipients).tolist() == [0, 2, 3, 3, -1, -1]
+
+    values = rules.values(recipients)
+    assert values["label1"].tolist()[:4] == ["shopping", "numbered", "groceries", "groceries"]
+    assert values.iloc[4:].isna().all(axis=None)
+
+
+def test_match_separate() -> None:
+    """Tests if regex rules with inline flags, backreferences or named groups are matched on their own."""
+    rules = RuleSet(
+        _rules(
+            [
+                ("regex", r"(?i)paypal", 0, "paypal"),
+                ("regex", r"(\d)\1", 2, "repeated"),
+                ("regex", r"(?P<id>\d{4})$", 1, "numbered"),
+                ("regex", r"(?P<id>^ref)", 1, "reference"),
+                ("substring", "shop", 1, "shopping"),
+            ]
+        )
+    )
+    recipients = pd.Series(["PayPal Europe", "Shop 1123", "Shop 1234", "REF shop", "Landlord"])
+    assert rules.match(recipients).tolist() == [0, 1, 2, 3, -1]
+
+
+def test_match_distinct(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if every distinct recipient is classified once."""
+    rules = RuleSet(_rules([("prefix", "PAYPAL *", 0, "paypal")]))
+    classified: list[str] = []
+    classify = RuleSet.classify
+
+    def counting_classify(self: RuleSet, recipients: npt.NDArray[np.str_]) -> npt.NDArray[np.int64]:
+        classified.extend(recipients)
+        return classify(self, recipients)
+
+    monkeypatch.setattr(RuleSet, "classify", counting_classify)
+
+    recipients = pd.Series(np.tile(["PAYPAL *A", "PAYPAL *B", "Landlord"], 1000))
+    assert (rules.match(recipients) == np.tile([0, 0, -1], 1000)).all()
+    assert len(classified) == 3
+
+
+@pytest.mark.parametrize(
+    "row, match",
+    [
+        (("postfix", "shop", 0, ""), "unknown kind"),
+        (("prefix", np.nan, 0, ""), "no pattern"),
+        (("regex", "(shop", 0, ""), "invalid regex"),
+    ],
+)
+def test_invalid(row: tuple[str, str, int, str], match: str) -> None:
+    """Tests if invalid rules are refused."""
+    with pytest.raises(RuleError, match=match):
+        RuleSet(_rules([row]))
+
+
+def test_ledger(tmp_path: Path) -> None:
+    """Tests if recipients matched by rules stay out of the mapping table unless mapped explicitly."""
+    output_dir = tmp_path / "output_dir"
+    output_dir.mkdir()
+    rows = [
+        ("01.01.2022", "PAYPAL *SHOP 1", "-10,00"),
+        ("02.01.2022", "PAYPAL *SHOP 2", "-20,00"),
+        ("03.01.2022", "PAYPAL *SHOP 3", "-30,00"),
+        ("04.01.2022", "Landlord", "-500,00"),
+    ]
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(dkb_export(tmp_path, rows))
+    ledger.update()
+    ledger.write()
+    assert (output_dir / "rules.csv").exists()
+    assert len(ledger.mapping) == 4
+
+    rules = _rules([("prefix", "PAYPAL *", 0, "shopping")])
+    rules.to_csv(output_dir / "rules.csv", index=False)
+    mapping = output_dir / "mapping.csv"
+    mapping.write_text(mapping.read_text().replace("PAYPAL *SHOP 3,,", "PAYPAL *SHOP 3,Shop,gifts"))
+
+    ledger = Ledger(output_dir=output_dir, bank_fmt=None)
+    assert ledger._changed == {"mapping", "rules"}
+    ledger.update()
+    ledger.write()
+
+    # empty rows of recipients matched by rules are removed
+    assert ledger.mapping["recipient"].tolist() == ["Landlord", "PAYPAL *SHOP 3"]
+    assert ledger.tx_c["label1"].tolist() == ["shopping", "shopping", "gifts", ""]
+    assert ledger.tx_c["recipient"].tolist() == ["PAYPAL *", "PAYPAL *", "Shop", "Landlord"]
+
+    ledger.import_tx(dkb_export(tmp_path, [("05.01.2022", "PAYPAL *SHOP 4", "-40,00")], "new.csv"))
+    ledger.update()
+    assert len(ledger.mapping) == 2
+    assert ledger.tx_c["label1"].iloc[-1] == "shopping"
+
+
+def test_cli_invalid(tmp_path: Path) -> None:
+    """Tests if invalid rules are reported without a traceback."""
+    output_dir = tmp_path / "output_dir"
+    output_dir.mkdir()
+    ledger = Ledger(output_dir=output_dir, bank_fmt="dkb")
+    ledger.import_tx(Path("tests/dkb_sample.csv"))
+    ledger.update()
+    ledger.write()
+    _rules([("postfix", "shop", 0, "")]).to_csv(output_dir / "rules.csv", index=False)
+
+    result = CliRunner().invoke(cli, ["update", "-o", str(output_dir)])
+    assert result.exit_code == 1
+    assert "unknown kind postfix" in result.output
@@ -0,0 +1,45 @@
+"""Tests for table schemas."""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ledgercli.schema import SCHEMAS, TEXT_COLUMNS
+from ledgercli.storage import CsvStorage
+
+
+def test_enforce() -> None:
+    """Tests if only columns not of their dtype are cast."""
+    history = pd.DataFrame(
+        {"date": ["2021-01-01", "2021-01-02"], "amount": [1.5, -2.0], "balance": [1.5, -0.5], "extra": ["a", "b"]}
+    )
+    amount = history["amount"].to_numpy()
+    SCHEMAS["history"].enforce(history)
+    assert history["date"].dtype == "datetime64[ns]"
+    assert np.shares_memory(history["amount"].to_numpy(), amount)
+    assert history["extra"].dtype == object
+
+    tx = SCHEMAS["transactions"].empty(cents=True)
+    assert tx["amount"].dtype == "int64"
+    assert tx["amount_custom"].dtype == "Int64"
+    assert "recipient" in TEXT_COLUMNS
+
+
+def test_read_csv(tmp_path: Path) -> None:
+    """Tests if CSV tables are parsed into the dtypes of their schema, missing values as NA."""
+    (tmp_path / "rules.csv").write_text("kind,pattern,priority,label1,occurence\nprefix,007,,,\nregex,x,2,rent,1\n")
+    rules = CsvStorage(tmp_path).read("rules")
+    assert rules["pattern"].tolist() == ["007", "x"]
+    assert rules["priority"].dtype == "Int64"
+    assert rules["priority"].isna().tolist() == [True, False]
+    assert rules["label1"].dtype == "category"
+    assert rules["occurence"].dtype == "float64"
+
+    (tmp_path / "rollup_month").mkdir()
+    for month in ["2021-01", "2021-02"]:
+        row = f"month,type,label1,label2,label3,amount,transactions\n{month}-01,expense,food,,,-10.00,2\n"
+        (tmp_path / "rollup_month" / f"{month}.csv").write_text(row)
+    rollup = CsvStorage(tmp_path).read("rollup_month")
+    assert rollup["month"].dtype == "datetime64[ns]"
+    assert rollup["type"].cat.categories.tolist() == ["expense", "income"]
+    assert rollup["transactions"].dtype == "int64"
@@ -0,0 +1,55 @@
+"""Tests for PipelineState."""
+from pathlib import Path
+
+import pandas as pd
+
+from ledgercli.state import TABLES, PipelineState
+from ledgercli.storage import CsvStorage
+
+
+def test_state(tmp_path: Path) -> None:
+    """Tests recording, change detection and persistence of tables."""
+    storage = CsvStorage(tmp_path)
+    state = PipelineState.read(tmp_path)
+    assert state.tables == {}
+    assert state.changed("mapping", storage)
+    assert state.is_clean(storage) is False
+
+    for table in TABLES:
+        data = storage.serialize(pd.DataFrame({"a": [1, 2]}))
+        storage.write(table, pd.DataFrame(), data)
+        state.record(table, storage, PipelineState.digest(data))
+    state.generation = 1
+    state.write(tmp_path)
+
+    state = PipelineState.read(tmp_path)
+    assert state.generation == 1
+    assert state.is_clean(storage)
+    assert state.changed("mapping", storage) is False
+    assert state.is_current("mapping", storage, PipelineState.digest(b"a\n1\n2\n"))
+
+    storage.path("mapping").write_text("a\n1\n3\n")
+    assert state.is_clean(storage) is False
+    assert state.changed("mapping", storage)
+
+
+def test_read_broken(tmp_path: Path) -> None:
+    """Tests if an unreadable state file results in an empty state."""
+    (tmp_path / PipelineState.file).write_text("{")
+    assert PipelineState.read(tmp_path).tables == {}
+
+
+def test_partitions(tmp_path: Path) -> None:
+    """Tests if partitioned tables changed if any of their partitions did."""
+    storage = CsvStorage(tmp_path)
+    state = PipelineState()
+    for name in ["history/2021", "history/2022"]:
+        data = storage.serialize(pd.DataFrame({"a": [1]}))
+        storage.write(name, pd.DataFrame(), data)
+        state.record(name, storage, PipelineState.digest(data))
+    assert state.changed("history", storage) is False
+
+    storage.path("history/2022").write_text("a\n2\n")
+    assert state.changed("history", storage)
+    storage.path("history/2022").unlink()
+    assert state.changed("history", storage)
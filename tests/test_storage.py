@@ -0,0 +1,154 @@
+"""Tests for storage backends."""
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ledgercli.main import Ledger
+from ledgercli.storage import CsvStorage, Storage, get_storage
+
+BINARY_FMTS = ["parquet", "arrow"]
+
+
+@pytest.fixture
+def table() -> pd.DataFrame:
+    """Returns a table with mixed dtypes."""
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2021-01-01", "2021-02-01"]),
+            "amount": [1.5, -2.25],
+            "recipient": ["a", "b"],
+            "occurence": [0.0, 2.0],
+        }
+    )
+
+
+def test_get_storage(tmp_path: Path) -> None:
+    """Tests storage selection and detection."""
+    assert isinstance(get_storage(None, tmp_path), CsvStorage)
+
+    with pytest.raises(KeyError, match="The storage_fmt you provided is not supported."):
+        get_storage("not-supported", tmp_path)
+
+    pytest.importorskip("pyarrow")
+    (tmp_path / "transactions.parquet").touch()
+    assert get_storage(None, tmp_path).suffix == ".parquet"
+
+
+@pytest.mark.parametrize("storage_fmt", ["csv", *BINARY_FMTS])
+def test_round_trip(tmp_path: Path, table: pd.DataFrame, storage_fmt: str) -> None:
+    """Tests if tables survive a round trip and columns can be projected."""
+    if storage_fmt in BINARY_FMTS:
+        pytest.importorskip("pyarrow")
+    storage = get_storage(storage_fmt, tmp_path)
+
+    assert storage.exists("history") is False
+    storage.write("history", table)
+    assert storage.exists("history")
+
+    if storage_fmt in BINARY_FMTS:
+        pd.testing.assert_frame_equal(storage.read("history"), table)
+    assert list(storage.read("history", columns=["amount"]).columns) == ["amount"]
+
+
+@pytest.mark.parametrize("storage_fmt", BINARY_FMTS)
+def test_csv_copy(tmp_path: Path, table: pd.DataFrame, storage_fmt: str) -> None:
+    """Tests if hand-edited CSV copies of editable tables are picked up."""
+    pytest.importorskip("pyarrow")
+    storage: Storage = get_storage(storage_fmt, tmp_path)
+    storage.write("mapping", table)
+    csv_path = storage.export_csv("mapping")
+    assert csv_path == tmp_path / "mapping.csv"
+    assert storage.read("mapping")["recipient"].tolist() == ["a", "b"]
+
+    edited = pd.read_csv(csv_path)
+    edited.loc[0, "recipient"] = "edited"
+    edited.to_csv(csv_path, index=False)
+    stat = storage.path("mapping").stat()
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert storage.read("mapping")["recipient"].tolist() == ["edited", "b"]
+
+    # writing refreshes the copy and makes the stored table authoritative again
+    storage.write("mapping", table)
+    assert pd.read_csv(csv_path)["recipient"].tolist() == ["a", "b"]
+    assert storage.read("mapping")["date"].dtype == "datetime64[ns]"
+
+
+@pytest.mark.parametrize("storage_fmt", BINARY_FMTS)
+def test_ledger_storage(tmp_path: Path, storage_fmt: str) -> None:
+    """Tests if a Ledger can be written and read back with binary storage."""
+    pytest.importorskip("pyarrow")
+    ledger = Ledger(output_dir=tmp_path, bank_fmt="dkb", storage_fmt=storage_fmt)
+    ledger.import_tx(export_path=Path("tests/dkb_sample.csv"))
+    ledger.update()
+    ledger.write()
+
+    suffix = get_storage(storage_fmt, tmp_path).suffix
+    assert (tmp_path / f"transactions{suffix}").exists()
+    assert (tmp_path / "transactions.csv").exists() is False
+
+    ledger = Ledger(output_dir=tmp_path, bank_fmt=None)
+    assert ledger.storage.suffix == suffix
+    assert ledger.tx["date"].dtype == "datetime64[ns]"
+    assert ledger.tx.shape == (1, 15)
+
+
+@pytest.mark.parametrize("storage_fmt", ["csv", *BINARY_FMTS])
+def test_partitions(tmp_path: Path, table: pd.DataFrame, storage_fmt: str) -> None:
+    """Tests if partitioned tables are read, scanned and detected as a whole."""
+    if storage_fmt in BINARY_FMTS:
+        pytest.importorskip("pyarrow")
+    from ledgercli.query import Query
+
+    storage = get_storage(storage_fmt, tmp_path)
+    storage.write("transactions/2021-02", table.iloc[1:])
+    storage.write("transactions/2021-01", table.iloc[:1])
+    assert storage.partitions("transactions") == ["2021-01", "2021-02"]
+    assert storage.exists("transactions")
+    assert len(storage.files("transactions")) == 2
+    assert storage.read("transactions")["recipient"].tolist() == ["a", "b"]
+    query = Query(start=pd.Timestamp("2021-01-15"))
+    assert pd.concat(storage.scan("transactions", query, None, 10))["recipient"].tolist() == ["b"]
+    assert get_storage(None, tmp_path).suffix == storage.suffix
+
+    if storage_fmt in BINARY_FMTS:
+        csv_path = storage.export_csv("transactions/2021-01")
+        assert csv_path == tmp_path / "transactions" / "2021-01.csv"
+        assert storage.partitions("transactions") == ["2021-01", "2021-02"]
+        assert len(storage.files("transactions")) == 3
+
+    storage.remove("transactions/2021-01")
+    assert storage.partitions("transactions") == ["2021-02"]
+
+
+@pytest.mark.parametrize("storage_fmt", BINARY_FMTS)
+def test_categories(tmp_path: Path, table: pd.DataFrame, storage_fmt: str) -> None:
+    """Tests if categoricals are stored with their used categories only, independent of the dictionary order."""
+    pytest.importorskip("pyarrow")
+    from ledgercli.query import Query
+
+    storage = get_storage(storage_fmt, tmp_path)
+    first = table.astype({"recipient": pd.CategoricalDtype(["b", "", "a", "unused"])})
+    second = table.astype({"recipient": pd.CategoricalDtype(["a", "b", "", "other"])})
+    assert storage.serialize(first) == storage.serialize(second)
+
+    storage.write("tx_distributed", first)
+    assert storage.read("tx_distributed")["recipient"].cat.categories.tolist() == ["a", "b"]
+    assert pd.concat(storage.scan("tx_distributed", Query(recipient="B"), None, 10))["recipient"].tolist() == ["b"]
+
+
+def test_write_atomic(tmp_path: Path, table: pd.DataFrame, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests if a failed write leaves the stored table and no temp file behind."""
+    storage = CsvStorage(tmp_path)
+    storage.write("history", table, fsync=True)
+    stored = storage.path("history").read_bytes()
+
+    def fail(src: Path, dst: Path) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError, match="disk full"):
+        storage.write("history", table.iloc[:1])
+    assert storage.path("history").read_bytes() == stored
+    assert [p.name for p in tmp_path.iterdir()] == ["history.csv"]